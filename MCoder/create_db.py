@@ -2,19 +2,86 @@ import sqlite3
 
 DB_NAME = 'smuzichat.db'
 TABLE_NAME = 'chat_lines'
+FTS_TABLE_NAME = f'{TABLE_NAME}_fts'
+FTS_TRIGGERS = (f'{FTS_TABLE_NAME}_ai', f'{FTS_TABLE_NAME}_ad', f'{FTS_TABLE_NAME}_au')
 
-conn = sqlite3.connect(DB_NAME)
-c = conn.cursor()
 
-c.execute(f'''
-CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    line_number INTEGER NOT NULL,
-    content TEXT NOT NULL
-)
-''')
+def create_schema(conn):
+    """Создаёт таблицу строк архива, индекс по номеру строки и состояние импорта."""
+    c = conn.cursor()
+    c.execute(f'''
+    CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        line_number INTEGER NOT NULL,
+        content TEXT NOT NULL
+    )
+    ''')
+    c.execute(f'CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_line_number ON {TABLE_NAME}(line_number)')
+    create_fulltext(c)
+    # Докуда импортирован каждый архив: смещение и номер следующей строки,
+    # контрольная сумма начала файла для обнаружения перезаписи
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS import_state (
+        source TEXT PRIMARY KEY,
+        byte_offset INTEGER NOT NULL,
+        next_line INTEGER NOT NULL,
+        checksum_bytes INTEGER NOT NULL,
+        checksum TEXT NOT NULL
+    )
+    ''')
+    conn.commit()
 
-conn.commit()
-conn.close()
 
-print(f'База данных {DB_NAME} и таблица {TABLE_NAME} успешно созданы.') 
\ No newline at end of file
+def create_fulltext(c):
+    """Создаёт FTS5-индекс по chat_lines.content и триггеры синхронизации.
+
+    При первом создании индекса на заполненной таблице выполняется
+    однократная переиндексация. Возвращает False, если SQLite собран без
+    FTS5 (тогда поиск работает через LIKE).
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE_NAME,))
+    existed = c.fetchone() is not None
+    try:
+        c.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE_NAME} USING fts5(
+            content,
+            content='{TABLE_NAME}',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''')
+    except sqlite3.OperationalError:
+        return False
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_ai AFTER INSERT ON {TABLE_NAME} BEGIN
+        INSERT INTO {FTS_TABLE_NAME} (rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_ad AFTER DELETE ON {TABLE_NAME} BEGIN
+        INSERT INTO {FTS_TABLE_NAME} ({FTS_TABLE_NAME}, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_au AFTER UPDATE OF content ON {TABLE_NAME} BEGIN
+        INSERT INTO {FTS_TABLE_NAME} ({FTS_TABLE_NAME}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE_NAME} (rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    if not existed:
+        # Однократное заполнение индекса для баз, созданных до появления FTS
+        c.execute(f"INSERT INTO {FTS_TABLE_NAME} ({FTS_TABLE_NAME}) VALUES ('rebuild')")
+    return True
+
+
+def has_fulltext(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (FTS_TABLE_NAME,)).fetchone() is not None
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(DB_NAME)
+    create_schema(conn)
+    conn.close()
+
+    print(f'База данных {DB_NAME} и таблица {TABLE_NAME} успешно созданы.')
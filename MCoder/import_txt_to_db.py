@@ -1,17 +1,125 @@
+import argparse
+import hashlib
+import os
 import sqlite3
+import time
+
+from create_db import DB_NAME, FTS_TABLE_NAME, FTS_TRIGGERS, TABLE_NAME, create_fulltext, create_schema, has_fulltext
 
-DB_NAME = 'smuzichat.db'
-TABLE_NAME = 'chat_lines'
 TXT_FILE = 'smuzichat_5(хронология реальной попытки).txt'
 
-conn = sqlite3.connect(DB_NAME)
-c = conn.cursor()
+# Строк в одном executemany
+IMPORT_BATCH_LINES = 50000
+# Сколько байт в начале и в конце импортированной части архива входит в контрольную сумму
+CHECKSUM_BYTES = 64 * 1024
+
+
+def prefix_checksum(txt_file, length):
+    """sha256 первых length байт файла: начало и конец по CHECKSUM_BYTES байт.
+
+    Конец (окно перед смещением length) замечает правку строк, импортированных
+    последними, которые не попадают в начало большого архива.
+    """
+    h = hashlib.sha256()
+    with open(txt_file, 'rb') as f:
+        h.update(f.read(min(length, CHECKSUM_BYTES)))
+        if length > CHECKSUM_BYTES:
+            f.seek(max(CHECKSUM_BYTES, length - CHECKSUM_BYTES))
+            h.update(f.read(length - f.tell()))
+    return h.hexdigest()
+
+
+def iter_archive_lines(txt_file, start_offset, first_line):
+    """(номер строки, смещение конца строки, строка, завершена ли переводом строки) начиная с start_offset."""
+    with open(txt_file, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        line_number = first_line
+        for raw in f:
+            offset += len(raw)
+            yield line_number, offset, raw.decode('utf-8', errors='replace').rstrip('\r\n'), raw.endswith(b'\n')
+            line_number += 1
+
+
+def import_archive(txt_file=TXT_FILE, db_name=DB_NAME):
+    """Импортирует в базу строки архива, которых там ещё нет.
+
+    Если архив только дописан (контрольная сумма начала совпадает), строки
+    добавляются с сохранённого смещения; иначе таблица перезаполняется.
+    Незавершённая последняя строка импортируется, но при следующем запуске
+    заменяется, если архив дописан. Возвращает сводку импорта.
+    """
+    source = os.path.abspath(txt_file)
+    size = os.path.getsize(txt_file)
+    conn = sqlite3.connect(db_name)
+    create_schema(conn)
+    c = conn.cursor()
+    # На время загрузки: без fsync и с журналом в памяти
+    c.execute('PRAGMA synchronous = OFF')
+    c.execute('PRAGMA journal_mode = MEMORY')
+    c.execute('PRAGMA cache_size = -65536')
+    c.execute('PRAGMA temp_store = MEMORY')
+
+    state = c.execute('SELECT byte_offset, next_line, checksum_bytes, checksum FROM import_state WHERE source = ?',
+                      (source,)).fetchone()
+    mode = 'rebuild'
+    start_offset, first_line = 0, 1
+    if state is not None:
+        byte_offset, next_line, checksum_bytes, checksum = state
+        if byte_offset <= size and prefix_checksum(txt_file, checksum_bytes) == checksum:
+            mode = 'append'
+            start_offset, first_line = byte_offset, next_line
+
+    started = time.perf_counter()
+    index_name = f'idx_{TABLE_NAME}_line_number'
+    c.execute('BEGIN')
+    fulltext = has_fulltext(conn)
+    if mode == 'rebuild':
+        # Индексы (и FTS) строятся один раз после загрузки — быстрее, чем обновлять их на каждой вставке
+        if fulltext:
+            for trigger in FTS_TRIGGERS:
+                c.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            c.execute(f"INSERT INTO {FTS_TABLE_NAME} ({FTS_TABLE_NAME}) VALUES ('delete-all')")
+        c.execute(f'DELETE FROM {TABLE_NAME}')
+        c.execute(f'DROP INDEX IF EXISTS {index_name}')
+        # chat_lines хранит один архив: состояние импорта других файлов больше не действительно
+        c.execute('DELETE FROM import_state')
+    else:
+        c.execute(f'DELETE FROM {TABLE_NAME} WHERE line_number >= ?', (first_line,))
+
+    insert = f'INSERT INTO {TABLE_NAME} (line_number, content) VALUES (?, ?)'
+    batch = []
+    imported = 0
+    resume_offset, resume_line = start_offset, first_line
+    for line_number, end_offset, content, complete in iter_archive_lines(txt_file, start_offset, first_line):
+        batch.append((line_number, content))
+        if complete:
+            resume_offset, resume_line = end_offset, line_number + 1
+        if len(batch) >= IMPORT_BATCH_LINES:
+            c.executemany(insert, batch)
+            imported += len(batch)
+            batch = []
+    c.executemany(insert, batch)
+    imported += len(batch)
+    c.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {TABLE_NAME}(line_number)')
+    if mode == 'rebuild' and fulltext:
+        create_fulltext(c)
+        c.execute(f"INSERT INTO {FTS_TABLE_NAME} ({FTS_TABLE_NAME}) VALUES ('rebuild')")
+
+    checksum_bytes = resume_offset
+    c.execute('INSERT OR REPLACE INTO import_state VALUES (?, ?, ?, ?, ?)',
+              (source, resume_offset, resume_line, checksum_bytes, prefix_checksum(txt_file, checksum_bytes)))
+    conn.commit()
+    conn.close()
+    return {'mode': mode, 'lines': imported, 'seconds': time.perf_counter() - started}
 
-with open(TXT_FILE, 'r', encoding='utf-8') as f:
-    for i, line in enumerate(f, 1):
-        c.execute(f'INSERT INTO {TABLE_NAME} (line_number, content) VALUES (?, ?)', (i, line.rstrip('\n')))
 
-conn.commit()
-conn.close()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Импорт архива обсуждений в базу данных.')
+    parser.add_argument('txt_file', nargs='?', default=TXT_FILE, help='Путь к архивному файлу')
+    parser.add_argument('--db', default=DB_NAME, help='Путь к базе данных')
+    args = parser.parse_args()
 
-print(f'Импорт завершён: все строки из {TXT_FILE} добавлены в базу данных.') 
\ No newline at end of file
+    result = import_archive(args.txt_file, args.db)
+    action = 'добавлены новые строки' if result['mode'] == 'append' else 'база заполнена заново'
+    print(f"Импорт завершён: {action} из {args.txt_file} — {result['lines']} строк за {result['seconds']:.2f} с.")
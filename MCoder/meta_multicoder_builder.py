@@ -1,6 +1,13 @@
+import io
 import os
+import glob
+import json
+import time
+import hashlib
 import argparse
-from smuzichat_reader import search_in_file
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from smuzichat_reader import read_line_chunks, scan_keywords, search_keywords
 import logging
 
 TEMPLATES = {
@@ -15,6 +22,15 @@ KEYWORDS = [
     "CoreCoordinator", "ParanoidTester", "API-ключ", "интеграция", "pipeline", "архитектура"
 ]
 
+# Состояние инкрементальной сборки хранится в папке сборки
+STATE_FILE = ".meta_builder_state.json"
+STATE_VERSION = 1
+# Сколько байт в начале и в конце обработанной части архива входит в контрольную сумму
+# (перезапись архива -> полная сборка)
+STATE_CHECK_BYTES = 64 * 1024
+# Размер диапазона архива, который сканирует один процесс пакетной сборки
+SHARD_BYTES = 16 * 1024 * 1024
+
 def setup_logging(log_path):
     logging.basicConfig(
         level=logging.INFO,
@@ -26,11 +42,10 @@ def setup_logging(log_path):
     )
 
 def extract_fragments(archive_path, keywords):
-    fragments = {k: [] for k in keywords}
+    # Все ключи ищутся за один проход по архиву
+    fragments = search_keywords(archive_path, keywords)
     for k in keywords:
-        results = search_in_file(archive_path, k)
-        fragments[k].extend(results)
-        logging.info(f"Извлечено {len(results)} фрагментов по ключу '{k}'")
+        logging.info(f"Извлечено {len(fragments[k])} фрагментов по ключу '{k}'")
     return fragments
 
 def create_project_structure(output_dir):
@@ -51,18 +66,294 @@ def insert_fragments(output_dir, fragments):
                         f.write(f"# {i}: {line}\n")
                 logging.info(f"Вставлено {len(lines)} фрагментов в {fname}.py по теме '{k}'")
 
+def render_outputs(fragments):
+    """Содержимое файлов сборки: {имя файла: текст} — то же, что create_project_structure + insert_fragments."""
+    outputs = {}
+    for fname, template in TEMPLATES.items():
+        parts = [template]
+        for k, lines in fragments.items():
+            if k.lower() in fname:
+                parts.append(f"# --- Фрагменты по теме: {k} ---\n")
+                parts.extend(f"# {i}: {line}\n" for i, line in lines)
+        outputs[f"{fname}.py"] = "".join(parts)
+    return outputs
+
+def write_atomic(path, content):
+    """Записывает файл через временный файл и rename: читатель не увидит половину файла."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def prefix_checksum(archive_path, length):
+    """sha256 первых length байт архива: начало и окно перед length по STATE_CHECK_BYTES."""
+    h = hashlib.sha256()
+    with open(archive_path, "rb") as f:
+        h.update(f.read(min(length, STATE_CHECK_BYTES)))
+        if length > STATE_CHECK_BYTES:
+            f.seek(max(STATE_CHECK_BYTES, length - STATE_CHECK_BYTES))
+            h.update(f.read(length - f.tell()))
+    return h.hexdigest()
+
+def complete_lines_end(archive_path, start, size):
+    """Смещение конца последней завершённой строки в [start, size) (start, если таких нет)."""
+    with open(archive_path, "rb") as f:
+        end = size
+        while end > start:
+            block_start = max(start, end - 64 * 1024)
+            f.seek(block_start)
+            block = f.read(end - block_start)
+            pos = block.rfind(b"\n")
+            if pos >= 0:
+                return block_start + pos + 1
+            end = block_start
+    return start
+
+
+class IncrementalBuilder:
+    """Сборка мультикодера из архива, которая обрабатывает только дописанный хвост.
+
+    Между запусками хранит (в памяти и в файле STATE_FILE в папке сборки)
+    смещение конца последней завершённой строки, номер следующей строки,
+    контрольную сумму начала и конца обработанной части архива и найденные
+    фрагменты по каждому ключевому слову. Если архив только дописан,
+    сканируется лишь новый хвост; иначе (архив переписан, сменился набор
+    ключей) — весь архив.
+    Фрагменты незавершённой последней строки попадают в файлы, но не в
+    состояние: при следующем запуске эта строка читается заново.
+    Перезаписываются только файлы, содержимое которых изменилось.
+    """
+
+    def __init__(self, archive_path, output_dir, keywords=None):
+        self.archive_path = archive_path
+        self.output_dir = output_dir
+        self.keywords = list(keywords or KEYWORDS)
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        self.state = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("version") != STATE_VERSION or state.get("keywords") != self.keywords:
+            return None
+        state["fragments"] = {k: [tuple(item) for item in v] for k, v in state["fragments"].items()}
+        state["pending"] = {k: [tuple(item) for item in v] for k, v in state["pending"].items()}
+        return state
+
+    def _empty_state(self):
+        return {
+            "version": STATE_VERSION,
+            "keywords": self.keywords,
+            "offset": 0,
+            "next_line": 1,
+            "check_bytes": 0,
+            "checksum": prefix_checksum(self.archive_path, 0),
+            "fragments": {k: [] for k in self.keywords},
+            "pending": {k: [] for k in self.keywords},
+        }
+
+    def build(self):
+        """Обновляет папку сборки; возвращает сводку: режим, новые фрагменты, записанные файлы."""
+        started = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.state is None:
+            self.state = self._load_state()
+        size = os.path.getsize(self.archive_path)
+        state = self.state
+        mode = "incremental"
+        if (state is None or size < state["offset"]
+                or prefix_checksum(self.archive_path, state["check_bytes"]) != state["checksum"]):
+            state = self._empty_state()
+            mode = "full"
+
+        # Хвост сканируется до size, но в состояние идут только завершённые строки;
+        # дописанное во время сканирования войдёт в следующую сборку
+        newlines = 0
+        def counted(chunks):
+            nonlocal newlines
+            for first_line, text in chunks:
+                newlines += text.count("\n")
+                yield first_line, text
+        found = scan_keywords(counted(read_line_chunks(self.archive_path, start=state["offset"],
+                                                       first_line=state["next_line"], end=size)), self.keywords)
+        return self.apply_scan(state, mode, found, newlines, size, started)
+
+    def apply_scan(self, state, mode, found, newlines, size, started=None):
+        """Добавляет в состояние фрагменты хвоста, найденные с state["next_line"], и обновляет файлы.
+
+        newlines — число переводов строк в просканированном хвосте, size —
+        размер архива на момент сканирования.
+        """
+        started = time.perf_counter() if started is None else started
+        next_line = state["next_line"] + newlines
+        dirty = set()
+        pending = {}
+        for k in self.keywords:
+            committed = [item for item in found[k] if item[0] < next_line]
+            pending[k] = [item for item in found[k] if item[0] >= next_line]
+            if committed or pending[k] != state["pending"].get(k, []) or mode == "full":
+                dirty.add(k)
+            state["fragments"][k].extend(committed)
+            if committed:
+                logging.info(f"Извлечено {len(committed)} новых фрагментов по ключу '{k}'")
+        state["pending"] = pending
+        state["offset"] = complete_lines_end(self.archive_path, state["offset"], size)
+        state["next_line"] = next_line
+        state["check_bytes"] = state["offset"]
+        state["checksum"] = prefix_checksum(self.archive_path, state["check_bytes"])
+
+        merged = {k: state["fragments"][k] + state["pending"][k] for k in self.keywords}
+        written = []
+        for name, content in render_outputs(merged).items():
+            fname = name[:-len(".py")]
+            path = os.path.join(self.output_dir, name)
+            if not any(k.lower() in fname for k in dirty) and os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if f.read() == content:
+                        continue
+            except OSError:
+                pass
+            write_atomic(path, content)
+            written.append(name)
+            logging.info(f"Обновлён файл: {name}")
+        write_atomic(self.state_path, json.dumps(state, ensure_ascii=False))
+        self.state = state
+        seconds = time.perf_counter() - started
+        logging.info(f"Сборка ({mode}) за {seconds:.3f} с: обновлено файлов {len(written)}")
+        return {"mode": mode, "written": written, "new_lines": newlines, "seconds": seconds}
+
+def split_line_ranges(archive_path, shard_bytes=SHARD_BYTES, size=None):
+    """Делит первые size байт файла на диапазоны около shard_bytes, каждый из которых кончается на границе строки."""
+    size = os.path.getsize(archive_path) if size is None else size
+    ranges = []
+    with open(archive_path, "rb") as f:
+        start = 0
+        while start < size:
+            end = start + shard_bytes
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def scan_range(archive_path, start, end, keywords):
+    """Сканирует диапазон байт [start, end) в отдельном процессе.
+
+    Возвращает (число переводов строк, фрагменты) с номерами строк от 1
+    относительно начала диапазона — абсолютные номера известны только
+    после того, как посчитаны строки всех предыдущих диапазонов.
+    """
+    with open(archive_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8").read()
+    return text.count("\n"), scan_keywords([(1, text)], keywords)
+
+def expand_archives(patterns):
+    """Пути архивов по списку путей и масок (glob) без повторов, в порядке аргументов."""
+    archives = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path) and path not in archives:
+                archives.append(path)
+    return archives
+
+def build_batch(archives, output_root, keywords=None, workers=None, shard_bytes=SHARD_BYTES):
+    """Полная сборка многих архивов: сканирование диапазонов строк в пуле процессов.
+
+    Каждый архив собирается в output_root/<имя архива без расширения>.
+    Все диапазоны всех архивов ставятся в один ProcessPoolExecutor;
+    фрагменты сливаются в порядке диапазонов, так что результат совпадает
+    с последовательной сборкой. Состояние инкрементальной сборки
+    сохраняется, и следующие изменения можно собирать IncrementalBuilder.
+    Возвращает сводку по архивам и время этапов (split, scan, merge, write).
+    """
+    keywords = list(keywords or KEYWORDS)
+    started = time.perf_counter()
+    timings = {}
+    outputs = {}
+    for archive in archives:
+        out = os.path.join(output_root, os.path.splitext(os.path.basename(archive))[0])
+        if out in outputs.values():
+            raise ValueError(f"Архивы с одинаковым именем попадают в одну папку: {out}")
+        outputs[archive] = out
+
+    stage = time.perf_counter()
+    sizes = {archive: os.path.getsize(archive) for archive in archives}
+    shards = [(archive, start, end) for archive in archives
+              for start, end in split_line_ranges(archive, shard_bytes, sizes[archive])]
+    timings["split"] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan_range, archive, start, end, keywords) for archive, start, end in shards]
+        results = [future.result() for future in futures]
+    timings["scan"] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    merged = {archive: ({k: [] for k in keywords}, 0) for archive in archives}
+    for (archive, _, _), (newlines, found) in zip(shards, results):
+        fragments, line_base = merged[archive]
+        for k in keywords:
+            fragments[k].extend((line_base + i, line) for i, line in found[k])
+        merged[archive] = (fragments, line_base + newlines)
+    timings["merge"] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    summary = {}
+    for archive in archives:
+        fragments, newlines = merged[archive]
+        builder = IncrementalBuilder(archive, outputs[archive], keywords)
+        os.makedirs(builder.output_dir, exist_ok=True)
+        result = builder.apply_scan(builder._empty_state(), "full", fragments, newlines, sizes[archive])
+        summary[archive] = {"output": outputs[archive], "lines": newlines,
+                            "fragments": sum(len(v) for v in fragments.values()),
+                            "written": result["written"]}
+    timings["write"] = time.perf_counter() - stage
+    timings["total"] = time.perf_counter() - started
+
+    logging.info(f"Пакетная сборка: архивов {len(archives)}, диапазонов {len(shards)}; "
+                 + ", ".join(f"{name} {seconds:.3f} с" for name, seconds in timings.items()))
+    return {"archives": summary, "shards": len(shards), "timings": timings}
+
 def main():
     parser = argparse.ArgumentParser(description="Мета-скрипт для автоматической сборки мультикодера из архива идей.")
-    parser.add_argument("archive", help="Путь к архиву обсуждений")
-    parser.add_argument("output", help="Папка для нового мультикодера")
+    parser.add_argument("archive", nargs="+", help="Путь к архиву обсуждений (несколько путей или масок — пакетная сборка)")
+    parser.add_argument("output", help="Папка для нового мультикодера (при пакетной сборке — общая папка)")
     parser.add_argument("--log", default="meta_multicoder_builder.log", help="Путь к лог-файлу")
+    parser.add_argument("--batch", action="store_true", help="Пакетная сборка даже для одного архива")
+    parser.add_argument("--jobs", type=int, default=None, help="Число процессов пакетной сборки (по умолчанию — по числу ядер)")
+    parser.add_argument("--shard-mb", type=float, default=SHARD_BYTES / (1024 * 1024),
+                        help="Размер диапазона архива на один процесс, МБ")
     args = parser.parse_args()
 
     setup_logging(args.log)
     logging.info("=== Запуск автоматической сборки мультикодера ===")
-    create_project_structure(args.output)
-    fragments = extract_fragments(args.archive, KEYWORDS)
-    insert_fragments(args.output, fragments)
+    if args.batch or len(args.archive) > 1 or any(glob.has_magic(a) for a in args.archive):
+        archives = expand_archives(args.archive)
+        if not archives:
+            logging.error("Не найдено ни одного архива.")
+            return
+        build_batch(archives, args.output, workers=args.jobs, shard_bytes=max(1, int(args.shard_mb * 1024 * 1024)))
+    else:
+        IncrementalBuilder(args.archive[0], args.output).build()
     logging.info(f"Готово! Заготовки мультикодера созданы в папке {args.output}")
 
 if __name__ == "__main__":
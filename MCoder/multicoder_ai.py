@@ -1,192 +1,475 @@
-import requests
 import json
+import re
 import time
 import threading
-from typing import Dict, List, Optional
-from urllib.parse import quote
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, NamedTuple, Optional
 import logging
 
+from multicoder_cache import ResponseCache, content_key, normalize_prompt
+from multicoder_db import ConnectionManager
+from multicoder_health import ProviderHealthMonitor
+from multicoder_http import HTTPTransport
+from multicoder_search import WebSearch
+from multicoder_security import security_rules
+
+# Таймаут одной нейросети и общий предел для generate_code_multi (секунды)
+DEFAULT_PROVIDER_TIMEOUT = 30.0
+DEFAULT_GENERATION_DEADLINE = 45.0
+
+# Пауза между фрагментами заглушек нейросетей (секунды) — имитирует потоковый ответ
+STUB_CHUNK_DELAY = 0.01
+
+
+class GenerationChunk(NamedTuple):
+    """Фрагмент потоковой генерации кода."""
+    service: str
+    text: str
+    cached: bool = False
+
+
+class ProviderUnavailable(RuntimeError):
+    """Нейросеть отключена или её автомат защиты не пропускает запрос."""
+
+
+class GenerationError(RuntimeError):
+    """Ни одна нейросеть не сгенерировала код; errors — сообщения по каждой."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors) or "нет доступных нейросетей")
+        self.errors = errors
+
+
+def split_chunks(text: str) -> List[str]:
+    """Делит текст на фрагменты «слово + следующие пробелы», как токены потокового API."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
 class AIIntegration:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        # Общий пул keep-alive соединений с повторами; размер пула по числу потоков executor
+        self.transport = HTTPTransport(pool_maxsize=8)
+        self.session = self.transport.session
+        # Разбор выдачи DuckDuckGo; одинаковые одновременные запросы выполняются один раз
+        self.web_search = WebSearch(self.transport)
         
         # Конфигурация нейросетей
         self.ai_services = {
             'deepseek': {
                 'url': 'https://coder.deepseek.com',
                 'available': True,
-                'fallback': 'codegeex'
+                'fallback': 'codegeex',
+                'timeout': DEFAULT_PROVIDER_TIMEOUT,
+                'config_version': 1  # увеличить при смене модели или параметров запроса
             },
             'codegeex': {
                 'url': 'https://codegeex.cn/ide',
                 'available': True,
-                'fallback': 'starcoder'
+                'fallback': 'starcoder',
+                'timeout': DEFAULT_PROVIDER_TIMEOUT,
+                'config_version': 1
             },
             'starcoder': {
                 'url': 'https://huggingface.co/chat',
                 'available': True,
-                'fallback': None
+                'fallback': None,
+                'timeout': DEFAULT_PROVIDER_TIMEOUT,
+                'config_version': 1
             }
         }
+        self.stream_providers = {
+            'deepseek': self.stream_code_deepseek,
+            'codegeex': self.stream_code_codegeex,
+            'starcoder': self.stream_code_starcoder
+        }
+        # Пул для параллельных запросов к нейросетям
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai")
+        # Автоматы защиты по нейросетям и фоновые пробы их доступности
+        self.health = ProviderHealthMonitor(list(self.ai_services), probe=self.probe_provider)
+        self.health.start()
+        # Кэши ответов по адресу содержимого; включаются enable_response_cache()
+        self.generation_cache: Optional[ResponseCache] = None
+        self.verdict_cache: Optional[ResponseCache] = None
         
-    def search_internet(self, query: str) -> List[Dict]:
-        """Поиск информации в интернете"""
-        results = []
-        
+    def enable_response_cache(self, db: ConnectionManager, **options):
+        """Включает постоянный кэш генерации кода и вердиктов analyze_security в таблице memory_cache."""
+        self.generation_cache = ResponseCache(db, "generation", **options)
+        self.verdict_cache = ResponseCache(db, "security_verdict", **options)
+
+    def get_cache_stats(self) -> Dict[str, Dict]:
+        """Статистика кэшей ответов, включая долю попаданий (hit_ratio)."""
+        return {
+            name: cache.stats()
+            for name, cache in (("generation", self.generation_cache), ("security", self.verdict_cache))
+            if cache is not None
+        }
+
+    def _generation_key(self, service: str, prompt: str) -> str:
+        """Ключ кэша: нормализованный запрос, нейросеть и версия её конфигурации."""
+        config = self.ai_services[service]
+        return content_key(normalize_prompt(prompt), service, config['url'], config.get('config_version', 1))
+
+    def _cached_generation(self, prompt: str, services_order: List[str]) -> Optional[Dict]:
+        """Результат из кэша для первой нейросети порядка, у которой он есть.
+
+        Ошибка чтения кэша не мешает генерации: она записывается в лог как промах.
+        """
+        keys = {self._generation_key(service, prompt): service for service in services_order}
         try:
-            # Поиск через DuckDuckGo (не требует API ключа)
-            search_url = f"https://duckduckgo.com/html/?q={quote(query)}"
-            response = self.session.get(search_url, timeout=10)
-            
-            if response.status_code == 200:
-                # Простой парсинг результатов (в реальной версии нужен BeautifulSoup)
-                content = response.text.lower()
-                
-                # Поиск GitHub репозиториев
-                if 'github.com' in content:
-                    results.append({
-                        'type': 'github_repo',
-                        'title': f'GitHub репозиторий по запросу: {query}',
-                        'url': f'https://github.com/search?q={quote(query)}',
-                        'description': 'Найден репозиторий на GitHub'
-                    })
-                
-                # Поиск документации
-                if 'docs' in content or 'documentation' in content:
-                    results.append({
-                        'type': 'documentation',
-                        'title': f'Документация: {query}',
-                        'url': f'https://www.google.com/search?q={quote(query + " documentation")}',
-                        'description': 'Найдена документация'
-                    })
-                
-                # Общие результаты поиска
-                results.append({
-                    'type': 'general',
-                    'title': f'Поиск: {query}',
-                    'url': f'https://www.google.com/search?q={quote(query)}',
-                    'description': 'Общие результаты поиска'
+            # Один запрос генерации — одно попадание или промах в статистике кэша
+            found = self.generation_cache.get_first(list(keys))
+        except Exception as e:
+            self.logger.warning(f"Ошибка чтения кэша генерации: {e}")
+            return None
+        if found is None:
+            return None
+        key, entry = found
+        return {
+            'results': {keys[key]: dict(entry, cached=True)},
+            'errors': [],
+            'success': True,
+            'cached': True
+        }
+
+    def _store_generation(self, prompt: str, results: Dict):
+        if self.generation_cache is None:
+            return
+        for service, result in results.items():
+            try:
+                self.generation_cache.set(self._generation_key(service, prompt), {
+                    'code': result['code'],
+                    'status': result['status'],
+                    'timestamp': result['timestamp']
                 })
-                
+            except Exception as e:
+                self.logger.warning(f"Не удалось сохранить ответ {service} в кэш: {e}")
+
+    def search_internet(self, query: str, max_results: int = 10) -> List[Dict]:
+        """Поиск информации в интернете (DuckDuckGo, кэш на диске с TTL)"""
+        try:
+            return self.web_search.search(query, max_results)
         except Exception as e:
             self.logger.error(f"Ошибка поиска в интернете: {e}")
-            results.append({
+            return [{
                 'type': 'error',
                 'title': 'Ошибка поиска',
                 'url': '',
                 'description': f'Не удалось выполнить поиск: {str(e)}'
-            })
-            
-        return results
+            }]
         
+    def _stub_stream(self, code: str) -> Iterator[str]:
+        """Отдаёт готовый текст заглушки фрагментами с паузой STUB_CHUNK_DELAY."""
+        for chunk in split_chunks(code):
+            if STUB_CHUNK_DELAY:
+                time.sleep(STUB_CHUNK_DELAY)
+            yield chunk
+
+    def stream_code_deepseek(self, prompt: str) -> Iterator[str]:
+        """Потоковая генерация кода через DeepSeek"""
+        # Здесь будет интеграция с потоковым DeepSeek API или web-интерфейсом
+        # Пока отдаём заглушку фрагментами
+        yield from self._stub_stream(f"# Код сгенерирован DeepSeek\n# Запрос: {prompt}\n\ndef main():\n    print('Hello from DeepSeek')\n\nif __name__ == '__main__':\n    main()")
+
     def generate_code_deepseek(self, prompt: str) -> Optional[str]:
         """Генерация кода через DeepSeek"""
         try:
-            # Здесь будет интеграция с DeepSeek API или web-интерфейсом
-            # Пока возвращаем заглушку
-            return f"# Код сгенерирован DeepSeek\n# Запрос: {prompt}\n\ndef main():\n    print('Hello from DeepSeek')\n\nif __name__ == '__main__':\n    main()"
+            return "".join(self.stream_code_deepseek(prompt))
         except Exception as e:
             self.logger.error(f"Ошибка DeepSeek: {e}")
             return None
             
+    def stream_code_codegeex(self, prompt: str) -> Iterator[str]:
+        """Потоковая генерация кода через CodeGeeX"""
+        # Здесь будет интеграция с потоковым CodeGeeX API или web-интерфейсом
+        yield from self._stub_stream(f"// Код сгенерирован CodeGeeX\n// Запрос: {prompt}\n\n#include <iostream>\n\nint main() {{\n    std::cout << \"Hello from CodeGeeX\" << std::endl;\n    return 0;\n}}")
+
     def generate_code_codegeex(self, prompt: str) -> Optional[str]:
         """Генерация кода через CodeGeeX"""
         try:
-            # Здесь будет интеграция с CodeGeeX API или web-интерфейсом
-            return f"// Код сгенерирован CodeGeeX\n// Запрос: {prompt}\n\n#include <iostream>\n\nint main() {{\n    std::cout << \"Hello from CodeGeeX\" << std::endl;\n    return 0;\n}}"
+            return "".join(self.stream_code_codegeex(prompt))
         except Exception as e:
             self.logger.error(f"Ошибка CodeGeeX: {e}")
             return None
             
+    def stream_code_starcoder(self, prompt: str) -> Iterator[str]:
+        """Потоковая генерация кода через StarCoder"""
+        # Здесь будет интеграция с потоковым StarCoder API или web-интерфейсом
+        yield from self._stub_stream(f"# Код сгенерирован StarCoder\n# Запрос: {prompt}\n\nimport sys\n\ndef main():\n    print('Hello from StarCoder')\n    return 0\n\nif __name__ == '__main__':\n    sys.exit(main())")
+
     def generate_code_starcoder(self, prompt: str) -> Optional[str]:
         """Генерация кода через StarCoder"""
         try:
-            # Здесь будет интеграция с StarCoder API или web-интерфейсом
-            return f"# Код сгенерирован StarCoder\n# Запрос: {prompt}\n\nimport sys\n\ndef main():\n    print('Hello from StarCoder')\n    return 0\n\nif __name__ == '__main__':\n    sys.exit(main())"
+            return "".join(self.stream_code_starcoder(prompt))
         except Exception as e:
             self.logger.error(f"Ошибка StarCoder: {e}")
             return None
             
-    def generate_code_multi(self, prompt: str, preferred_service: str = None) -> Dict:
-        """Генерация кода через несколько нейросетей с fallback"""
-        results = {}
-        errors = []
-        
-        # Определяем порядок попыток
+    def _call_provider(self, service: str, prompt: str, cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        """Получает код от провайдера через его потоковый генератор.
+
+        cancel_event проверяется перед запуском и после каждого фрагмента:
+        при отмене поток провайдера закрывается (запрос прерывается) и
+        возвращается None. Фрагмент, которого провайдер уже ждёт, отмена не
+        прерывает. Результат и задержка завершённого вызова учитываются
+        автоматом защиты нейросети, прерванного — нет.
+
+        Доступность проверяется непосредственно перед вызовом, а не заранее
+        для всех кандидатов: единственный пробный вызов полуоткрытого автомата
+        не тратится на нейросеть, до которой очередь так и не дошла.
+        Недоступная нейросеть поднимает ProviderUnavailable.
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        if not self.is_service_available(service):
+            raise ProviderUnavailable(f"{service}: нейросеть временно недоступна")
+        start = time.monotonic()
+        parts = []
+        stream = self.stream_providers[service](prompt)
+        try:
+            for text in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    # Пробный вызов полуоткрытого автомата не состоялся — место освобождается
+                    self.health.release(service)
+                    return None
+                parts.append(text)
+        except Exception:
+            self.health.record(service, False, time.monotonic() - start)
+            raise
+        finally:
+            stream.close()
+        code = "".join(parts)
+        self.health.record(service, bool(code), time.monotonic() - start)
+        return code or None
+
+    def probe_provider(self, service: str) -> bool:
+        """Лёгкая проба доступности нейросети для фонового монитора."""
+        response = self.transport.head(self.ai_services[service]['url'], read_timeout=5, allow_redirects=True)
+        return response.status_code < 500
+
+    def is_service_available(self, service: str) -> bool:
+        """Нейросеть включена и её автомат защиты пропускает запрос."""
+        return self.ai_services[service]['available'] and self.health.allow_request(service)
+
+    def get_provider_stats(self) -> Dict[str, Dict]:
+        """Состояние автоматов защиты, доля ошибок и задержки p50/p95 по нейросетям."""
+        return self.health.stats()
+
+    def _services_order(self, preferred_service: Optional[str]) -> List[str]:
+        """Порядок опроса нейросетей: предпочтительная и её fallback либо все по наблюдаемой задержке."""
         if preferred_service and preferred_service in self.ai_services:
             services_order = [preferred_service]
             fallback = self.ai_services[preferred_service]['fallback']
             if fallback:
                 services_order.append(fallback)
-        else:
-            services_order = ['deepseek', 'codegeex', 'starcoder']
+            return services_order
+        return self.health.order_by_latency(['deepseek', 'codegeex', 'starcoder'])
+
+    def generate_code_multi(self, prompt: str, preferred_service: str = None, parallel: bool = True,
+                            deadline: float = DEFAULT_GENERATION_DEADLINE,
+                            collect_within_ms: Optional[int] = None, use_cache: bool = True) -> Dict:
+        """Генерация кода через несколько нейросетей с fallback.
+
+        parallel=True отправляет запрос всем выбранным нейросетям сразу и
+        возвращает первый успешный результат. Остальным запросам и запросам,
+        превысившим таймаут, выставляется отмена: ещё не начатые не
+        запускаются, идущие прерываются на следующем фрагменте ответа.
+        У каждой нейросети свой таймаут ('timeout' в ai_services), а deadline
+        (секунды) ограничивает весь вызов. collect_within_ms=N вместо «первого
+        победителя» собирает все результаты, полученные за N мс, для сравнения.
+        parallel=False — прежний последовательный перебор.
+
+        При включённом кэше (enable_response_cache) повторный запрос
+        возвращается из кэша с 'cached': True без обращения к нейросетям;
+        use_cache=False и режим collect_within_ms всегда запрашивают заново.
+        """
+        candidates = self._services_order(preferred_service)
+        if use_cache and collect_within_ms is None and self.generation_cache is not None:
+            cached = self._cached_generation(prompt, candidates)
+            if cached is not None:
+                return cached
+        services_order = [s for s in candidates if self.ai_services[s]['available']]
+        if not parallel:
+            return self._generate_sequential(prompt, services_order)
+
+        results = {}
+        errors = []
+        cancel_events = {service: threading.Event() for service in services_order}
+        start = time.monotonic()
+        deadline_at = start + deadline
+        collect_until = start + collect_within_ms / 1000.0 if collect_within_ms is not None else None
+        futures = {
+            self.executor.submit(self._call_provider, service, prompt, cancel_events[service]): service
+            for service in services_order
+        }
+        provider_deadlines = {
+            future: start + self.ai_services[service].get('timeout', DEFAULT_PROVIDER_TIMEOUT)
+            for future, service in futures.items()
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                wake_at = min([deadline_at] + [provider_deadlines[f] for f in pending]
+                              + ([collect_until] if collect_until is not None else []))
+                done, pending = wait(pending, timeout=max(0.0, wake_at - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    service = futures[future]
+                    try:
+                        code = future.result()
+                    except ProviderUnavailable as e:
+                        errors.append(str(e))
+                        continue
+                    except Exception as e:
+                        errors.append(f"{service}: {str(e)}")
+                        continue
+                    if code:
+                        results[service] = {
+                            'code': code,
+                            'status': 'success',
+                            'timestamp': time.time(),
+                            'latency': time.monotonic() - start
+                        }
+                    else:
+                        errors.append(f"{service}: не удалось сгенерировать код")
+                if results and collect_until is None:
+                    break  # Первый успешный результат; остальным выставляется отмена в finally
+                now = time.monotonic()
+                for future in [f for f in pending if provider_deadlines[f] <= now]:
+                    pending.discard(future)
+                    future.cancel()
+                    cancel_events[futures[future]].set()
+                    errors.append(f"{futures[future]}: превышен таймаут")
+                if pending and now >= deadline_at:
+                    errors.extend(f"{futures[f]}: превышено общее время ожидания" for f in pending)
+                    break
+                if pending and collect_until is not None and now >= collect_until:
+                    errors.extend(f"{futures[f]}: не успел за {collect_within_ms} мс" for f in pending)
+                    break
+        finally:
+            for event in cancel_events.values():
+                event.set()
+            for future in pending:
+                future.cancel()
+
+        self._store_generation(prompt, results)
+        return {
+            'results': results,
+            'errors': errors,
+            'success': len(results) > 0
+        }
+
+    def _generate_sequential(self, prompt: str, services_order: List[str]) -> Dict:
+        """Последовательный перебор нейросетей до первого успешного результата."""
+        results = {}
+        errors = []
             
         # Пробуем каждую нейросеть
         for service in services_order:
-            if not self.ai_services[service]['available']:
-                continue
-                
             try:
-                if service == 'deepseek':
-                    code = self.generate_code_deepseek(prompt)
-                elif service == 'codegeex':
-                    code = self.generate_code_codegeex(prompt)
-                elif service == 'starcoder':
-                    code = self.generate_code_starcoder(prompt)
-                else:
-                    continue
+                start = time.monotonic()
+                code = self._call_provider(service, prompt)
                     
                 if code:
                     results[service] = {
                         'code': code,
                         'status': 'success',
-                        'timestamp': time.time()
+                        'timestamp': time.time(),
+                        'latency': time.monotonic() - start
                     }
                     break  # Останавливаемся на первом успешном результате
                 else:
                     errors.append(f"{service}: не удалось сгенерировать код")
                     
+            except ProviderUnavailable as e:
+                errors.append(str(e))
             except Exception as e:
                 errors.append(f"{service}: {str(e)}")
-                self.ai_services[service]['available'] = False  # Временно отключаем
-                
+
+        self._store_generation(prompt, results)
         return {
             'results': results,
             'errors': errors,
             'success': len(results) > 0
         }
         
+    def generate_code_stream(self, prompt: str, preferred_service: str = None,
+                             use_cache: bool = True) -> Iterator[GenerationChunk]:
+        """Потоковая генерация кода: фрагменты отдаются по мере поступления.
+
+        Нейросети опрашиваются по порядку, как в последовательном режиме;
+        переход к следующей возможен только до первого фрагмента. Ошибка после
+        начала вывода пробрасывается, иначе при отказе всех нейросетей
+        поднимается GenerationError со списком ошибок. Ответ из кэша отдаётся
+        одним фрагментом с cached=True. Закрытие итератора прерывает генерацию.
+        """
+        candidates = self._services_order(preferred_service)
+        if use_cache and self.generation_cache is not None:
+            cached = self._cached_generation(prompt, candidates)
+            if cached is not None:
+                service, result = next(iter(cached['results'].items()))
+                yield GenerationChunk(service, result['code'], cached=True)
+                return
+
+        errors = []
+        for service in [s for s in candidates if self.ai_services[s]['available']]:
+            # Автомат защиты спрашивается только перед реальным вызовом (см. _call_provider)
+            if not self.is_service_available(service):
+                errors.append(f"{service}: нейросеть временно недоступна")
+                continue
+            start = time.monotonic()
+            parts = []
+            stream = self.stream_providers[service](prompt)
+            try:
+                for text in stream:
+                    if not text:
+                        continue
+                    if not parts:
+                        self.logger.info(f"{service}: первый фрагмент через {time.monotonic() - start:.3f} с")
+                    parts.append(text)
+                    yield GenerationChunk(service, text)
+            except GeneratorExit:
+                # Вывод прерван потребителем — результата нет, место пробного вызова освобождается
+                self.health.release(service)
+                raise
+            except Exception as e:
+                self.health.record(service, False, time.monotonic() - start)
+                if parts:
+                    raise
+                errors.append(f"{service}: {str(e)}")
+                continue
+            finally:
+                stream.close()
+            code = "".join(parts)
+            self.health.record(service, bool(code), time.monotonic() - start)
+            if code:
+                self._store_generation(prompt, {service: {
+                    'code': code,
+                    'status': 'success',
+                    'timestamp': time.time()
+                }})
+                return
+            errors.append(f"{service}: не удалось сгенерировать код")
+        raise GenerationError(errors)
+
     def analyze_security(self, code: str) -> Dict:
         """Анализ безопасности сгенерированного кода"""
-        security_issues = []
-        risk_level = "LOW"
-        
-        # Проверка на опасные паттерны в коде
-        dangerous_patterns = [
-            'os.system', 'subprocess.call', 'eval(', 'exec(',
-            'open(', 'file(', '__import__', 'globals()',
-            'locals()', 'vars()', 'dir()', 'type('
-        ]
-        
-        code_lower = code.lower()
-        for pattern in dangerous_patterns:
-            if pattern in code_lower:
-                security_issues.append(f"Обнаружен опасный паттерн: {pattern}")
-                risk_level = "HIGH"
-                
-        # Проверка на сетевые операции
-        if 'requests.get' in code_lower or 'urllib' in code_lower:
-            security_issues.append("Обнаружены сетевые операции")
-            risk_level = "MEDIUM"
+        # Опасные паттерны и сетевые операции — набор правил "code" общего движка
+        rules = security_rules.rule_set("code")
+        # Вердикт зависит от кода и версии правил, поэтому кэшируется по обоим
+        key = content_key("code", code, security_rules.version)
+        verdict = self.verdict_cache.get(key) if self.verdict_cache is not None else None
+        if verdict is None:
+            verdict = rules.evaluate(code)
+            if self.verdict_cache is not None:
+                self.verdict_cache.set(key, verdict)
+        risk_level = verdict["risk_level"]
             
         return {
             'safe': risk_level == "LOW",
             'risk_level': risk_level,
-            'issues': security_issues,
+            'issues': verdict['issues'],
+            'matches': verdict['matches'],
             'recommendation': 'APPROVE' if risk_level == 'LOW' else 'REVIEW'
         }
         
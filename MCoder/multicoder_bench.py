@@ -0,0 +1,69 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from multicoder_core import MultiCoderCore
+
+
+def _legacy_add_message(db_path, project_id, sender, content):
+    """Путь записи сообщения до менеджера соединений: connect/commit/close на каждый запрос."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO security_log (action, risk_level, details)
+        VALUES (?, ?, ?)
+    ''', ("security_check", "LOW", "Content type: text, Risk factors: []"))
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO messages (project_id, sender, content, message_type, importance)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (project_id, sender, content, "text", 1))
+    conn.commit()
+    conn.close()
+
+
+def bench_add_message(count):
+    """Сообщений в секунду: старый путь (новое соединение на запрос) против MultiCoderCore."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        MultiCoderCore(legacy_db).close()
+        # Старые базы работали в режиме rollback journal
+        conn = sqlite3.connect(legacy_db)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+        start = time.perf_counter()
+        for i in range(count):
+            _legacy_add_message(legacy_db, 1, "user", f"сообщение {i}")
+        results["legacy"] = count / (time.perf_counter() - start)
+
+        core = MultiCoderCore(os.path.join(tmp, "pooled.db"))
+        core.logger.disabled = True
+        start = time.perf_counter()
+        for i in range(count):
+            core.add_message(1, "user", f"сообщение {i}")
+        results["pooled"] = count / (time.perf_counter() - start)
+        core.logger.disabled = False
+        core.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки MultiCoder.")
+    parser.add_argument("--messages", type=int, default=2000, help="Количество сообщений для add_message")
+    args = parser.parse_args()
+
+    results = bench_add_message(args.messages)
+    print(f"add_message, {args.messages} сообщений:")
+    print(f"  до   (connect на запрос): {results['legacy']:10.1f} сообщений/с")
+    print(f"  после (ConnectionManager): {results['pooled']:10.1f} сообщений/с")
+    print(f"  ускорение: x{results['pooled'] / results['legacy']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from multicoder_db import ConnectionManager
+
+
+def _message_size(messages: List[Dict]) -> int:
+    """Приблизительный объём списка сообщений в байтах."""
+    size = sys.getsizeof(messages)
+    for m in messages:
+        size += 200 + len(m.get("content") or "") + len(m.get("sender") or "")
+    return size
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением по числу записей, объёму и TTL.
+
+    Считает попадания, промахи, вытеснения и истечения срока жизни.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 16 * 1024 * 1024,
+                 ttl: Optional[float] = 300.0, sizeof: Callable = sys.getsizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes = 0
+        self._data: "OrderedDict" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, accept: Optional[Callable] = None):
+        """Возвращает значение по ключу; accept(value) == False считается промахом."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None or (accept is not None and not accept(entry[0])):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size: Optional[int] = None):
+        size = self.sizeof(value) if size is None else size
+        if size > self.max_bytes:
+            # Значение больше всего кэша — не кэшируем, но и не храним устаревшее
+            self.invalidate(key)
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires_at)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteCacheTier:
+    """Постоянный уровень кэша в таблице memory_cache (ключ — sha256 от namespace:key).
+
+    Записи пространства имён хранятся с content_type = namespace. Чтение
+    обновляет last_accessed, только если отметка старше touch_interval
+    секунд: горячие ключи не превращают каждое чтение в транзакцию записи.
+    prune() удаляет записи старше ttl и давно не читавшиеся сверх лимитов
+    max_entries и max_bytes; при prune_every он вызывается каждые
+    prune_every записей.
+    """
+
+    def __init__(self, db: ConnectionManager, namespace: str, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 prune_every: Optional[int] = None, touch_interval: float = 60.0):
+        self.db = db
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self.touch_interval = touch_interval
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def key_hash(self, key) -> str:
+        return hashlib.sha256(f"{self.namespace}:{key}".encode("utf-8")).hexdigest()
+
+    def get(self, key) -> Optional[str]:
+        key_hash = self.key_hash(key)
+        sql = "SELECT content, last_accessed <= datetime('now', ?) FROM memory_cache WHERE key_hash = ?"
+        params = [f"-{int(self.touch_interval)} seconds", key_hash]
+        if self.ttl:
+            sql += " AND created_at > datetime('now', ?)"
+            params.append(f"-{int(self.ttl)} seconds")
+        row = self.db.execute(sql, params).fetchone()
+        if row is None:
+            return None
+        if row[1]:
+            with self.db.transaction() as c:
+                c.execute('UPDATE memory_cache SET last_accessed = CURRENT_TIMESTAMP WHERE key_hash = ?', (key_hash,))
+        return row[0]
+
+    def set(self, key, content: str, content_type: Optional[str] = None):
+        with self.db.transaction() as c:
+            c.execute('''
+                INSERT INTO memory_cache (key_hash, content, content_type, content_size)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (key_hash) DO UPDATE SET
+                    content = excluded.content,
+                    content_type = excluded.content_type,
+                    content_size = excluded.content_size,
+                    created_at = CURRENT_TIMESTAMP,
+                    last_accessed = CURRENT_TIMESTAMP
+            ''', (self.key_hash(key), content, content_type or self.namespace, len(content.encode("utf-8"))))
+        self._written()
+
+    def _written(self):
+        """Учитывает запись; каждые prune_every записей вызывает prune()."""
+        if not self.prune_every:
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune()
+
+    def delete(self, key):
+        with self.db.transaction() as c:
+            c.execute('DELETE FROM memory_cache WHERE key_hash = ?', (self.key_hash(key),))
+
+    def prune(self) -> int:
+        """Удаляет устаревшие и вытесняемые записи пространства имён; возвращает их число."""
+        removed = 0
+        with self.db.transaction() as c:
+            if self.ttl:
+                c.execute("DELETE FROM memory_cache WHERE content_type = ? AND created_at <= datetime('now', ?)",
+                          (self.namespace, f"-{int(self.ttl)} seconds"))
+                removed += c.rowcount
+            if self.max_entries is not None or self.max_bytes is not None:
+                # Самые свежие по last_accessed остаются, пока укладываются в оба лимита
+                c.execute('''
+                    DELETE FROM memory_cache WHERE id IN (
+                        SELECT id FROM (
+                            SELECT id,
+                                   ROW_NUMBER() OVER w AS position,
+                                   SUM(COALESCE(content_size, LENGTH(content))) OVER w AS total
+                            FROM memory_cache
+                            WHERE content_type = ?
+                            WINDOW w AS (ORDER BY last_accessed DESC, id DESC)
+                        )
+                        WHERE position > ? OR total > ?
+                    )
+                ''', (self.namespace, self.max_entries if self.max_entries is not None else sys.maxsize,
+                      self.max_bytes if self.max_bytes is not None else sys.maxsize))
+                evicted = c.rowcount
+                removed += evicted
+                with self._lock:
+                    self.evictions += evicted
+        return removed
+
+
+class ProjectHistoryCache:
+    """Кэш последних сообщений проектов для get_project_history.
+
+    Для каждого проекта хранится до window последних сообщений (новые первыми)
+    и признак complete — в списке все сообщения проекта. Запрос с limit
+    обслуживается из кэша, если в нём не меньше limit сообщений или список
+    полный. Запись в проект сбрасывает его кэш и увеличивает поколение
+    проекта: список, прочитанный до записи, put() с устаревшим поколением
+    не сохраняет. При заданном persistent промахи первого уровня
+    проверяются в таблице memory_cache; его срок жизни и лимиты задаются
+    при создании SQLiteCacheTier и применяются в prune().
+    """
+
+    def __init__(self, window: int = 200, max_projects: int = 64,
+                 max_bytes: int = 32 * 1024 * 1024, ttl: Optional[float] = 600.0,
+                 persistent: Optional[SQLiteCacheTier] = None):
+        self.window = window
+        self.persistent = persistent
+        self.persistent_hits = 0
+        self._lru = LRUCache(max_entries=max_projects, max_bytes=max_bytes, ttl=ttl,
+                             sizeof=lambda entry: _message_size(entry["messages"]))
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, project_id: int) -> int:
+        """Поколение проекта; снимается перед чтением из базы и передаётся в put()."""
+        with self._lock:
+            return self._generations.get(project_id, 0)
+
+    def get(self, project_id: int, limit: int) -> Optional[List[Dict]]:
+        """Возвращает копию limit последних сообщений или None при промахе."""
+        def sufficient(entry):
+            return entry["complete"] or len(entry["messages"]) >= limit
+
+        entry = self._lru.get(project_id, accept=sufficient)
+        if entry is None and self.persistent is not None:
+            content = self.persistent.get(project_id)
+            if content is not None:
+                stored = json.loads(content)
+                if sufficient(stored):
+                    self._lru.set(project_id, stored)
+                    self.persistent_hits += 1
+                    entry = stored
+        if entry is None:
+            return None
+        return [dict(m) for m in entry["messages"][:limit]]
+
+    def put(self, project_id: int, messages: List[Dict], complete: bool,
+            generation: Optional[int] = None) -> bool:
+        """Сохраняет историю; при generation, устаревшем после invalidate(), ничего не делает."""
+        entry = {"messages": [dict(m) for m in messages[:self.window]],
+                 "complete": complete and len(messages) <= self.window}
+        with self._lock:
+            if generation is not None and generation != self._generations.get(project_id, 0):
+                return False
+            self._lru.set(project_id, entry)
+            if self.persistent is not None:
+                self.persistent.set(project_id, json.dumps(entry, ensure_ascii=False), "history")
+        return True
+
+    def invalidate(self, project_id: int):
+        with self._lock:
+            self._generations[project_id] = self._generations.get(project_id, 0) + 1
+            self._lru.invalidate(project_id)
+            if self.persistent is not None:
+                self.persistent.delete(project_id)
+
+    def clear(self):
+        self._lru.clear()
+
+    def prune(self) -> int:
+        """Удаляет устаревшие и вытесняемые записи постоянного уровня; возвращает их число."""
+        if self.persistent is None:
+            return 0
+        return self.persistent.prune()
+
+    def stats(self) -> Dict:
+        stats = self._lru.stats()
+        stats["persistent_hits"] = self.persistent_hits
+        return stats
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Нормализует запрос для ключа кэша: обрезка краёв и схлопывание пробелов."""
+    return " ".join(prompt.split())
+
+
+def content_key(*parts) -> str:
+    """Адрес содержимого: sha256 от JSON-представления частей ключа."""
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(SQLiteCacheTier):
+    """Постоянный кэш ответов по адресу содержимого (генерация кода, вердикты проверок).
+
+    Записи хранятся в memory_cache с content_type = namespace. Горячие записи
+    дополнительно держатся в памяти (memory_entries). Ограничения по числу
+    записей (max_entries), объёму (max_bytes) и возрасту (ttl) применяются
+    в prune() (см. SQLiteCacheTier): сначала удаляются устаревшие, затем
+    давно не читавшиеся записи.
+    """
+
+    def __init__(self, db: ConnectionManager, namespace: str, max_entries: int = 5000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = 7 * 24 * 3600,
+                 memory_entries: int = 256, prune_every: int = 50, touch_interval: float = 60.0):
+        super().__init__(db, namespace, ttl, max_entries, max_bytes, prune_every, touch_interval)
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = LRUCache(max_entries=memory_entries, max_bytes=max(1, max_bytes // 8), ttl=ttl,
+                                sizeof=sys.getsizeof)
+
+    def get(self, key) -> Optional[Dict]:
+        """Возвращает сохранённое значение (JSON-объект) или None при промахе."""
+        found = self.get_first([key])
+        return None if found is None else found[1]
+
+    def get_first(self, keys) -> Optional[Tuple[Any, Dict]]:
+        """(ключ, значение) для первого найденного из keys или None.
+
+        Поиск по нескольким ключам считается одним запросом: в статистику
+        идёт одно попадание или один промах.
+        """
+        for key in keys:
+            cached = self._memory.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.memory_hits += 1
+                return key, json.loads(cached)
+            content = super().get(key)
+            if content is not None:
+                with self._lock:
+                    self.hits += 1
+                self._memory.set(key, content)
+                return key, json.loads(content)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value: Dict, content_type: Optional[str] = None):
+        content = json.dumps(value, ensure_ascii=False, default=str)
+        super().set(key, content)
+        self._memory.set(key, content)
+
+    def delete(self, key):
+        self._memory.invalidate(key)
+        super().delete(key)
+
+    def prune(self) -> int:
+        removed = super().prune()
+        if removed:
+            self._memory.clear()
+        return removed
+
+    def clear(self):
+        self._memory.clear()
+        with self.db.transaction() as c:
+            c.execute('DELETE FROM memory_cache WHERE content_type = ?', (self.namespace,))
+
+    def stats(self) -> Dict:
+        row = self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(COALESCE(content_size, LENGTH(content))), 0) '
+            'FROM memory_cache WHERE content_type = ?', (self.namespace,)
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": row[0],
+                "bytes": row[1],
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
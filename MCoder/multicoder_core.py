@@ -2,33 +2,75 @@ import sqlite3
 import hashlib
 import json
 import os
-import time
 import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import logging
 
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+from multicoder_cache import ProjectHistoryCache, SQLiteCacheTier
+from multicoder_db import ConnectionManager, Migration, find_full_scans
+from multicoder_export import create_writer
+from multicoder_jobs import JobCancelled, JobHandle, JobQueueFull, JobScheduler
+from multicoder_security import AuditLogWriter, OVERFLOW_BLOCK, RISK_LEVELS, max_risk, security_rules
+
+# Размер страницы по умолчанию для потокового чтения истории
+HISTORY_BATCH_SIZE = 500
+
+# Как часто (в строках) экспорт сообщает о прогрессе
+EXPORT_PROGRESS_STEP = 200
+
+# Размер порции при хэшировании файлов
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Вес важности сообщения при ранжировании результатов полнотекстового поиска
+SEARCH_IMPORTANCE_WEIGHT = 0.5
+
+# Постоянный кэш истории проектов: срок жизни записи (секунды) и число проектов
+HISTORY_CACHE_TTL = 24 * 3600
+HISTORY_CACHE_MAX_PROJECTS = 1000
 
 class MultiCoderCore:
-    def __init__(self, db_path: str = "multicoder.db"):
+    def __init__(self, db_path: str = "multicoder.db", audit_overflow: str = OVERFLOW_BLOCK,
+                 persistent_cache: bool = False):
         self.db_path = db_path
-        self.setup_database()
+        self.db = ConnectionManager(db_path)
         self.setup_logging()
+        self.setup_database()
+        self.audit = AuditLogWriter(self.db, overflow=audit_overflow)
+        self.audit.start()
         self.security_level = "HIGH"
-        self.memory_cache = {}
+        # Кэш последних сообщений проектов; таблица memory_cache — необязательный второй уровень
+        self.memory_cache = ProjectHistoryCache(
+            persistent=SQLiteCacheTier(self.db, "history", ttl=HISTORY_CACHE_TTL,
+                                       max_entries=HISTORY_CACHE_MAX_PROJECTS, prune_every=50)
+            if persistent_cache else None
+        )
         self.active_projects = {}
+        # Фоновые задачи (чат, загрузка файлов, экспорт) с пулами по классам
+        self.scheduler = JobScheduler()
         
     def setup_database(self):
         """Инициализация базы данных с бесконечной памятью"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
+        self.schema_version = self.db.migrate(self._schema_migrations())[1]
+        # FTS зависит от сборки SQLite, поэтому создаётся отдельно от версионных миграций
+        with self.db.transaction() as c:
+            self.fts_enabled = self._setup_fulltext(c)
+        offenders = self.check_query_plans()
+        for sql, detail in offenders:
+            self.logger.warning(f"Полный просмотр таблицы в запросе ядра: {detail} | {sql}")
+
+    def _schema_migrations(self) -> List[Migration]:
+        """Упорядоченные миграции схемы multicoder.db (версия — PRAGMA user_version)."""
+        return [
+            Migration(1, "базовые таблицы", self._create_tables),
+            Migration(2, "индексы для истории, файлов, модулей и статусов", self._create_indexes),
+            Migration(3, "привязка security_log к проекту", self._add_security_log_project),
+            Migration(4, "дедупликация файлов по содержимому", self._add_file_dedup),
+            Migration(5, "размер и порядок вытеснения записей memory_cache", self._add_cache_eviction),
+        ]
+
+    def _create_tables(self, c: sqlite3.Cursor):
+        """Создаёт таблицы схемы, если их ещё нет."""
         # Таблица проектов
         c.execute('''
             CREATE TABLE IF NOT EXISTS projects (
@@ -129,9 +171,117 @@ class MultiCoderCore:
             )
         ''')
         
-        conn.commit()
-        conn.close()
-        
+    def _create_indexes(self, c: sqlite3.Cursor):
+        """Составные индексы под запросы ядра."""
+        # История и счётчики сообщений проекта: WHERE project_id ORDER BY created_at
+        c.execute('CREATE INDEX IF NOT EXISTS idx_messages_project_created ON messages (project_id, created_at, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_files_project ON files (project_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_modules_project_name ON modules (project_id, module_name)')
+        # История статусов: по модулю и целиком, новые первыми
+        c.execute('CREATE INDEX IF NOT EXISTS idx_status_history_module_updated ON system_status_history (module_name, updated_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_status_history_updated ON system_status_history (updated_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_security_log_timestamp ON security_log (timestamp)')
+
+    def _add_security_log_project(self, c: sqlite3.Cursor):
+        """Колонка project_id в security_log для отчётов по проекту."""
+        c.execute('ALTER TABLE security_log ADD COLUMN project_id INTEGER')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_security_log_project ON security_log (project_id, timestamp)')
+
+    def _add_file_dedup(self, c: sqlite3.Cursor):
+        """Ссылка на исходную запись для повторно загруженного содержимого и индекс по хэшу."""
+        c.execute('ALTER TABLE files ADD COLUMN linked_file_id INTEGER REFERENCES files (id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_files_hash ON files (file_hash, project_id)')
+
+    def _add_cache_eviction(self, c: sqlite3.Cursor):
+        """Размер записи кэша и индекс для вытеснения по давности обращения."""
+        c.execute('ALTER TABLE memory_cache ADD COLUMN content_size INTEGER')
+        c.execute('UPDATE memory_cache SET content_size = LENGTH(CAST(content AS BLOB))')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_memory_cache_type_accessed '
+                  'ON memory_cache (content_type, last_accessed)')
+
+    # Запросы ядра, которые не должны приводить к полному просмотру таблиц
+    CORE_QUERIES = (
+        ('SELECT id, sender, content, message_type, created_at, importance FROM messages '
+         'WHERE project_id = ? ORDER BY created_at DESC, id DESC LIMIT ?', (1, 100)),
+        ('SELECT id, sender, content, message_type, created_at, importance FROM messages '
+         'WHERE project_id = ? AND (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?',
+         (1, "", 0, 500)),
+        ('SELECT COUNT(*) FROM messages WHERE project_id = ?', (1,)),
+        ('SELECT COUNT(*) FROM files WHERE project_id = ?', (1,)),
+        ('SELECT filename, file_path, file_size, uploaded_at FROM files WHERE project_id = ?', (1,)),
+        ('SELECT name, description, status, created_at FROM projects WHERE id = ?', (1,)),
+        ('SELECT id FROM modules WHERE project_id = ? AND module_name = ?', (1, "core")),
+        ('SELECT module_name, status, updated_at, log FROM modules WHERE project_id = ?', (1,)),
+        ('SELECT id FROM system_modules WHERE module_name = ?', ("Core",)),
+        ('SELECT id, project_id, security_scan FROM files WHERE file_hash = ? AND linked_file_id IS NULL '
+         'ORDER BY project_id = ? DESC, id LIMIT 1', ("", 1)),
+        ('SELECT status, updated_at, log FROM system_status_history WHERE module_name = ? '
+         'ORDER BY updated_at DESC LIMIT ?', ("Core", 100)),
+        ('SELECT module_name, status, updated_at, log FROM system_status_history '
+         'ORDER BY updated_at DESC LIMIT ?', (100,)),
+        ('SELECT action, risk_level, details, timestamp FROM security_log '
+         'WHERE project_id = ? ORDER BY timestamp, id', (1,)),
+        ('SELECT COUNT(*) FROM security_log WHERE project_id = ?', (1,)),
+        ('SELECT filename, file_path, file_size, uploaded_at FROM files WHERE project_id = ? ORDER BY id', (1,)),
+    )
+
+    def check_query_plans(self) -> List[Tuple[str, str]]:
+        """EXPLAIN QUERY PLAN по запросам ядра: список (запрос, шаг) с полным просмотром таблицы."""
+        return find_full_scans(self.db.connection(), self.CORE_QUERIES)
+
+    def _setup_fulltext(self, c: sqlite3.Cursor) -> bool:
+        """Создаёт FTS5-индекс по messages.content и триггеры синхронизации.
+
+        При первом создании индекса на существующей базе выполняется
+        однократная переиндексация всех сообщений. Возвращает False, если
+        SQLite собран без FTS5 (тогда поиск работает через LIKE).
+        """
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        existed = c.fetchone() is not None
+        try:
+            c.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content,
+                    content='messages',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            return False
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        ''')
+        if not existed:
+            # Однократное заполнение индекса для баз, созданных до появления FTS
+            c.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        return True
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Превращает пользовательский запрос в безопасное FTS5-выражение (все слова, по префиксу)."""
+        terms = [t.replace('"', '""') for t in query.split()]
+        return " ".join(f'"{t}"*' for t in terms)
+
+    def close(self):
+        """Дописывает журнал аудита и закрывает все соединения с базой данных."""
+        self.scheduler.shutdown(wait=True)
+        self.audit.close()
+        self.db.close_all()
+
     def setup_logging(self):
         """Настройка системы логирования"""
         logging.basicConfig(
@@ -144,49 +294,34 @@ class MultiCoderCore:
         )
         self.logger = logging.getLogger(__name__)
         
-    def security_check(self, content: str, content_type: str = "text") -> Dict:
+    def security_check(self, content: str, content_type: str = "text", project_id: Optional[int] = None) -> Dict:
         """Проверка безопасности контента"""
-        risk_factors = []
-        risk_level = "LOW"
-        
-        # Проверка на вредоносные паттерны
-        dangerous_patterns = [
-            "hack", "exploit", "virus", "malware", "backdoor", "keylogger",
-            "password cracker", "ddos", "sql injection", "xss"
-        ]
-        
-        content_lower = content.lower()
-        for pattern in dangerous_patterns:
-            if pattern in content_lower:
-                risk_factors.append(f"Обнаружен опасный паттерн: {pattern}")
-                risk_level = "HIGH"
+        # Проверка на вредоносные паттерны (один проход по скомпилированному набору правил)
+        verdict = security_rules.evaluate("content", content)
+        risk_factors = list(verdict["issues"])
+        risk_level = verdict["risk_level"]
                 
         # Проверка размера (для файлов)
         if content_type == "file" and len(content) > 50 * 1024 * 1024:  # 50MB
             risk_factors.append("Файл превышает лимит 50MB")
-            risk_level = "MEDIUM"
+            risk_level = max_risk(risk_level, "MEDIUM")
             
         # Логирование проверки
         self.log_security_action("security_check", risk_level, 
-                               f"Content type: {content_type}, Risk factors: {risk_factors}")
+                               f"Content type: {content_type}, Risk factors: {risk_factors}",
+                               project_id)
         
         return {
             "safe": risk_level == "LOW",
             "risk_level": risk_level,
             "risk_factors": risk_factors,
+            "matches": verdict["matches"],
             "recommendation": "APPROVE" if risk_level == "LOW" else "REVIEW"
         }
         
-    def log_security_action(self, action: str, risk_level: str, details: str):
-        """Логирование действий безопасности"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO security_log (action, risk_level, details)
-            VALUES (?, ?, ?)
-        ''', (action, risk_level, details))
-        conn.commit()
-        conn.close()
+    def log_security_action(self, action: str, risk_level: str, details: str, project_id: Optional[int] = None):
+        """Логирование действий безопасности (асинхронно, через AuditLogWriter)"""
+        self.audit.submit(action, risk_level, details, project_id)
         
     def create_project(self, name: str, description: str = "") -> int:
         """Создание нового проекта с проверкой безопасности"""
@@ -195,15 +330,12 @@ class MultiCoderCore:
             if not security_check["safe"]:
                 self.logger.error(f"ОТКАЗАНО в создании проекта: {name}. Причина: {security_check['risk_factors']}")
                 raise ValueError(f"Проект не прошёл проверку безопасности: {security_check['risk_factors']}")
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO projects (name, description, security_level)
-                VALUES (?, ?, ?)
-            ''', (name, description, security_check["risk_level"]))
-            project_id = c.lastrowid
-            conn.commit()
-            conn.close()
+            with self.db.transaction() as c:
+                c.execute('''
+                    INSERT INTO projects (name, description, security_level)
+                    VALUES (?, ?, ?)
+                ''', (name, description, security_check["risk_level"]))
+                project_id = c.lastrowid
             if project_id is None:
                 self.logger.error(f"Ошибка: не удалось получить ID нового проекта '{name}'")
                 raise ValueError(f"Не удалось получить ID нового проекта '{name}'")
@@ -217,92 +349,196 @@ class MultiCoderCore:
                    message_type: str = "text", importance: int = 1):
         """Добавление сообщения в бесконечную память"""
         try:
-            security_check = self.security_check(content, message_type)
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO messages (project_id, sender, content, message_type, importance)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (project_id, sender, content, message_type, importance))
-            conn.commit()
-            conn.close()
-            cache_key = f"msg_{project_id}_{time.time()}"
-            self.memory_cache[cache_key] = {
-                "content": content,
-                "sender": sender,
-                "type": message_type,
-                "timestamp": datetime.now()
-            }
+            security_check = self.security_check(content, message_type, project_id)
+            with self.db.transaction() as c:
+                c.execute('''
+                    INSERT INTO messages (project_id, sender, content, message_type, importance)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (project_id, sender, content, message_type, importance))
+            self.memory_cache.invalidate(project_id)
             self.logger.info(f"Добавлено сообщение в проект {project_id}: {sender}")
         except Exception as e:
             self.logger.error(f"Ошибка при добавлении сообщения в проект {project_id}: {str(e)}")
             raise
         
     def get_project_history(self, project_id: int, limit: int = 100) -> List[Dict]:
-        """Получение истории проекта из бесконечной памяти"""
+        """Получение истории проекта из бесконечной памяти (через кэш последних сообщений)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('''
-                SELECT sender, content, message_type, created_at, importance
+            cached = self.memory_cache.get(project_id, limit)
+            if cached is not None:
+                return cached
+            fetch_limit = max(limit, self.memory_cache.window)
+            # Запись, пришедшая во время чтения, сменит поколение, и устаревший список не попадёт в кэш
+            generation = self.memory_cache.generation(project_id)
+            c = self.db.execute('''
+                SELECT id, sender, content, message_type, created_at, importance
                 FROM messages 
                 WHERE project_id = ?
-                ORDER BY created_at DESC
+                ORDER BY created_at DESC, id DESC
                 LIMIT ?
-            ''', (project_id, limit))
-            messages = []
-            for row in c.fetchall():
-                messages.append({
-                    "sender": row[0],
-                    "content": row[1],
-                    "type": row[2],
-                    "timestamp": row[3],
-                    "importance": row[4]
-                })
-            conn.close()
+            ''', (project_id, fetch_limit))
+            messages = [self._message_from_row(row) for row in c.fetchall()]
+            self.memory_cache.put(project_id, messages, complete=len(messages) < fetch_limit,
+                                  generation=generation)
+            messages = messages[:limit]
             self.logger.info(f"Получена история проекта {project_id}, сообщений: {len(messages)}")
             return messages
         except Exception as e:
             self.logger.error(f"Ошибка при получении истории проекта {project_id}: {str(e)}")
             raise
         
-    def search_memory(self, query: str, project_id: Optional[int] = None) -> List[Dict]:
-        """Поиск в бесконечной памяти"""
+    @staticmethod
+    def _message_from_row(row) -> Dict:
+        """Строка (id, sender, content, message_type, created_at, importance) -> словарь сообщения."""
+        return {
+            "id": row[0],
+            "sender": row[1],
+            "content": row[2],
+            "type": row[3],
+            "timestamp": row[4],
+            "importance": row[5]
+        }
+
+    def iter_project_history(self, project_id: int, after_id: Optional[int] = None,
+                             batch: int = HISTORY_BATCH_SIZE, descending: bool = False) -> Iterator[Dict]:
+        """Потоково отдаёт историю проекта, не загружая её в память целиком.
+
+        Использует keyset-пагинацию по (created_at, id): каждая страница —
+        отдельный запрос по индексу, продолжающийся после последней
+        выданной строки, поэтому память и время на страницу не зависят от
+        размера истории. after_id — id сообщения, после которого продолжить
+        (в выбранном направлении); descending=True идёт от новых к старым.
+        """
+        op, order = ("<", "DESC") if descending else (">", "ASC")
+        first_page = f'''
+            SELECT id, sender, content, message_type, created_at, importance
+            FROM messages
+            WHERE project_id = ?
+            ORDER BY created_at {order}, id {order}
+            LIMIT ?
+        '''
+        next_page = f'''
+            SELECT id, sender, content, message_type, created_at, importance
+            FROM messages
+            WHERE project_id = ? AND (created_at, id) {op} (?, ?)
+            ORDER BY created_at {order}, id {order}
+            LIMIT ?
+        '''
+        cursor_key = None
+        if after_id is not None:
+            cursor_key = self.db.execute('SELECT created_at, id FROM messages WHERE id = ?', (after_id,)).fetchone()
+            if cursor_key is None:
+                raise ValueError(f"Сообщение {after_id} не найдено")
+        while True:
+            if cursor_key is None:
+                c = self.db.execute(first_page, (project_id, batch))
+            else:
+                c = self.db.execute(next_page, (project_id, cursor_key[0], cursor_key[1], batch))
+            rows = c.fetchmany(batch)
+            c.close()
+            for row in rows:
+                yield self._message_from_row(row)
+            if len(rows) < batch:
+                return
+            cursor_key = (rows[-1][4], rows[-1][0])
+
+    def get_cache_stats(self) -> Dict:
+        """Счётчики кэшей ядра: попадания, промахи, вытеснения, объём."""
+        return {"history": self.memory_cache.stats()}
+
+    def search_memory(self, query: str, project_id: Optional[int] = None,
+                      offset: int = 0, limit: int = 50, highlight: bool = False) -> List[Dict]:
+        """Поиск в бесконечной памяти.
+
+        Использует FTS5-индекс: результаты ранжируются по BM25 с учётом
+        importance и возвращаются постранично (offset/limit). В каждом
+        результате есть "snippet" — фрагмент с найденными словами в [скобках];
+        при highlight=True добавляется "highlight" — полный текст с разметкой.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            if project_id:
-                c.execute('''
-                    SELECT sender, content, message_type, created_at, importance
-                    FROM messages 
-                    WHERE project_id = ? AND content LIKE ?
-                    ORDER BY importance DESC, created_at DESC
-                ''', (project_id, f"%{query}%"))
+            fts_query = self._fts_query(query)
+            if not fts_query:
+                return []
+            if self.fts_enabled:
+                highlight_expr = "highlight(messages_fts, 0, '[', ']')" if highlight else "NULL"
+                sql = f'''
+                    SELECT m.sender, m.content, m.message_type, m.created_at, m.importance,
+                           snippet(messages_fts, 0, '[', ']', '…', 12),
+                           {highlight_expr},
+                           bm25(messages_fts) * (1.0 + ? * m.importance) AS score
+                    FROM messages_fts
+                    JOIN messages m ON m.id = messages_fts.rowid
+                    WHERE messages_fts MATCH ?
+                '''
+                params = [SEARCH_IMPORTANCE_WEIGHT, fts_query]
+                if project_id:
+                    sql += " AND m.project_id = ?"
+                    params.append(project_id)
+                sql += " ORDER BY score, m.created_at DESC LIMIT ? OFFSET ?"
             else:
-                c.execute('''
-                    SELECT sender, content, message_type, created_at, importance
-                    FROM messages 
+                sql = '''
+                    SELECT sender, content, message_type, created_at, importance,
+                           substr(content, 1, 200), NULL, 0
+                    FROM messages
                     WHERE content LIKE ?
-                    ORDER BY importance DESC, created_at DESC
-                ''', (f"%{query}%",))
+                '''
+                params = [f"%{query}%"]
+                if project_id:
+                    sql += " AND project_id = ?"
+                    params.append(project_id)
+                sql += " ORDER BY importance DESC, created_at DESC LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
             results = []
-            for row in c.fetchall():
-                results.append({
+            for row in self.db.execute(sql, params).fetchall():
+                result = {
                     "sender": row[0],
                     "content": row[1],
                     "type": row[2],
                     "timestamp": row[3],
-                    "importance": row[4]
-                })
-            conn.close()
-            self.logger.info(f"Поиск в памяти: '{query}', найдено: {len(results)} записей")
+                    "importance": row[4],
+                    "snippet": row[5],
+                    "score": row[7]
+                }
+                if highlight:
+                    result["highlight"] = row[6] if row[6] is not None else row[1]
+                results.append(result)
+            self.logger.info(f"Поиск в памяти: '{query}', найдено: {len(results)} записей (offset {offset})")
             return results
         except Exception as e:
             self.logger.error(f"Ошибка при поиске в памяти: '{query}': {str(e)}")
             raise
         
-    def add_file(self, project_id: int, file_path: str) -> bool:
-        """Добавление файла с проверкой безопасности"""
+    @staticmethod
+    def hash_file(file_path: str, progress_callback: Optional[Callable[[int, int], None]] = None,
+                  chunk_size: int = HASH_CHUNK_SIZE) -> str:
+        """SHA-256 файла, читаемого порциями в один переиспользуемый буфер.
+
+        progress_callback(прочитано байт, размер файла) вызывается после каждой порции.
+        """
+        total = os.path.getsize(file_path)
+        digest = hashlib.sha256()
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        done = 0
+        with open(file_path, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                digest.update(view[:n])
+                done += n
+                if progress_callback:
+                    progress_callback(done, total)
+        return digest.hexdigest()
+
+    def add_file(self, project_id: int, file_path: str,
+                 progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Добавление файла с проверкой безопасности.
+
+        Хэш считается потоково. Если файл с таким же содержимым уже есть в
+        проекте, новая запись не создаётся; если он есть в другом проекте,
+        запись ссылается на исходную (linked_file_id) и наследует её результат проверки.
+        """
         try:
             if not os.path.exists(file_path):
                 self.logger.error(f"Файл не найден: {file_path}")
@@ -311,35 +547,100 @@ class MultiCoderCore:
             if file_size > 50 * 1024 * 1024:  # 50MB
                 self.logger.error(f"Файл превышает лимит 50MB: {file_path}")
                 raise ValueError("Файл превышает лимит 50MB")
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-            security_check = self.security_check(f"file:{file_path}", "file")
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO files (project_id, filename, file_path, file_size, file_hash, security_scan)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (project_id, os.path.basename(file_path), file_path, file_size, file_hash, security_check["risk_level"]))
-            conn.commit()
-            conn.close()
-            self.logger.info(f"Добавлен файл: {file_path} в проект {project_id}")
+            file_hash = self.hash_file(file_path, progress_callback)
+            security_check = self.security_check(f"file:{file_path}", "file", project_id)
+            with self.db.transaction(immediate=True) as c:
+                c.execute('''
+                    SELECT id, project_id, security_scan FROM files
+                    WHERE file_hash = ? AND linked_file_id IS NULL
+                    ORDER BY project_id = ? DESC, id
+                    LIMIT 1
+                ''', (file_hash, project_id))
+                original = c.fetchone()
+                if original and original[1] == project_id:
+                    self.logger.info(f"Файл {file_path} уже есть в проекте {project_id} (запись {original[0]})")
+                    return True
+                linked_file_id = None
+                security_scan = security_check["risk_level"]
+                if original:
+                    linked_file_id = original[0]
+                    if original[2] in RISK_LEVELS:
+                        security_scan = max_risk(security_scan, original[2])
+                c.execute('''
+                    INSERT INTO files (project_id, filename, file_path, file_size, file_hash, security_scan, linked_file_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (project_id, os.path.basename(file_path), file_path, file_size, file_hash, security_scan, linked_file_id))
+            if linked_file_id:
+                self.logger.info(f"Добавлен файл: {file_path} в проект {project_id} (ссылка на запись {linked_file_id})")
+            else:
+                self.logger.info(f"Добавлен файл: {file_path} в проект {project_id}")
             return True
         except Exception as e:
             self.logger.error(f"Ошибка при добавлении файла в проект {project_id}: {str(e)}")
             raise
-        
+
+    def ingest_files(self, project_id: int, file_paths: List[str],
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     block: bool = True) -> List[JobHandle]:
+        """Параллельно добавляет несколько файлов задачами класса "ingest" планировщика.
+
+        progress_callback(прочитано байт, всего байт) получает суммарный
+        прогресс по всем файлам и вызывается из рабочих потоков. Возвращает
+        описатель задачи на каждый файл (результат add_file или исключение);
+        отмена описателя прерывает хэширование файла. block=False при
+        заполненной очереди поднимает JobQueueFull вместо ожидания.
+        """
+        sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in file_paths}
+        total = sum(sizes.values())
+        done = dict.fromkeys(file_paths, 0)
+        lock = threading.Lock()
+
+        def ingest(handle: JobHandle, path: str):
+            def report(file_done, file_total):
+                with lock:
+                    done[path] = file_done
+                    current = sum(done.values())
+                if progress_callback:
+                    progress_callback(current, total)
+                handle.set_progress(file_done / file_total if file_total else 1.0)
+            return self.add_file(project_id, path, report)
+
+        handles = []
+        try:
+            for path in file_paths:
+                handles.append(self.scheduler.submit("ingest", ingest, path,
+                                                     name=f"Загрузка {os.path.basename(path)}", block=block))
+        except JobQueueFull:
+            # Пакет принимается целиком или не принимается вовсе
+            for handle in handles:
+                handle.cancel()
+            raise
+        return handles
+
+    def submit_export(self, project_id: int, filename_base: str = None,
+                      formats: Tuple[str, ...] = ("txt", "pdf"), compress: bool = False,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      block: bool = True) -> JobHandle:
+        """Экспорт отчёта фоновой задачей класса "export" (низкий приоритет, прогресс и отмена).
+
+        progress_callback(записано строк, всего строк) вызывается из рабочего
+        потока, например для полосы прогресса GUI. Результат описателя —
+        словарь формат -> путь, как у export_project.
+        """
+        def export(handle: JobHandle):
+            def report(done, total):
+                if progress_callback:
+                    progress_callback(done, total)
+                handle.set_progress(done / total if total else 1.0, f"{done}/{total}")
+            return self.export_project(project_id, filename_base, formats, compress, report)
+        return self.scheduler.submit("export", export, name=f"Отчёт по проекту #{project_id}", block=block)
+
     def get_project_status(self, project_id: int) -> Dict:
         """Получение статуса проекта"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('SELECT name, description, status, created_at FROM projects WHERE id = ?', (project_id,))
-            project_info = c.fetchone()
-            c.execute('SELECT COUNT(*) FROM messages WHERE project_id = ?', (project_id,))
-            message_count = c.fetchone()[0]
-            c.execute('SELECT COUNT(*) FROM files WHERE project_id = ?', (project_id,))
-            file_count = c.fetchone()[0]
-            conn.close()
+            project_info = self.db.execute('SELECT name, description, status, created_at FROM projects WHERE id = ?', (project_id,)).fetchone()
+            message_count = self.db.execute('SELECT COUNT(*) FROM messages WHERE project_id = ?', (project_id,)).fetchone()[0]
+            file_count = self.db.execute('SELECT COUNT(*) FROM files WHERE project_id = ?', (project_id,)).fetchone()[0]
             if project_info:
                 self.logger.info(f"Статус проекта {project_id} получен")
                 return {
@@ -359,118 +660,113 @@ class MultiCoderCore:
 
     def export_project_report(self, project_id: int, filename_base: str = None) -> str:
         """Экспортирует отчёт по проекту в TXT и (если возможно) PDF. Возвращает путь к TXT-отчёту."""
+        return self.export_project(project_id, filename_base, formats=("txt", "pdf"))["txt"]
+
+    def _iter_query(self, sql: str, params=(), batch: int = HISTORY_BATCH_SIZE) -> Iterator[tuple]:
+        """Потоково читает результат запроса порциями fetchmany."""
+        c = self.db.connection().cursor()
+        try:
+            c.execute(sql, params)
+            while True:
+                rows = c.fetchmany(batch)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            c.close()
+
+    def export_project(self, project_id: int, filename_base: str = None,
+                       formats: Tuple[str, ...] = ("txt", "pdf"), compress: bool = False,
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, str]:
+        """Потоковый экспорт отчёта по проекту в несколько форматов за один проход по данным.
+
+        Строки читаются курсорами и сразу передаются всем писателям
+        (txt, pdf, jsonl, csv — см. multicoder_export), поэтому память не
+        растёт с размером проекта. compress=True сжимает вывод gzip.
+        progress_callback(done, total) вызывается по мере записи строк; если он
+        поднимает исключение (JobCancelled при отмене задачи), начатые файлы удаляются.
+        Возвращает словарь формат -> путь к файлу (PDF пропускается без reportlab).
+        """
+        writers = []
         try:
             status = self.get_project_status(project_id)
-            messages = self.get_project_history(project_id, limit=1000)
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('SELECT filename, file_path, file_size, uploaded_at FROM files WHERE project_id = ?', (project_id,))
-            files = c.fetchall()
-            c.execute('SELECT action, risk_level, details, timestamp FROM security_log ORDER BY timestamp DESC LIMIT 1000')
-            security_events = c.fetchall()
-            conn.close()
+            self.audit.flush()
+            security_count = self.db.execute('SELECT COUNT(*) FROM security_log WHERE project_id = ?', (project_id,)).fetchone()[0]
             if not filename_base:
                 filename_base = f"project_report_{project_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            txt_path = f"{filename_base}.txt"
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(f"=== ОТЧЁТ ПО ПРОЕКТУ #{project_id} ===\n")
-                f.write(f"Имя: {status['name']}\nОписание: {status['description']}\nСтатус: {status['status']}\nСоздан: {status['created_at']}\n")
-                f.write(f"\n--- СООБЩЕНИЯ ({len(messages)}) ---\n")
-                for m in messages:
-                    f.write(f"[{m['timestamp']}] {m['sender']} ({m['type']}): {m['content']}\n")
-                f.write(f"\n--- ФАЙЛЫ ({len(files)}) ---\n")
-                for file in files:
-                    f.write(f"{file[0]} | {file[1]} | {file[2]} байт | {file[3]}\n")
-                f.write(f"\n--- СОБЫТИЯ БЕЗОПАСНОСТИ ({len(security_events)}) ---\n")
-                for ev in security_events:
-                    f.write(f"[{ev[3]}] {ev[0]} | {ev[1]} | {ev[2]}\n")
-            self.logger.info(f"Экспортирован TXT-отчёт по проекту {project_id}: {txt_path}")
-            # PDF
-            if REPORTLAB_AVAILABLE:
-                pdf_path = f"{filename_base}.pdf"
-                c = canvas.Canvas(pdf_path, pagesize=A4)
-                width, height = A4
-                y = height - 40
-                c.setFont("Helvetica-Bold", 14)
-                c.drawString(40, y, f"ОТЧЁТ ПО ПРОЕКТУ #{project_id}")
-                y -= 30
-                c.setFont("Helvetica", 10)
-                c.drawString(40, y, f"Имя: {status['name']}")
-                y -= 15
-                c.drawString(40, y, f"Описание: {status['description']}")
-                y -= 15
-                c.drawString(40, y, f"Статус: {status['status']}")
-                y -= 15
-                c.drawString(40, y, f"Создан: {status['created_at']}")
-                y -= 25
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(40, y, f"СООБЩЕНИЯ ({len(messages)})")
-                y -= 18
-                c.setFont("Helvetica", 8)
-                for m in messages:
-                    line = f"[{m['timestamp']}] {m['sender']} ({m['type']}): {m['content']}"
-                    for l in self._split_line(line, 110):
-                        if y < 40:
-                            c.showPage(); y = height - 40; c.setFont("Helvetica", 8)
-                        c.drawString(40, y, l)
-                        y -= 10
-                y -= 10
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(40, y, f"ФАЙЛЫ ({len(files)})")
-                y -= 18
-                c.setFont("Helvetica", 8)
-                for file in files:
-                    line = f"{file[0]} | {file[1]} | {file[2]} байт | {file[3]}"
-                    for l in self._split_line(line, 110):
-                        if y < 40:
-                            c.showPage(); y = height - 40; c.setFont("Helvetica", 8)
-                        c.drawString(40, y, l)
-                        y -= 10
-                y -= 10
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(40, y, f"СОБЫТИЯ БЕЗОПАСНОСТИ ({len(security_events)})")
-                y -= 18
-                c.setFont("Helvetica", 8)
-                for ev in security_events:
-                    line = f"[{ev[3]}] {ev[0]} | {ev[1]} | {ev[2]}"
-                    for l in self._split_line(line, 110):
-                        if y < 40:
-                            c.showPage(); y = height - 40; c.setFont("Helvetica", 8)
-                        c.drawString(40, y, l)
-                        y -= 10
-                c.save()
-                self.logger.info(f"Экспортирован PDF-отчёт по проекту {project_id}: {pdf_path}")
-            return txt_path
+            for fmt in formats:
+                writer = create_writer(fmt, filename_base, compress)
+                if writer is not None:
+                    writer.open()
+                    writers.append((fmt, writer))
+            sections = (
+                ("messages", status["message_count"], self.iter_project_history(project_id)),
+                ("files", status["file_count"], (
+                    {"filename": r[0], "file_path": r[1], "file_size": r[2], "uploaded_at": r[3]}
+                    for r in self._iter_query('SELECT filename, file_path, file_size, uploaded_at FROM files WHERE project_id = ? ORDER BY id', (project_id,))
+                )),
+                ("security", security_count, (
+                    {"action": r[0], "risk_level": r[1], "details": r[2], "timestamp": r[3]}
+                    for r in self._iter_query('SELECT action, risk_level, details, timestamp FROM security_log WHERE project_id = ? ORDER BY timestamp, id', (project_id,))
+                )),
+            )
+            total = sum(count for _, count, _ in sections)
+            done = 0
+            for _, writer in writers:
+                writer.header(project_id, status)
+            for name, count, rows in sections:
+                for _, writer in writers:
+                    writer.section(name, count)
+                for record in rows:
+                    for _, writer in writers:
+                        writer.row(name, record)
+                    done += 1
+                    if progress_callback and done % EXPORT_PROGRESS_STEP == 0:
+                        progress_callback(done, total)
+            for _, writer in writers:
+                writer.close()
+            if progress_callback:
+                progress_callback(total, total)
+            paths = {fmt: writer.path for fmt, writer in writers}
+            for fmt, path in paths.items():
+                self.logger.info(f"Экспортирован {fmt.upper()}-отчёт по проекту {project_id}: {path}")
+            return paths
         except Exception as e:
-            self.logger.error(f"Ошибка при экспорте отчёта по проекту {project_id}: {str(e)}")
+            # Недописанные файлы отчёта не оставляются
+            for _, writer in writers:
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+                try:
+                    os.remove(writer.path)
+                except OSError:
+                    pass
+            if isinstance(e, JobCancelled):
+                self.logger.info(f"Экспорт отчёта по проекту {project_id} отменён")
+            else:
+                self.logger.error(f"Ошибка при экспорте отчёта по проекту {project_id}: {str(e)}")
             raise
 
-    def _split_line(self, line, maxlen):
-        """Вспомогательная функция для переноса длинных строк в PDF."""
-        return [line[i:i+maxlen] for i in range(0, len(line), maxlen)]
-
     def add_or_update_module(self, project_id: int, module_name: str, status: str, log: str = None):
         """Добавляет или обновляет модуль проекта и его статус."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('''
-                SELECT id FROM modules WHERE project_id = ? AND module_name = ?
-            ''', (project_id, module_name))
-            row = c.fetchone()
-            if row:
+            with self.db.transaction() as c:
                 c.execute('''
-                    UPDATE modules SET status = ?, updated_at = CURRENT_TIMESTAMP, log = ? WHERE id = ?
-                ''', (status, log, row[0]))
-                self.logger.info(f"Обновлён модуль '{module_name}' проекта {project_id}: статус = {status}")
-            else:
-                c.execute('''
-                    INSERT INTO modules (project_id, module_name, status, log)
-                    VALUES (?, ?, ?, ?)
-                ''', (project_id, module_name, status, log))
-                self.logger.info(f"Добавлен модуль '{module_name}' в проект {project_id}: статус = {status}")
-            conn.commit()
-            conn.close()
+                    SELECT id FROM modules WHERE project_id = ? AND module_name = ?
+                ''', (project_id, module_name))
+                row = c.fetchone()
+                if row:
+                    c.execute('''
+                        UPDATE modules SET status = ?, updated_at = CURRENT_TIMESTAMP, log = ? WHERE id = ?
+                    ''', (status, log, row[0]))
+                    self.logger.info(f"Обновлён модуль '{module_name}' проекта {project_id}: статус = {status}")
+                else:
+                    c.execute('''
+                        INSERT INTO modules (project_id, module_name, status, log)
+                        VALUES (?, ?, ?, ?)
+                    ''', (project_id, module_name, status, log))
+                    self.logger.info(f"Добавлен модуль '{module_name}' в проект {project_id}: статус = {status}")
         except Exception as e:
             self.logger.error(f"Ошибка при добавлении/обновлении модуля '{module_name}' проекта {project_id}: {str(e)}")
             raise
@@ -478,16 +774,13 @@ class MultiCoderCore:
     def get_modules(self, project_id: int):
         """Возвращает список модулей и их статусов для проекта."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('''
+            c = self.db.execute('''
                 SELECT module_name, status, updated_at, log FROM modules WHERE project_id = ?
             ''', (project_id,))
             modules = [
                 {"module_name": row[0], "status": row[1], "updated_at": row[2], "log": row[3]}
                 for row in c.fetchall()
             ]
-            conn.close()
             return modules
         except Exception as e:
             self.logger.error(f"Ошибка при получении модулей проекта {project_id}: {str(e)}")
@@ -511,29 +804,26 @@ class MultiCoderCore:
     def update_system_module_status(self, module_name: str, status: str, log: str = None):
         """Обновляет статус системного модуля мультикодера и сохраняет в историю."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            # Обновление/добавление статуса
-            c.execute('SELECT id FROM system_modules WHERE module_name = ?', (module_name,))
-            row = c.fetchone()
-            if row:
+            with self.db.transaction() as c:
+                # Обновление/добавление статуса
+                c.execute('SELECT id FROM system_modules WHERE module_name = ?', (module_name,))
+                row = c.fetchone()
+                if row:
+                    c.execute('''
+                        UPDATE system_modules SET status = ?, updated_at = CURRENT_TIMESTAMP, log = ? WHERE id = ?
+                    ''', (status, log, row[0]))
+                    self.logger.info(f"Обновлён статус системного модуля '{module_name}': {status}")
+                else:
+                    c.execute('''
+                        INSERT INTO system_modules (module_name, status, log)
+                        VALUES (?, ?, ?)
+                    ''', (module_name, status, log))
+                    self.logger.info(f"Добавлен системный модуль '{module_name}' со статусом: {status}")
+                # Запись в историю
                 c.execute('''
-                    UPDATE system_modules SET status = ?, updated_at = CURRENT_TIMESTAMP, log = ? WHERE id = ?
-                ''', (status, log, row[0]))
-                self.logger.info(f"Обновлён статус системного модуля '{module_name}': {status}")
-            else:
-                c.execute('''
-                    INSERT INTO system_modules (module_name, status, log)
+                    INSERT INTO system_status_history (module_name, status, log)
                     VALUES (?, ?, ?)
                 ''', (module_name, status, log))
-                self.logger.info(f"Добавлен системный модуль '{module_name}' со статусом: {status}")
-            # Запись в историю
-            c.execute('''
-                INSERT INTO system_status_history (module_name, status, log)
-                VALUES (?, ?, ?)
-            ''', (module_name, status, log))
-            conn.commit()
-            conn.close()
         except Exception as e:
             self.logger.error(f"Ошибка при обновлении статуса системного модуля '{module_name}': {str(e)}")
             raise
@@ -541,14 +831,11 @@ class MultiCoderCore:
     def get_system_status(self):
         """Возвращает текущий статус всех системных модулей мультикодера."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('SELECT module_name, status, updated_at, log FROM system_modules')
+            c = self.db.execute('SELECT module_name, status, updated_at, log FROM system_modules')
             modules = [
                 {"module_name": row[0], "status": row[1], "updated_at": row[2], "log": row[3]}
                 for row in c.fetchall()
             ]
-            conn.close()
             return modules
         except Exception as e:
             self.logger.error(f"Ошибка при получении статусов системных модулей: {str(e)}")
@@ -557,18 +844,15 @@ class MultiCoderCore:
     def get_system_status_history(self, module_name: str = None, limit: int = 100):
         """Возвращает историю изменений статусов системных модулей (по модулю или все)."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
             if module_name:
-                c.execute('''
+                c = self.db.execute('''
                     SELECT status, updated_at, log FROM system_status_history WHERE module_name = ? ORDER BY updated_at DESC LIMIT ?
                 ''', (module_name, limit))
             else:
-                c.execute('''
+                c = self.db.execute('''
                     SELECT module_name, status, updated_at, log FROM system_status_history ORDER BY updated_at DESC LIMIT ?
                 ''', (limit,))
             history = c.fetchall()
-            conn.close()
             return history
         except Exception as e:
             self.logger.error(f"Ошибка при получении истории статусов системных модулей: {str(e)}")
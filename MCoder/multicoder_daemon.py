@@ -1,38 +1,267 @@
 import time
 import os
-import subprocess
+import sys
+import json
+import select
+import struct
+import hashlib
+import argparse
 import logging
+import ctypes
+import ctypes.util
+
+from meta_multicoder_builder import IncrementalBuilder
 
 ARCHIVE = "smuzichat_5(хронология реальной попытки).txt"
 OUTPUT = "MCoder_AutoBuild"
 LOG = "meta_multicoder_builder.log"
-CHECK_INTERVAL = 60  # секунд
+CHECK_INTERVAL = 60  # секунд, опрос при недоступном inotify
+DEBOUNCE = 2.0  # секунд тишины после последней записи перед сборкой
+MAX_DEBOUNCE = 30.0  # секунд: при непрерывной записи сборка не откладывается дольше
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# inotify доступен только в Linux; вызывается через libc без сторонних модулей
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+    except (OSError, TypeError, AttributeError):
+        _libc = None
+INOTIFY_AVAILABLE = _libc is not None and hasattr(_libc, "inotify_init1")
+
+
+def load_targets(config_path=None):
+    """Список целей сборки [{archive, output, log}].
+
+    Без конфигурации — одна цель из ARCHIVE/OUTPUT/LOG. Файл конфигурации —
+    JSON-список таких словарей; output и log необязательны.
+    """
+    if not config_path:
+        return [{"archive": ARCHIVE, "output": OUTPUT, "log": LOG}]
+    with open(config_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    targets = []
+    for entry in entries:
+        if "archive" not in entry:
+            raise ValueError(f"В цели сборки не указан archive: {entry}")
+        targets.append({"archive": entry["archive"], "output": entry.get("output", OUTPUT),
+                        "log": entry.get("log", LOG)})
+    return targets
+
+
+# Сборщики целей живут между сборками и хранят состояние в памяти
+_builders = {}
+
+
+def run_builder(target):
+    """Инкрементальная сборка цели в этом же процессе; её записи идут и в лог цели."""
+    key = (os.path.abspath(target["archive"]), os.path.abspath(target["output"]))
+    builder = _builders.get(key)
+    if builder is None:
+        builder = _builders[key] = IncrementalBuilder(target["archive"], target["output"])
+    handler = logging.FileHandler(target["log"], mode="a", encoding="utf-8")
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        builder.build()
+    except Exception as e:
+        logging.error(f"Ошибка сборки {target['archive']} -> {target['output']}: {e}")
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ChangeDetector:
+    """Отличает настоящие изменения архива от смены одного mtime.
+
+    Хранит для каждого файла размер, mtime и хэш содержимого. Совпали размер
+    и mtime — файл не читается. Другой размер — изменение; файл всё равно
+    хэшируется, чтобы у следующей проверки было с чем сравнить. При прежнем
+    размере и новом mtime изменением считается только другой хэш (touch
+    сборку не запускает).
+    """
+
+    def __init__(self):
+        self._states = {}  # путь -> (размер, mtime_ns, хэш)
+
+    def changed(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return self._states.pop(path, None) is not None
+        previous = self._states.get(path)
+        if previous is not None and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            return False
+        digest = file_digest(path)
+        self._states[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return previous is None or previous[0] != stat.st_size or previous[2] != digest
+
+
+class InotifyWatcher:
+    """Следит за каталогами архивов через inotify и сообщает, какие архивы затронуты.
+
+    Наблюдаются каталоги, а не сами файлы, чтобы замечать и атомарную замену
+    файла (запись во временный файл и переименование).
+    """
+
+    def __init__(self, paths):
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.paths = {os.path.abspath(p) for p in paths}
+        self._dirs = {}  # дескриптор наблюдения -> каталог
+        try:
+            for directory in {os.path.dirname(p) for p in self.paths}:
+                wd = _libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory}")
+                self._dirs[wd] = directory
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def read(self, timeout=None):
+        """Ждёт события не дольше timeout секунд; возвращает множество затронутых архивов."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        touched = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Очередь событий переполнена — проверяются все архивы
+                touched |= self.paths
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if path in self.paths:
+                touched.add(path)
+        return touched
+
+    def close(self):
+        os.close(self.fd)
+
+
+def build_changed(targets, paths, detector):
+    """Запускает сборку целей, архивы которых действительно изменились."""
+    for path in sorted(paths):
+        try:
+            changed = detector.changed(path)
+        except OSError as e:
+            # Ошибка чтения одного архива не должна останавливать слежение за остальными
+            logging.error(f"Не удалось проверить архив {path}: {e}")
+            continue
+        if not changed:
+            logging.debug(f"Архив {path} не изменился по содержимому, сборка не нужна.")
+            continue
+        if not os.path.exists(path):
+            logging.warning(f"Архив {path} удалён, сборка пропущена.")
+            continue
+        for target in targets:
+            if os.path.abspath(target["archive"]) == path:
+                logging.info(f"Обнаружено изменение архива {target['archive']}, запускаю сборку в {target['output']}.")
+                run_builder(target)
+
+
+def watch_loop(targets, detector, debounce=DEBOUNCE, max_debounce=MAX_DEBOUNCE):
+    """Сборка по событиям inotify; серия записей объединяется в одну сборку."""
+    watcher = InotifyWatcher([t["archive"] for t in targets])
+    logging.info("Слежение за архивами через inotify.")
+    pending = set()
+    first_event = last_event = 0.0
+    try:
+        while True:
+            if pending:
+                now = time.monotonic()
+                timeout = max(0.0, min(last_event + debounce, first_event + max_debounce) - now)
+            else:
+                timeout = None
+            touched = watcher.read(timeout)
+            now = time.monotonic()
+            if touched:
+                if not pending:
+                    first_event = now
+                pending |= touched
+                last_event = now
+                continue
+            if pending and (now - last_event >= debounce or now - first_event >= max_debounce):
+                build_changed(targets, pending, detector)
+                pending = set()
+    finally:
+        watcher.close()
+
+
+def poll_loop(targets, detector, interval=CHECK_INTERVAL):
+    """Прежний режим: проверка архивов раз в interval секунд."""
+    logging.info(f"Проверка архивов раз в {interval} с.")
+    paths = {os.path.abspath(t["archive"]) for t in targets}
+    while True:
+        build_changed(targets, paths, detector)
+        time.sleep(interval)
 
-def run_builder():
-    cmd = [
-        "python", "meta_multicoder_builder.py",
-        ARCHIVE, OUTPUT, "--log", LOG
-    ]
-    subprocess.run(cmd)
 
 def main():
+    parser = argparse.ArgumentParser(description="Демон автоматической сборки мультикодера при изменении архивов.")
+    parser.add_argument("--config", help="JSON-список целей [{\"archive\": ..., \"output\": ..., \"log\": ...}]")
+    parser.add_argument("--poll", action="store_true", help="Опрашивать архивы вместо inotify")
+    parser.add_argument("--interval", type=float, default=CHECK_INTERVAL, help="Период опроса, секунд")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE, help="Пауза после последней записи, секунд")
+    args = parser.parse_args()
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[logging.FileHandler("multicoder_daemon.log", encoding="utf-8"), logging.StreamHandler()]
     )
-    last_mtime = None
+    targets = load_targets(args.config)
+    detector = ChangeDetector()
+    paths = {os.path.abspath(t["archive"]) for t in targets}
+    # Первая сборка при запуске, как и раньше
+    build_changed(targets, paths, detector)
     while True:
         try:
-            mtime = os.path.getmtime(ARCHIVE)
-            if last_mtime is None or mtime != last_mtime:
-                logging.info("Обнаружено изменение архива, запускаю автоматическую сборку мультикодера.")
-                run_builder()
-                last_mtime = mtime
-            time.sleep(CHECK_INTERVAL)
+            if INOTIFY_AVAILABLE and not args.poll:
+                try:
+                    watch_loop(targets, detector, args.debounce, max(args.debounce, MAX_DEBOUNCE))
+                except OSError as e:
+                    logging.warning(f"inotify недоступен ({e}), перехожу на опрос.")
+                    args.poll = True
+            else:
+                poll_loop(targets, detector, args.interval)
         except Exception as e:
             logging.error(f"Ошибка в демоне: {e}")
             time.sleep(10)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Настройки соединения: WAL позволяет читать GUI-потоку, пока воркер пишет,
+# synchronous=NORMAL в режиме WAL не делает fsync на каждый коммит.
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),       # ~16 МБ страничного кэша на соединение
+    ("mmap_size", 268435456),     # 256 МБ memory-mapped I/O
+    ("temp_store", "MEMORY"),
+)
+
+# Размер кэша подготовленных выражений sqlite3 на одно соединение
+STATEMENT_CACHE_SIZE = 256
+
+
+class Migration(NamedTuple):
+    """Шаг миграции схемы: после применения PRAGMA user_version = version."""
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+
+def find_full_scans(conn: sqlite3.Connection, queries: Sequence[Tuple[str, tuple]]) -> List[Tuple[str, str]]:
+    """Возвращает (запрос, шаг плана) для запросов, план которых содержит полный просмотр таблицы."""
+    offenders = []
+    for sql, params in queries:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[-1]
+            if detail.startswith("SCAN ") and "USING" not in detail and "VIRTUAL TABLE" not in detail:
+                offenders.append((" ".join(sql.split()), detail))
+    return offenders
+
+
+class ConnectionManager:
+    """Менеджер соединений SQLite: одно долгоживущее соединение на поток."""
+
+    def __init__(self, db_path: str, pragmas: Optional[Tuple] = None,
+                 cached_statements: int = STATEMENT_CACHE_SIZE, timeout: float = 30.0):
+        self.db_path = db_path
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False нужен только для close_all(): соединение
+        # по-прежнему используется исключительно потоком-владельцем.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _prune_dead(self):
+        """Закрывает соединения потоков, которые уже завершились."""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._connections[ident]
+
+    def connection(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока, создавая его при первом обращении."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._prune_dead()
+                self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+        return conn
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Выполняет запрос на соединении текущего потока (для чтения)."""
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Cursor]:
+        """Курсор внутри транзакции: commit при успехе, rollback при ошибке.
+
+        immediate=True сразу берёт блокировку записи (BEGIN IMMEDIATE) — для
+        последовательностей «прочитать и решить, что записать».
+        """
+        conn = self.connection()
+        cur = conn.cursor()
+        try:
+            if immediate:
+                cur.execute("BEGIN IMMEDIATE")
+            yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def migrate(self, migrations: Sequence[Migration]) -> Tuple[int, int]:
+        """Применяет недостающие миграции по порядку, каждую в своей транзакции.
+
+        Текущая версия схемы хранится в PRAGMA user_version. Возвращает
+        (версия до, версия после).
+        """
+        conn = self.connection()
+        start = conn.execute("PRAGMA user_version").fetchone()[0]
+        version = start
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version <= version:
+                continue
+            # BEGIN IMMEDIATE: другой процесс не применит ту же миграцию параллельно
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if migration.version > version:
+                    cur = conn.cursor()
+                    migration.apply(cur)
+                    cur.close()
+                    conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+                    version = migration.version
+                    self.logger.info(f"Схема {self.db_path}: применена миграция {version} ({migration.description})")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return start, version
+
+    def close_thread_connection(self):
+        """Закрывает соединение текущего потока (например, перед выходом воркера)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+            conn.close()
+
+    def close_all(self):
+        """Закрывает все открытые соединения."""
+        with self._lock:
+            for _, conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Не удалось закрыть соединение с {self.db_path}: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+
+    @property
+    def open_connections(self) -> int:
+        with self._lock:
+            return len(self._connections)
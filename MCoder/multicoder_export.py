@@ -0,0 +1,202 @@
+import csv
+import gzip
+import io
+import json
+import os
+from typing import Dict, Optional
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+SECTION_TITLES = {
+    "messages": "СООБЩЕНИЯ",
+    "files": "ФАЙЛЫ",
+    "security": "СОБЫТИЯ БЕЗОПАСНОСТИ",
+}
+
+# Шрифты с кириллицей для PDF; если ни один не найден, используется Helvetica
+PDF_FONT_CANDIDATES = (
+    r"C:\Windows\Fonts\arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+)
+
+
+def format_record(section: str, record: Dict) -> str:
+    """Текстовое представление строки отчёта (TXT и PDF)."""
+    if section == "messages":
+        return f"[{record['timestamp']}] {record['sender']} ({record['type']}): {record['content']}"
+    if section == "files":
+        return f"{record['filename']} | {record['file_path']} | {record['file_size']} байт | {record['uploaded_at']}"
+    return f"[{record['timestamp']}] {record['action']} | {record['risk_level']} | {record['details']}"
+
+
+class ReportWriter:
+    """Базовый писатель отчёта: заголовок, секции и строки поступают потоково.
+
+    При compress=True вывод сжимается gzip (к имени файла добавляется .gz).
+    """
+
+    extension = ""
+    binary = False
+
+    def __init__(self, filename_base: str, compress: bool = False):
+        self.compress = compress
+        self.path = f"{filename_base}.{self.extension}" + (".gz" if compress else "")
+        self._raw = None
+        self.stream = None
+
+    def open(self):
+        if self.compress:
+            self._raw = gzip.open(self.path, "wb")
+        else:
+            self._raw = open(self.path, "wb")
+        if self.binary:
+            self.stream = self._raw
+        else:
+            self.stream = io.TextIOWrapper(self._raw, encoding="utf-8", newline="")
+
+    def header(self, project_id: int, status: Dict):
+        pass
+
+    def section(self, name: str, count: int):
+        pass
+
+    def row(self, section: str, record: Dict):
+        raise NotImplementedError
+
+    def close(self):
+        if self.stream is not None and self.stream is not self._raw:
+            self.stream.close()
+        elif self._raw is not None:
+            self._raw.close()
+        self.stream = self._raw = None
+
+
+class TxtReportWriter(ReportWriter):
+    extension = "txt"
+
+    def header(self, project_id, status):
+        self.stream.write(f"=== ОТЧЁТ ПО ПРОЕКТУ #{project_id} ===\n")
+        self.stream.write(f"Имя: {status['name']}\nОписание: {status['description']}\n"
+                          f"Статус: {status['status']}\nСоздан: {status['created_at']}\n")
+
+    def section(self, name, count):
+        self.stream.write(f"\n--- {SECTION_TITLES[name]} ({count}) ---\n")
+
+    def row(self, section, record):
+        self.stream.write(format_record(section, record) + "\n")
+
+
+class JsonlReportWriter(ReportWriter):
+    """Одна JSON-запись на строку: {"section": ..., поля записи}."""
+    extension = "jsonl"
+
+    def _write(self, obj):
+        self.stream.write(json.dumps(obj, ensure_ascii=False, default=str) + "\n")
+
+    def header(self, project_id, status):
+        self._write(dict(status, section="project", id=project_id))
+
+    def row(self, section, record):
+        self._write(dict(record, section=section))
+
+
+class CsvReportWriter(ReportWriter):
+    """Все секции в одной таблице с общим набором колонок."""
+    extension = "csv"
+    COLUMNS = ("section", "timestamp", "sender", "type", "content", "filename", "file_path",
+               "file_size", "action", "risk_level", "details")
+
+    def open(self):
+        super().open()
+        self._csv = csv.DictWriter(self.stream, fieldnames=self.COLUMNS, extrasaction="ignore")
+        self._csv.writeheader()
+
+    def row(self, section, record):
+        values = dict(record, section=section)
+        if section == "files":
+            values["timestamp"] = record.get("uploaded_at")
+        self._csv.writerow(values)
+
+
+class PdfReportWriter(ReportWriter):
+    """PDF через reportlab с переносом строк по реальной ширине текста.
+
+    reportlab собирает страницы в памяти до save(), поэтому объём памяти
+    пропорционален размеру PDF, но не размеру выборки из базы.
+    """
+    extension = "pdf"
+    binary = True
+    MARGIN = 40
+    FONT_SIZE = 8
+    LEADING = 10
+
+    def open(self):
+        super().open()
+        self.font, self.bold_font = self._register_font()
+        self.canvas = canvas.Canvas(self.stream, pagesize=A4)
+        self.width, self.height = A4
+        self.text_width = self.width - 2 * self.MARGIN
+        self.y = self.height - self.MARGIN
+
+    @staticmethod
+    def _register_font():
+        for path in PDF_FONT_CANDIDATES:
+            if os.path.exists(path):
+                if "MultiCoderFont" not in pdfmetrics.getRegisteredFontNames():
+                    pdfmetrics.registerFont(TTFont("MultiCoderFont", path))
+                return "MultiCoderFont", "MultiCoderFont"
+        return "Helvetica", "Helvetica-Bold"
+
+    def _line(self, text, font, size, leading):
+        for part in simpleSplit(text, font, size, self.text_width) or [""]:
+            if self.y < self.MARGIN:
+                self.canvas.showPage()
+                self.y = self.height - self.MARGIN
+            self.canvas.setFont(font, size)
+            self.canvas.drawString(self.MARGIN, self.y, part)
+            self.y -= leading
+
+    def header(self, project_id, status):
+        self._line(f"ОТЧЁТ ПО ПРОЕКТУ #{project_id}", self.bold_font, 14, 30)
+        for label, key in (("Имя", "name"), ("Описание", "description"),
+                           ("Статус", "status"), ("Создан", "created_at")):
+            self._line(f"{label}: {status[key]}", self.font, 10, 15)
+        self.y -= 10
+
+    def section(self, name, count):
+        self.y -= 10
+        self._line(f"{SECTION_TITLES[name]} ({count})", self.bold_font, 12, 18)
+
+    def row(self, section, record):
+        self._line(format_record(section, record), self.font, self.FONT_SIZE, self.LEADING)
+
+    def close(self):
+        if self.stream is not None:
+            self.canvas.save()
+        super().close()
+
+
+REPORT_WRITERS = {
+    "txt": TxtReportWriter,
+    "jsonl": JsonlReportWriter,
+    "csv": CsvReportWriter,
+    "pdf": PdfReportWriter,
+}
+
+
+def create_writer(fmt: str, filename_base: str, compress: bool = False) -> Optional[ReportWriter]:
+    """Писатель для формата fmt; None для PDF без reportlab."""
+    if fmt not in REPORT_WRITERS:
+        raise ValueError(f"Неизвестный формат отчёта: {fmt}")
+    if fmt == "pdf" and not REPORTLAB_AVAILABLE:
+        return None
+    return REPORT_WRITERS[fmt](filename_base, compress)
@@ -1,47 +1,251 @@
 import sys
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QPushButton, QLabel, QScrollArea, QSizePolicy, QFrame, QFileDialog, QProgressBar
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QPushButton, QLabel, QSizePolicy, QFrame, QFileDialog, QProgressBar,
+    QListView, QAbstractItemView, QStyledItemDelegate, QTreeWidget, QTreeWidgetItem
+)
+from PyQt5.QtGui import QIcon, QFont, QTextCursor, QColor, QFontMetrics, QPainter
+from PyQt5.QtCore import (
+    Qt, QMimeData, pyqtSignal, QAbstractListModel, QModelIndex, QRect, QSize, QObject, QTimer
 )
-from PyQt5.QtGui import QIcon, QFont, QTextCursor
-from PyQt5.QtCore import Qt, QMimeData
 import os
+from itertools import islice
 from multicoder_core import multicoder_core
-from multicoder_ai import ai_integration
+from multicoder_ai import GenerationError, ai_integration
+from multicoder_jobs import JobHandle, JobQueueFull
 import threading
 
-class ChatMessage(QFrame):
-    def __init__(self, text, is_user):
-        super().__init__()
-        self.setStyleSheet(f"""
-            QFrame {{
-                background: {'#f4f6fa' if is_user else '#e6e8ec'};
-                border-radius: 12px;
-                margin: 4px 0;
-                padding: 12px 16px;
-            }}
-            QLabel {{
-                font-size: 1.1em;
-                color: #222;
-            }}
-        """)
-        layout = QVBoxLayout(self)
-        label = QLabel(text)
-        label.setWordWrap(True)
-        layout.addWidget(label)
-        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Minimum)
+# Сколько сообщений истории подгружается за раз при прокрутке вверх
+CHAT_PAGE_SIZE = 100
+# На каком расстоянии от верха списка (пиксели) начинается подгрузка
+CHAT_LOAD_THRESHOLD = 200
+# Отступы пузыря сообщения: снаружи, внутри и между блоками текста/кода
+BUBBLE_MARGIN_X, BUBBLE_MARGIN_Y = 16, 4
+BUBBLE_PADDING_X, BUBBLE_PADDING_Y = 16, 12
+BLOCK_SPACING = 6
+
+
+def split_code_blocks(text):
+    """Делит сообщение на блоки (is_code, текст) по ограничителям ```."""
+    blocks = []
+    for i, part in enumerate(text.split("```")):
+        part = part.strip("\n")
+        if part:
+            blocks.append((i % 2 == 1, part))
+    return blocks
+
+
+class ChatMessage:
+    """Сообщение чата в модели; layout_cache — размеры блоков для последней ширины."""
+    __slots__ = ("text", "is_user", "message_id", "layout_cache")
+
+    def __init__(self, text, is_user, message_id=None):
+        self.text = text
+        self.is_user = is_user
+        self.message_id = message_id
+        self.layout_cache = None
+
+
+class ChatListModel(QAbstractListModel):
+    """Список сообщений чата; виджеты не создаются — строки рисует делегат."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.messages = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        msg = self.messages[index.row()]
+        if role == Qt.DisplayRole:
+            return msg.text
+        if role == Qt.UserRole:
+            return msg
+        return None
+
+    def append(self, msg):
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(msg)
+        self.endInsertRows()
+
+    def prepend(self, messages):
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self.messages[:0] = messages
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.messages = []
+        self.endResetModel()
+
+    def index_of(self, msg):
+        """Индекс сообщения; поиск с конца — дописываются обычно последние."""
+        for row in range(len(self.messages) - 1, -1, -1):
+            if self.messages[row] is msg:
+                return self.index(row)
+        return QModelIndex()
+
+
+class ChatBubbleDelegate(QStyledItemDelegate):
+    """Рисует сообщение пузырём; код между ``` — моноширинным шрифтом на отдельном фоне.
+
+    Высота перенесённого текста считается один раз для ширины области и
+    хранится в ChatMessage.layout_cache до изменения текста или ширины.
+    """
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.text_font = QFont("Segoe UI", 11)
+        self.code_font = QFont("Consolas", 10)
+        self.code_font.setStyleHint(QFont.Monospace)
+
+    def _layout(self, msg, width):
+        if msg.layout_cache is not None and msg.layout_cache[0] == width:
+            return msg.layout_cache
+        text_width = max(50, width - 2 * (BUBBLE_MARGIN_X + BUBBLE_PADDING_X))
+        blocks = []
+        height = 2 * (BUBBLE_MARGIN_Y + BUBBLE_PADDING_Y)
+        for is_code, text in split_code_blocks(msg.text) or [(False, "")]:
+            font = self.code_font if is_code else self.text_font
+            flags = Qt.TextWrapAnywhere if is_code else Qt.TextWordWrap
+            rect = QFontMetrics(font).boundingRect(QRect(0, 0, text_width, 1 << 24), flags, text)
+            blocks.append((is_code, text, rect.height()))
+            height += rect.height() + (2 * BLOCK_SPACING if is_code else 0)
+        height += BLOCK_SPACING * (len(blocks) - 1)
+        msg.layout_cache = (width, height, text_width, blocks)
+        return msg.layout_cache
+
+    def sizeHint(self, option, index):
+        width = self.view.viewport().width()
+        return QSize(width, self._layout(index.data(Qt.UserRole), width)[1])
+
+    def paint(self, painter, option, index):
+        msg = index.data(Qt.UserRole)
+        _, _, text_width, blocks = self._layout(msg, self.view.viewport().width())
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        bubble = option.rect.adjusted(BUBBLE_MARGIN_X, BUBBLE_MARGIN_Y, -BUBBLE_MARGIN_X, -BUBBLE_MARGIN_Y)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#f4f6fa" if msg.is_user else "#e6e8ec"))
+        painter.drawRoundedRect(bubble, 12, 12)
+        x = bubble.left() + BUBBLE_PADDING_X
+        y = bubble.top() + BUBBLE_PADDING_Y
+        for is_code, text, height in blocks:
+            if is_code:
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(QColor("#f7f7f8"))
+                painter.drawRoundedRect(QRect(x - 6, y, text_width + 12, height + 2 * BLOCK_SPACING), 6, 6)
+                y += BLOCK_SPACING
+            painter.setPen(QColor("#222"))
+            painter.setFont(self.code_font if is_code else self.text_font)
+            flags = Qt.TextWrapAnywhere if is_code else Qt.TextWordWrap
+            painter.drawText(QRect(x, y, text_width, height), flags, text)
+            y += height + BLOCK_SPACING + (BLOCK_SPACING if is_code else 0)
+        painter.restore()
+
+
+class ChatArea(QListView):
+    """Лента чата на QListView: рисуются только видимые строки.
+
+    История проекта загружается страницами по CHAT_PAGE_SIZE: последние
+    сообщения — через get_project_history, более старые — при прокрутке
+    к верху через iter_project_history.
+    """
 
-class ChatArea(QWidget):
     def __init__(self):
         super().__init__()
-        self.layout = QVBoxLayout(self)
-        self.layout.setAlignment(Qt.AlignTop)
-        self.layout.setSpacing(8)
-        self.layout.setContentsMargins(16, 16, 16, 16)
+        self.chat_model = ChatListModel(self)
+        self.setModel(self.chat_model)
+        self.delegate = ChatBubbleDelegate(self)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(200)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setStyleSheet("border: none; background: #fff;")
+        self.project_id = None
+        self.oldest_id = None
+        self.has_more = False
+        self.loading = False
+        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    def at_bottom(self):
+        bar = self.verticalScrollBar()
+        return bar.value() >= bar.maximum() - 4
 
     def add_message(self, text, is_user):
+        """Добавляет сообщение (только из GUI-потока; рабочие потоки используют GuiUpdateBus)."""
         msg = ChatMessage(text, is_user)
-        self.layout.addWidget(msg)
-        self.layout.update()
+        self.append_message(msg)
+        return msg
+
+    def append_message(self, msg, follow=None):
+        follow = self.at_bottom() if follow is None else follow
+        self.chat_model.append(msg)
+        if follow:
+            self.scrollToBottom()
+
+    def append_text(self, msg, text):
+        """Дописывает фрагмент в сообщение и пересчитывает только его высоту."""
+        follow = self.at_bottom()
+        msg.text += text
+        self.refresh_message(msg)
+        if follow:
+            self.scrollToBottom()
+
+    def refresh_message(self, msg):
+        """Сбрасывает кэш высоты изменившегося сообщения и перерисовывает его."""
+        index = self.chat_model.index_of(msg)
+        if not index.isValid():
+            return
+        msg.layout_cache = None
+        self.delegate.sizeHintChanged.emit(index)
+
+    @staticmethod
+    def _from_history(rows):
+        """Строки истории (новые первыми) -> сообщения модели в хронологическом порядке."""
+        return [ChatMessage(row["content"], row["sender"] == "user", row["id"]) for row in reversed(rows)]
+
+    def load_project(self, project_id):
+        """Показывает последние сообщения проекта; более старые подгружаются при прокрутке."""
+        self.chat_model.clear()
+        self.project_id = project_id
+        rows = multicoder_core.get_project_history(project_id, limit=CHAT_PAGE_SIZE)
+        self.has_more = len(rows) == CHAT_PAGE_SIZE
+        self.oldest_id = rows[-1]["id"] if rows else None
+        self.chat_model.prepend(self._from_history(rows))
+        self.scrollToBottom()
+
+    def load_older(self):
+        """Подгружает страницу сообщений старше самого раннего показанного."""
+        if self.loading or not self.has_more or self.oldest_id is None:
+            return
+        self.loading = True
+        try:
+            rows = list(islice(multicoder_core.iter_project_history(
+                self.project_id, after_id=self.oldest_id, batch=CHAT_PAGE_SIZE, descending=True
+            ), CHAT_PAGE_SIZE))
+            self.has_more = len(rows) == CHAT_PAGE_SIZE
+            if rows:
+                self.oldest_id = rows[-1]["id"]
+                self.chat_model.prepend(self._from_history(rows))
+                # Сохраняем положение: прежнее первое сообщение остаётся наверху
+                self.scrollTo(self.chat_model.index(len(rows)), QAbstractItemView.PositionAtTop)
+        finally:
+            self.loading = False
+
+    def on_scroll(self, value):
+        if value <= CHAT_LOAD_THRESHOLD and self.has_more:
+            self.load_older()
 
 class FileDropArea(QFrame):
     def __init__(self, on_file_selected):
@@ -67,21 +271,159 @@ class FileDropArea(QFrame):
         self.setCursor(Qt.PointingHandCursor)
 
     def mousePressEvent(self, event):
-        fname, _ = QFileDialog.getOpenFileName(self, "Выберите файл", "", "Все файлы (*)")
-        if fname:
-            self.on_file_selected(fname)
+        fnames, _ = QFileDialog.getOpenFileNames(self, "Выберите файлы", "", "Все файлы (*)")
+        if fnames:
+            self.on_file_selected(fnames)
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
     def dropEvent(self, event):
-        urls = event.mimeData().urls()
-        if urls:
-            fname = urls[0].toLocalFile()
-            self.on_file_selected(fname)
+        fnames = [url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()]
+        if fnames:
+            self.on_file_selected(fnames)
+
+# Интервал объединения обновлений чата (мс) — не чаще одной перерисовки за кадр
+GUI_FRAME_MS = 16
+
+JOB_STATE_TITLES = {"queued": "в очереди", "running": "выполняется"}
+
+
+class GuiUpdateBus(QObject):
+    """Шина обновлений чата из рабочих потоков в GUI-поток.
+
+    Методы post_message, append и call можно вызывать из любого потока:
+    операции копятся в очереди под блокировкой, а GUI-поток применяет их
+    пачкой не чаще раза в GUI_FRAME_MS. Фрагменты одного сообщения за кадр
+    склеиваются, и его высота пересчитывается один раз.
+    """
+    _wake = pyqtSignal()
+
+    def __init__(self, chat_area, parent=None):
+        super().__init__(parent)
+        self.chat_area = chat_area
+        self._ops = []
+        self._lock = threading.Lock()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(GUI_FRAME_MS)
+        self._timer.timeout.connect(self.flush)
+        # Сигнал из чужого потока доставляется через очередь событий GUI-потока
+        self._wake.connect(self._schedule)
+
+    def _post(self, op):
+        with self._lock:
+            self._ops.append(op)
+            first = len(self._ops) == 1
+        if first:
+            self._wake.emit()
+
+    def post_message(self, text, is_user=False):
+        """Добавляет сообщение в чат; возвращает его для последующих append()."""
+        msg = ChatMessage(text, is_user)
+        self._post(("add", msg, None))
+        return msg
+
+    def append(self, msg, text):
+        self._post(("append", msg, text))
+
+    def call(self, fn):
+        """Выполняет fn() в GUI-потоке в порядке остальных операций."""
+        self._post(("call", fn, None))
+
+    def _schedule(self):
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            ops, self._ops = self._ops, []
+        if not ops:
+            return
+        follow = self.chat_area.at_bottom()
+        changed = {}
+        for kind, target, text in ops:
+            if kind == "add":
+                self.chat_area.append_message(target, follow=False)
+            elif kind == "append":
+                target.text += text
+                changed[id(target)] = target
+            else:
+                target()
+        for msg in changed.values():
+            self.chat_area.refresh_message(msg)
+        if follow:
+            self.chat_area.scrollToBottom()
+
+
+class JobsPanel(QFrame):
+    """Панель фоновых задач планировщика ядра: состояние, прогресс и отмена.
+
+    Слушатель планировщика вызывается из рабочих потоков и лишь планирует
+    обновление через GuiUpdateBus; частые изменения прогресса объединяются.
+    """
+
+    def __init__(self, scheduler, bus):
+        super().__init__()
+        self.scheduler = scheduler
+        self.bus = bus
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.setStyleSheet("QFrame { background: #f7f7f8; border-top: 1px solid #e6e8ec; }")
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(16, 4, 16, 4)
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Задача", "Тип", "Состояние", "Прогресс"])
+        self.tree.setRootIsDecorated(False)
+        self.tree.setMaximumHeight(110)
+        self.tree.setColumnWidth(0, 320)
+        self.tree.setColumnWidth(2, 120)
+        layout.addWidget(self.tree, 1)
+        self.cancel_btn = QPushButton("Отменить")
+        self.cancel_btn.clicked.connect(self.cancel_selected)
+        layout.addWidget(self.cancel_btn, 0, Qt.AlignTop)
+        self.setVisible(False)
+        scheduler.add_listener(self.on_job_changed)
+
+    def on_job_changed(self, handle):
+        with self._lock:
+            if self._dirty:
+                return
+            self._dirty = True
+        self.bus.call(self.refresh)
+
+    def refresh(self):
+        with self._lock:
+            self._dirty = False
+        active = self.scheduler.jobs(include_finished=False)
+        self.setVisible(bool(active))
+        selected = self.selected_job_id()
+        self.tree.clear()
+        for handle in active:
+            state = "отменяется" if handle.cancelled else JOB_STATE_TITLES.get(handle.state, handle.state)
+            item = QTreeWidgetItem([handle.name, handle.job_class, state, f"{int(handle.progress * 100)}%"])
+            item.setData(0, Qt.UserRole, handle.id)
+            self.tree.addTopLevelItem(item)
+            if handle.id == selected:
+                item.setSelected(True)
+
+    def selected_job_id(self):
+        items = self.tree.selectedItems()
+        return items[0].data(0, Qt.UserRole) if items else None
+
+    def cancel_selected(self):
+        job_id = self.selected_job_id()
+        for handle in self.scheduler.jobs(include_finished=False):
+            if handle.id == job_id:
+                handle.cancel()
+
 
 class MainWindow(QWidget):
+    # Сигналы из потоков загрузки файлов (обрабатываются в GUI-потоке)
+    ingest_progress = pyqtSignal(int)
+    ingest_finished = pyqtSignal(str, bool, str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("MultiCoder")
@@ -89,6 +431,18 @@ class MainWindow(QWidget):
         self.setMinimumSize(600, 500)
         self.setStyleSheet("background: #fff;")
         self.current_project_id = None
+        self.pending_files = 0
+        self.ingest_progress.connect(self.progress_bar_set_value)
+        self.ingest_finished.connect(self.on_file_ingested)
+        # Текущий запрос чата (задача планировщика ядра); отменяется новым сообщением
+        self.current_job = None
+        # Фоновый экспорт отчёта и его последний прогресс (обновления прогресса объединяются)
+        self.export_job = None
+        self._export_percent = 0
+        self._export_progress_pending = False
+        self._export_lock = threading.Lock()
+        # Повторные запросы генерации и проверки кода обслуживаются из memory_cache
+        ai_integration.enable_response_cache(multicoder_core.db)
         self.init_ui()
 
     def init_ui(self):
@@ -96,16 +450,17 @@ class MainWindow(QWidget):
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout.setSpacing(0)
 
-        # Chat scroll area
+        # Chat list (прокрутка и отрисовка видимых строк — в самом QListView)
         self.chat_area_widget = ChatArea()
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setWidget(self.chat_area_widget)
-        scroll.setStyleSheet("border: none;")
-        main_layout.addWidget(scroll, 1)
+        self.bus = GuiUpdateBus(self.chat_area_widget, self)
+        main_layout.addWidget(self.chat_area_widget, 1)
+
+        # Панель фоновых задач (видна, пока есть активные задачи)
+        self.jobs_panel = JobsPanel(multicoder_core.scheduler, self.bus)
+        main_layout.addWidget(self.jobs_panel, 0)
 
         # File drop area
-        self.file_drop = FileDropArea(self.handle_file_selected)
+        self.file_drop = FileDropArea(self.handle_files_selected)
         main_layout.addWidget(self.file_drop, 0)
 
         # Progress bar (скрыт по умолчанию)
@@ -132,6 +487,13 @@ class MainWindow(QWidget):
         self.input_box.installEventFilter(self)
         input_layout.addWidget(self.input_box, 1)
 
+        self.export_btn = QPushButton("Отчёт")
+        self.export_btn.setToolTip("Экспортировать отчёт по проекту (TXT и PDF)")
+        self.export_btn.setFixedHeight(40)
+        self.export_btn.setStyleSheet("background: #fff; color: #10a37f; border: 1px solid #10a37f; border-radius: 8px; padding: 0 12px;")
+        self.export_btn.clicked.connect(self.export_report)
+        input_layout.addWidget(self.export_btn)
+
         self.send_btn = QPushButton()
         self.send_btn.setText("→")
         self.send_btn.setFont(QFont("Arial", 16, QFont.Bold))
@@ -159,6 +521,7 @@ class MainWindow(QWidget):
                     "Новый проект",
                     f"Создан для задачи: {text[:50]}..."
                 )
+                self.chat_area_widget.load_project(self.current_project_id)
             except ValueError as e:
                 self.chat_area_widget.add_message(f"Ошибка безопасности: {str(e)}", is_user=False)
                 self.input_box.clear()
@@ -169,25 +532,38 @@ class MainWindow(QWidget):
         multicoder_core.add_message(self.current_project_id, "user", text)
         self.input_box.clear()
         
-        # Обрабатываем сообщение в отдельном потоке
-        threading.Thread(target=self.process_message, args=(text,), daemon=True).start()
+        # Предыдущий запрос больше не нужен — отменяем его
+        if self.current_job is not None:
+            self.current_job.cancel()
+
+        # Обрабатываем сообщение интерактивной задачей ядра; результаты приходят через шину
+        try:
+            self.current_job = multicoder_core.scheduler.submit(
+                "interactive", self.process_message, text, name=f"Запрос: {text[:40]}", block=False
+            )
+        except JobQueueFull:
+            self.chat_area_widget.add_message("Слишком много запросов в обработке, попробуйте позже.", is_user=False)
         
-    def process_message(self, text: str):
-        """Обработка сообщения пользователя"""
+    def process_message(self, job: JobHandle, text: str):
+        """Обработка сообщения пользователя (в потоке пула)"""
         try:
             # Проверяем, не является ли это поисковым запросом
             if text.lower().startswith(('найди', 'поиск', 'ищи', 'search')):
-                self.handle_search_request(text)
+                self.handle_search_request(job, text)
             else:
-                self.handle_code_generation_request(text)
+                self.handle_code_generation_request(job, text)
         except Exception as e:
-            self.chat_area_widget.add_message(f"Ошибка обработки: {str(e)}", is_user=False)
+            if not job.cancelled:
+                self.bus.post_message(f"Ошибка обработки: {str(e)}", is_user=False)
             
-    def handle_search_request(self, query: str):
+    def handle_search_request(self, job: JobHandle, query: str):
         """Обработка поискового запроса"""
-        self.chat_area_widget.add_message("🔍 Ищу информацию в интернете...", is_user=False)
+        status = self.bus.post_message("🔍 Ищу информацию в интернете...", is_user=False)
         
         results = ai_integration.search_internet(query)
+        if job.cancelled:
+            self.bus.append(status, "\n\n⏹ Поиск отменён: отправлено новое сообщение.")
+            return
         
         if results:
             response = "Найдены следующие результаты:\n\n"
@@ -200,74 +576,184 @@ class MainWindow(QWidget):
         else:
             response = "К сожалению, ничего не найдено. Попробуйте изменить запрос."
             
-        self.chat_area_widget.add_message(response, is_user=False)
+        self.bus.post_message(response, is_user=False)
         multicoder_core.add_message(self.current_project_id, "assistant", response)
         
-    def handle_code_generation_request(self, prompt: str):
-        """Обработка запроса на генерацию кода"""
-        self.chat_area_widget.add_message("🤖 Анализирую задачу и генерирую код...", is_user=False)
-        
-        # Генерируем код через несколько нейросетей
-        generation_result = ai_integration.generate_code_multi(prompt)
-        
-        if generation_result['success']:
-            # Берём первый успешный результат
-            service_name = list(generation_result['results'].keys())[0]
-            code = generation_result['results'][service_name]['code']
-            
-            # Анализируем безопасность
-            security_analysis = ai_integration.analyze_security(code)
-            
-            if security_analysis['safe']:
-                response = f"✅ Код сгенерирован через {service_name.upper()}:\n\n```\n{code}\n```\n\nХотите собрать exe-файл? (да/нет)"
-            else:
-                response = f"⚠️ Код сгенерирован, но обнаружены проблемы безопасности:\n\n"
-                for issue in security_analysis['issues']:
-                    response += f"• {issue}\n"
-                response += f"\n```\n{code}\n```\n\nРекомендация: {security_analysis['recommendation']}"
-        else:
-            response = f"❌ Ошибка генерации кода:\n"
-            for error in generation_result['errors']:
+    def handle_code_generation_request(self, job: JobHandle, prompt: str):
+        """Обработка запроса на генерацию кода: код выводится в чат по мере генерации"""
+        message = self.bus.post_message("🤖 Анализирую задачу и генерирую код...\n\n", is_user=False)
+
+        # Генерируем код потоково; fallback на другую нейросеть — до первого фрагмента
+        service_name = None
+        code_parts = []
+        stream = ai_integration.generate_code_stream(prompt)
+        try:
+            for chunk in stream:
+                if job.cancelled:
+                    break
+                if service_name is None:
+                    service_name = chunk.service
+                    self.bus.append(message, f"Код от {service_name.upper()}:\n\n```\n")
+                code_parts.append(chunk.text)
+                self.bus.append(message, chunk.text)
+        except GenerationError as e:
+            response = "❌ Ошибка генерации кода:\n"
+            for error in e.errors:
                 response += f"• {error}\n"
-                
-        self.chat_area_widget.add_message(response, is_user=False)
+            self.bus.append(message, response)
+            multicoder_core.add_message(self.current_project_id, "assistant", response)
+            return
+        except Exception as e:
+            self.bus.append(message, f"\n```\n\n❌ Генерация прервана: {str(e)}")
+            return
+        finally:
+            # Закрытие генератора останавливает запрос к нейросети
+            stream.close()
+
+        if job.cancelled:
+            self.bus.append(message, ("\n```\n\n" if service_name else "") + "⏹ Генерация отменена: отправлено новое сообщение.")
+            return
+
+        code = "".join(code_parts)
+        # Анализируем безопасность
+        security_analysis = ai_integration.analyze_security(code)
+
+        if security_analysis['safe']:
+            verdict = "\n```\n\n✅ Проверка безопасности пройдена. Хотите собрать exe-файл? (да/нет)"
+        else:
+            verdict = "\n```\n\n⚠️ Обнаружены проблемы безопасности:\n"
+            for issue in security_analysis['issues']:
+                verdict += f"• {issue}\n"
+            verdict += f"\nРекомендация: {security_analysis['recommendation']}"
+        self.bus.append(message, verdict)
+
+        response = f"Код сгенерирован через {service_name.upper()}:\n\n```\n{code}{verdict}"
         multicoder_core.add_message(self.current_project_id, "assistant", response)
-        
+
         # Если код безопасен, предлагаем сборку
-        if generation_result['success'] and security_analysis['safe']:
+        if security_analysis['safe']:
             # Здесь можно добавить логику сборки exe
             pass
 
-    def handle_file_selected(self, fname):
-        size_mb = os.path.getsize(fname) / (1024 * 1024)
-        if size_mb > 50:
-            self.chat_area_widget.add_message(f"Ошибка: файл '{os.path.basename(fname)}' превышает 50 МБ.", is_user=False)
+    def handle_files_selected(self, fnames):
+        """Загрузка выбранных файлов в пуле потоков ядра с общим прогрессом."""
+        accepted = []
+        for fname in fnames:
+            size_mb = os.path.getsize(fname) / (1024 * 1024)
+            if size_mb > 50:
+                self.chat_area_widget.add_message(f"Ошибка: файл '{os.path.basename(fname)}' превышает 50 МБ.", is_user=False)
+            else:
+                accepted.append(fname)
+        if not accepted:
             return
             
         # Создаём проект, если его нет
         if not self.current_project_id:
             try:
                 self.current_project_id = multicoder_core.create_project(
-                    f"Проект с файлом {os.path.basename(fname)}",
-                    f"Автоматически создан для файла {fname}"
+                    f"Проект с файлом {os.path.basename(accepted[0])}",
+                    f"Автоматически создан для файла {accepted[0]}"
                 )
+                self.chat_area_widget.load_project(self.current_project_id)
             except ValueError as e:
                 self.chat_area_widget.add_message(f"Ошибка безопасности: {str(e)}", is_user=False)
                 return
                 
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
-        self.chat_area_widget.add_message(f"Файл '{os.path.basename(fname)}' выбран. Загрузка...", is_user=True)
+        names = ", ".join(f"'{os.path.basename(f)}'" for f in accepted)
+        self.chat_area_widget.add_message(f"Выбрано файлов: {len(accepted)} ({names}). Загрузка...", is_user=True)
+        self.pending_files += len(accepted)
         
-        # Добавляем файл в проект
+        # Хэширование и запись идут задачами ядра; результаты приходят сигналами
         try:
-            if multicoder_core.add_file(self.current_project_id, fname):
-                self.progress_bar.setValue(100)
-                self.chat_area_widget.add_message(f"Файл '{os.path.basename(fname)}' успешно загружен в проект.", is_user=False)
-            else:
-                self.chat_area_widget.add_message(f"Ошибка при загрузке файла '{os.path.basename(fname)}'.", is_user=False)
+            handles = multicoder_core.ingest_files(
+                self.current_project_id, accepted,
+                lambda done, total: self.ingest_progress.emit(int(done * 100 / total) if total else 100),
+                block=False
+            )
+        except JobQueueFull as e:
+            self.pending_files -= len(accepted)
+            self.chat_area_widget.add_message(f"Ошибка: {str(e)}", is_user=False)
+            return
+        for fname, handle in zip(accepted, handles):
+            handle.add_done_callback(lambda h, fname=fname: self.emit_file_result(fname, h))
+
+    def emit_file_result(self, fname, handle):
+        """Вызывается в рабочем потоке: передаёт результат загрузки в GUI-поток."""
+        try:
+            self.ingest_finished.emit(fname, bool(handle.result()), "")
         except Exception as e:
+            self.ingest_finished.emit(fname, False, str(e))
+
+    def progress_bar_set_value(self, percent):
+        self.progress_bar.setValue(percent)
+
+    def on_file_ingested(self, fname, ok, error):
+        self.pending_files -= 1
+        if ok:
+            self.chat_area_widget.add_message(f"Файл '{os.path.basename(fname)}' успешно загружен в проект.", is_user=False)
+        elif error:
+            self.chat_area_widget.add_message(f"Ошибка: {error}", is_user=False)
+        else:
+            self.chat_area_widget.add_message(f"Ошибка при загрузке файла '{os.path.basename(fname)}'.", is_user=False)
+        if self.pending_files <= 0:
+            self.pending_files = 0
+            self.progress_bar.setValue(100)
+
+    def export_report(self):
+        """Экспорт отчёта по проекту фоновой задачей ядра с прогрессом в полосе загрузки.
+
+        Задача видна в панели задач и отменяется там же.
+        """
+        if not self.current_project_id:
+            self.chat_area_widget.add_message("Нет проекта для отчёта: начните диалог или загрузите файл.", is_user=False)
+            return
+        if self.export_job is not None and not self.export_job.done():
+            self.chat_area_widget.add_message("Отчёт уже формируется.", is_user=False)
+            return
+        try:
+            self.export_job = multicoder_core.submit_export(
+                self.current_project_id,
+                progress_callback=lambda done, total: self.post_export_progress(int(done * 100 / total) if total else 100),
+                block=False
+            )
+        except JobQueueFull as e:
             self.chat_area_widget.add_message(f"Ошибка: {str(e)}", is_user=False)
+            return
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.chat_area_widget.add_message("📄 Формирую отчёт по проекту...", is_user=False)
+        self.export_job.add_done_callback(lambda handle: self.bus.call(lambda: self.on_export_finished(handle)))
+
+    def post_export_progress(self, percent):
+        """Вызывается в рабочем потоке: в GUI-поток уходит одно обновление на кадр шины."""
+        with self._export_lock:
+            self._export_percent = percent
+            if self._export_progress_pending:
+                return
+            self._export_progress_pending = True
+        self.bus.call(self.apply_export_progress)
+
+    def apply_export_progress(self):
+        with self._export_lock:
+            self._export_progress_pending = False
+            percent = self._export_percent
+        self.progress_bar.setValue(percent)
+
+    def on_export_finished(self, handle):
+        if handle.cancelled:
+            self.progress_bar.setValue(0)
+            self.chat_area_widget.add_message("⏹ Экспорт отчёта отменён.", is_user=False)
+            return
+        try:
+            paths = handle.result()
+        except Exception as e:
+            self.chat_area_widget.add_message(f"❌ Ошибка экспорта отчёта: {str(e)}", is_user=False)
+            return
+        self.progress_bar.setValue(100)
+        files = "\n".join(f"• {fmt.upper()}: {path}" for fmt, path in paths.items())
+        self.chat_area_widget.add_message(f"✅ Отчёт по проекту готов:\n{files}", is_user=False)
 
     def eventFilter(self, obj, event):
         if obj == self.input_box and event.type() == event.KeyPress:
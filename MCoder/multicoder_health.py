@@ -0,0 +1,201 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль q (0..1) по методу ближайшего ранга; None для пустого списка."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class CircuitBreaker:
+    """Автомат защиты для одной нейросети: closed -> open -> half_open -> closed.
+
+    Учитывает вызовы за последние window секунд. Ошибкой считается и
+    исключение, и пустой ответ, и вызов дольше slow_call секунд. При доле
+    ошибок не ниже error_threshold (и хотя бы min_calls вызовах) автомат
+    размыкается на cooldown секунд; затем пропускает один пробный вызов:
+    успех замыкает его, ошибка размыкает снова с удвоенной паузой (до max_cooldown).
+    """
+
+    def __init__(self, window: float = 60.0, min_calls: int = 4, error_threshold: float = 0.5,
+                 slow_call: float = 10.0, cooldown: float = 30.0, max_cooldown: float = 600.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.slow_call = slow_call
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = STATE_CLOSED
+        self.opened_at = 0.0
+        self._trial_started: Optional[float] = None
+        self._calls = deque()  # (время, успех, задержка)
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _open(self, now: float):
+        self.state = STATE_OPEN
+        self.opened_at = now
+        self._trial_started = None
+
+    def allow_request(self) -> bool:
+        """Можно ли сейчас отправить запрос (в half_open — только один пробный).
+
+        Пробный вызов, результат которого так и не поступил (например, запрос
+        отменён), через cooldown секунд уступает место следующему.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_OPEN and now - self.opened_at >= self.cooldown:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_HALF_OPEN and (
+                    self._trial_started is None or now - self._trial_started >= self.cooldown):
+                self._trial_started = now
+                return True
+            return False
+
+    def ready_for_probe(self) -> bool:
+        """Пора проверить доступность: пауза истекла, а пробный вызов не идёт."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_OPEN:
+                return now - self.opened_at >= self.cooldown
+            return self.state == STATE_HALF_OPEN and (
+                self._trial_started is None or now - self._trial_started >= self.cooldown)
+
+    def release_trial(self):
+        """Возвращает место пробного вызова, если вызов отменён и результата не будет."""
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._trial_started = None
+
+    def record(self, success: bool, latency: Optional[float] = None):
+        """Учитывает результат вызова и при необходимости меняет состояние."""
+        with self._lock:
+            now = time.monotonic()
+            if success and latency is not None and latency > self.slow_call:
+                success = False
+            self._calls.append((now, success, latency))
+            self._trim(now)
+            if self.state == STATE_HALF_OPEN:
+                if success:
+                    self.state = STATE_CLOSED
+                    self.cooldown = self.base_cooldown
+                    self._trial_started = None
+                    self._calls.clear()
+                    self._calls.append((now, success, latency))
+                else:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                    self._open(now)
+                return
+            if self.state == STATE_CLOSED and len(self._calls) >= self.min_calls:
+                errors = sum(1 for _, ok, _ in self._calls if not ok)
+                if errors / len(self._calls) >= self.error_threshold:
+                    self._open(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = [lat for _, ok, lat in self._calls if ok and lat is not None]
+            errors = sum(1 for _, ok, _ in self._calls if not ok)
+            return {
+                "state": self.state,
+                "calls": len(self._calls),
+                "error_rate": errors / len(self._calls) if self._calls else 0.0,
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+            }
+
+
+class ProviderHealthMonitor:
+    """Автоматы защиты всех нейросетей и фоновые пробы для разомкнутых.
+
+    probe(service) -> bool вызывается в фоновом потоке раз в probe_interval
+    секунд для разомкнутых автоматов с истёкшей паузой; успешная проба
+    возвращает нейросеть в работу.
+    """
+
+    def __init__(self, services: List[str], probe: Optional[Callable[[str], bool]] = None,
+                 probe_interval: float = 15.0, **breaker_options):
+        self.logger = logging.getLogger(__name__)
+        self.breakers = {service: CircuitBreaker(**breaker_options) for service in services}
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def allow_request(self, service: str) -> bool:
+        return self.breakers[service].allow_request()
+
+    def release(self, service: str):
+        """Вызов, пропущенный allow_request, отменён без результата."""
+        self.breakers[service].release_trial()
+
+    def record(self, service: str, success: bool, latency: Optional[float] = None):
+        breaker = self.breakers[service]
+        before = breaker.state
+        breaker.record(success, latency)
+        if breaker.state != before:
+            self.logger.warning(f"Нейросеть {service}: состояние {before} -> {breaker.state}")
+
+    def order_by_latency(self, services: List[str]) -> List[str]:
+        """Сортирует нейросети по наблюдаемым p50/p95; без статистики — в исходном порядке в конце."""
+        def key(item):
+            index, service = item
+            stats = self.breakers[service].stats()
+            if stats["p50"] is None:
+                return (1, 0.0, 0.0, index)
+            return (0, stats["p50"], stats["p95"], index)
+        return [service for _, service in sorted(enumerate(services), key=key)]
+
+    def run_probes(self):
+        """Один цикл проб для разомкнутых автоматов с истёкшей паузой."""
+        if self.probe is None:
+            return
+        for service, breaker in self.breakers.items():
+            if not breaker.ready_for_probe() or not breaker.allow_request():
+                continue
+            start = time.monotonic()
+            try:
+                ok = bool(self.probe(service))
+            except Exception as e:
+                self.logger.info(f"Проба нейросети {service} не прошла: {e}")
+                ok = False
+            self.record(service, ok, time.monotonic() - start)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ProviderHealthMonitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.run_probes()
+            except Exception as e:
+                self.logger.error(f"Ошибка фоновой проверки нейросетей: {e}")
+
+    def stats(self) -> Dict[str, Dict]:
+        return {service: breaker.stats() for service, breaker in self.breakers.items()}
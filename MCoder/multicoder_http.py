@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401 — urllib3 распаковывает br, если модуль установлен
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Таймауты по умолчанию (секунды): установка соединения и ожидание данных
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 30.0
+
+# Коды ответа, после которых идемпотентный запрос повторяется
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = frozenset(("HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"))
+
+
+class JitterRetry(Retry):
+    """Retry с экспоненциальной паузой, случайным разбросом ±jitter и потолком max_backoff."""
+
+    def __init__(self, *args, jitter: float = 0.3, max_backoff: float = 10.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        retry.max_backoff = self.max_backoff
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0.0
+        # Разброс не даёт нескольким потокам повторять запрос одновременно
+        backoff *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(backoff, self.max_backoff)
+
+
+class HTTPTransport:
+    """Общий HTTP-транспорт: пул keep-alive соединений, повторы и раздельные таймауты.
+
+    Все запросы идут через одну requests.Session с HTTPAdapter: для каждого
+    хоста держится до pool_maxsize соединений (pool_block=True — лишние потоки
+    ждут свободного соединения, а не открывают новые), пулы pool_connections
+    последних хостов переиспользуются. Идемпотентные запросы повторяются при
+    ошибках соединения и ответах из RETRY_STATUSES с паузой
+    backoff_factor * 2^n и разбросом jitter; POST не повторяется. Ответы gzip и
+    deflate (и br при установленном brotli) распаковываются автоматически.
+    Пул urllib3 потокобезопасен; заголовки сессии задаются только при создании,
+    поэтому один транспорт можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 8, max_retries: int = 3,
+                 backoff_factor: float = 0.5, jitter: float = 0.3, max_backoff: float = 10.0,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 user_agent: str = DEFAULT_USER_AGENT):
+        self.logger = logging.getLogger(__name__)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry = JitterRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            jitter=jitter,
+            max_backoff=max_backoff,
+        )
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=self.retry, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Accept-Encoding': "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate",
+            'Connection': 'keep-alive',
+        })
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.failures = 0
+
+    def request(self, method: str, url: str, connect_timeout: Optional[float] = None,
+                read_timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """Выполняет запрос с раздельными таймаутами соединения и чтения."""
+        timeout = (
+            self.connect_timeout if connect_timeout is None else connect_timeout,
+            self.read_timeout if read_timeout is None else read_timeout,
+        )
+        with self._lock:
+            self.requests_sent += 1
+        try:
+            return self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.failures += 1
+            raise
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Число открытых соединений и выполненных запросов по хостам (для проверки переиспользования)."""
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+        return stats
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"requests": self.requests_sent, "failures": self.failures, "pools": self.pool_stats()}
+
+    def close(self):
+        self.session.close()
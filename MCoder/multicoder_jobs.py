@@ -0,0 +1,297 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Приоритеты: меньшее значение выполняется раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+# Классы задач: (число потоков, размер очереди, приоритет по умолчанию).
+# У каждого класса свой пул, поэтому экспорт не занимает потоки чата.
+DEFAULT_JOB_CLASSES = {
+    "interactive": (2, 16, PRIORITY_INTERACTIVE),
+    "ingest": (4, 256, PRIORITY_NORMAL),
+    "export": (1, 8, PRIORITY_BACKGROUND),
+}
+
+# Сколько завершённых задач хранится для jobs() и панели задач
+RECENT_JOBS_KEEP = 50
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+FINISHED_STATES = (STATE_DONE, STATE_FAILED, STATE_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Задача отменена; поднимается из JobHandle.check_cancelled()."""
+
+
+class JobQueueFull(Exception):
+    """Очередь класса задач заполнена, а ждать места вызывающий не захотел."""
+
+
+class JobHandle:
+    """Описатель задачи: состояние, прогресс, отмена и результат.
+
+    Функция задачи получает описатель первым аргументом и сообщает прогресс
+    через set_progress(); отмена кооперативная — задача проверяет cancelled
+    или вызывает check_cancelled(). Интерфейс result()/add_done_callback()
+    совместим с concurrent.futures.Future.
+    """
+
+    def __init__(self, job_id: int, name: str, job_class: str, priority: int, scheduler: "JobScheduler"):
+        self.id = job_id
+        self.name = name
+        self.job_class = job_class
+        self.priority = priority
+        self.state = STATE_QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._scheduler = scheduler
+        self._result = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._callbacks: List[Callable] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Просит задачу остановиться; задача из очереди не будет запущена."""
+        self._cancel.set()
+        self._scheduler._notify(self)
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def set_progress(self, progress: float, message: Optional[str] = None):
+        """progress — доля выполнения 0..1; при отменённой задаче поднимает JobCancelled."""
+        self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+        self._scheduler._notify(self)
+        self.check_cancelled()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: Optional[float] = None):
+        """Ждёт завершения; возвращает результат или поднимает исключение задачи."""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Задача {self.name} не завершилась за {timeout} с")
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+    def add_done_callback(self, fn: Callable[["JobHandle"], None]):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self, state: str, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            self.state = state
+            self._result = result
+            self.error = error
+            self.finished_at = time.time()
+            if state == STATE_DONE:
+                self.progress = 1.0
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        self._scheduler._retire(self)
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Ошибка в обработчике завершения задачи {self.name}: {e}")
+
+    def snapshot(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "class": self.job_class,
+            "priority": self.priority,
+            "state": self.state,
+            "progress": self.progress,
+            "message": self.message,
+            "cancelled": self.cancelled,
+            "error": str(self.error) if self.error else None,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_STOP = object()
+
+
+class _JobPool:
+    """Потоки и приоритетная очередь одного класса задач."""
+
+    def __init__(self, name: str, workers: int, max_queue: int, default_priority: int):
+        self.name = name
+        self.workers = workers
+        self.default_priority = default_priority
+        self.queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=max_queue)
+        self.threads: List[threading.Thread] = []
+
+
+class JobScheduler:
+    """Планировщик фоновых задач с пулами по классам, приоритетами и обратным давлением.
+
+    Не зависит от Qt и может использоваться из скриптов:
+
+        handle = multicoder_core.scheduler.submit("export", export_fn, project_id)
+        handle.result()
+
+    Потоки класса создаются при первой задаче. submit() при заполненной
+    очереди ждёт места (block=True, не дольше timeout) или поднимает
+    JobQueueFull. Слушатели add_listener(fn) вызываются из рабочих потоков
+    при каждом изменении состояния или прогресса задачи.
+    """
+
+    def __init__(self, job_classes: Optional[Dict[str, Tuple[int, int, int]]] = None):
+        self.logger = logging.getLogger(__name__)
+        self._pools = {name: _JobPool(name, *spec) for name, spec in (job_classes or DEFAULT_JOB_CLASSES).items()}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active: Dict[int, JobHandle] = {}
+        self._recent: "deque[JobHandle]" = deque(maxlen=RECENT_JOBS_KEEP)
+        self._listeners: List[Callable[[JobHandle], None]] = []
+        self._shutdown = False
+
+    def submit(self, job_class: str, fn: Callable, *args, name: Optional[str] = None,
+               priority: Optional[int] = None, block: bool = True, timeout: Optional[float] = None,
+               **kwargs) -> JobHandle:
+        """Ставит fn(handle, *args, **kwargs) в очередь класса job_class."""
+        pool = self._pools.get(job_class)
+        if pool is None:
+            raise ValueError(f"Неизвестный класс задач: {job_class}")
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Планировщик задач остановлен")
+            self._ensure_workers(pool)
+            job_id = next(self._ids)
+        priority = pool.default_priority if priority is None else priority
+        handle = JobHandle(job_id, name or getattr(fn, "__name__", "job"), job_class, priority, self)
+        with self._lock:
+            self._active[job_id] = handle
+        try:
+            pool.queue.put((priority, job_id, handle, fn, args, kwargs), block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                del self._active[job_id]
+            raise JobQueueFull(f"Очередь задач '{job_class}' заполнена ({pool.queue.maxsize})")
+        self._notify(handle)
+        return handle
+
+    def _ensure_workers(self, pool: _JobPool):
+        pool.threads = [t for t in pool.threads if t.is_alive()]
+        for i in range(len(pool.threads), pool.workers):
+            thread = threading.Thread(target=self._worker, args=(pool,), name=f"job-{pool.name}-{i}", daemon=True)
+            thread.start()
+            pool.threads.append(thread)
+
+    def _worker(self, pool: _JobPool):
+        while True:
+            item = pool.queue.get()
+            if item[2] is _STOP:
+                return
+            _, _, handle, fn, args, kwargs = item
+            if handle.cancelled:
+                handle._finish(STATE_CANCELLED)
+                continue
+            handle.state = STATE_RUNNING
+            handle.started_at = time.time()
+            self._notify(handle)
+            try:
+                result = fn(handle, *args, **kwargs)
+            except JobCancelled as e:
+                handle._finish(STATE_CANCELLED, error=e)
+            except Exception as e:
+                self.logger.error(f"Задача {handle.name} ({pool.name}) завершилась с ошибкой: {e}")
+                handle._finish(STATE_FAILED, error=e)
+            else:
+                handle._finish(STATE_CANCELLED if handle.cancelled else STATE_DONE, result=result)
+
+    def _retire(self, handle: JobHandle):
+        with self._lock:
+            self._active.pop(handle.id, None)
+            self._recent.append(handle)
+        self._notify(handle)
+
+    def add_listener(self, fn: Callable[[JobHandle], None]):
+        with self._lock:
+            self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[JobHandle], None]):
+        with self._lock:
+            if fn in self._listeners:
+                self._listeners.remove(fn)
+
+    def _notify(self, handle: JobHandle):
+        with self._lock:
+            listeners = list(self._listeners)
+        for fn in listeners:
+            try:
+                fn(handle)
+            except Exception as e:
+                self.logger.error(f"Ошибка слушателя планировщика задач: {e}")
+
+    def jobs(self, include_finished: bool = True) -> List[JobHandle]:
+        """Активные задачи (и недавно завершённые) в порядке постановки."""
+        with self._lock:
+            handles = list(self._active.values())
+            if include_finished:
+                handles += list(self._recent)
+        return sorted(handles, key=lambda h: h.id)
+
+    def cancel_all(self, job_class: Optional[str] = None):
+        for handle in self.jobs(include_finished=False):
+            if job_class is None or handle.job_class == job_class:
+                handle.cancel()
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            active = list(self._active.values())
+        return {
+            name: {
+                "workers": pool.workers,
+                "queued": sum(1 for h in active if h.job_class == name and h.state == STATE_QUEUED),
+                "running": sum(1 for h in active if h.job_class == name and h.state == STATE_RUNNING),
+                "queue_limit": pool.queue.maxsize,
+            }
+            for name, pool in self._pools.items()
+        }
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Останавливает потоки после выполнения поставленных задач (или отменяет их)."""
+        with self._lock:
+            self._shutdown = True
+        if cancel_pending:
+            self.cancel_all()
+        for pool in self._pools.values():
+            for _ in pool.threads:
+                # Стоп-маркер с наименьшим приоритетом выполняется после всех задач
+                pool.queue.put((float("inf"), float("inf"), _STOP, None, None, None))
+            if wait:
+                for thread in pool.threads:
+                    thread.join()
+            pool.threads = []
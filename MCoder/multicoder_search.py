@@ -0,0 +1,278 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, quote, urlparse
+
+from multicoder_http import HTTPTransport
+
+DUCKDUCKGO_HTML_URL = "https://html.duckduckgo.com/html/?q={query}"
+DEFAULT_SEARCH_CACHE_DIR = "search_cache"
+DEFAULT_SEARCH_TTL = 3600.0
+DEFAULT_MAX_RESULTS = 10
+# Размер порции при потоковом чтении страницы результатов
+SEARCH_READ_CHUNK = 8192
+
+
+def unwrap_result_url(href: str) -> str:
+    """Достаёт целевой адрес из ссылки-редиректа DuckDuckGo (//duckduckgo.com/l/?uddg=...)."""
+    if href.startswith("//"):
+        href = "https:" + href
+    parsed = urlparse(href)
+    if parsed.path.startswith("/l/"):
+        target = parse_qs(parsed.query).get("uddg")
+        if target:
+            return target[0]
+    return href
+
+
+def classify_result(url: str, title: str) -> str:
+    """Тип результата для чата: репозиторий GitHub, документация или общий."""
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host == "github.com" or host.endswith(".github.com"):
+        return "github_repo"
+    text = f"{host}{parsed.path} {title}".lower()
+    if "docs" in text or "documentation" in text or "readthedocs" in host:
+        return "documentation"
+    return "general"
+
+
+class DuckDuckGoResultParser(HTMLParser):
+    """Потоковый разбор HTML-выдачи DuckDuckGo: заголовок, ссылка и описание.
+
+    Страница подаётся через feed() порциями; после max_results результатов
+    (с описанием последнего) выставляется done, и дальнейшее чтение не нужно.
+    """
+
+    def __init__(self, max_results: int = DEFAULT_MAX_RESULTS):
+        super().__init__(convert_charrefs=True)
+        self.max_results = max_results
+        self.results: List[Dict] = []
+        self.done = False
+        self._field: Optional[str] = None
+        self._tag: Optional[str] = None
+        self._depth = 0
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self._field is not None:
+            if tag == self._tag:
+                self._depth += 1
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "a" and "result__a" in classes:
+            if len(self.results) >= self.max_results:
+                self.done = True
+                return
+            self.results.append({"title": "", "url": unwrap_result_url(attrs.get("href") or ""),
+                                 "description": ""})
+            self._start("title", tag)
+        elif "result__snippet" in classes and self.results and not self.results[-1]["description"]:
+            self._start("description", tag)
+
+    def _start(self, field: str, tag: str):
+        self._field = field
+        self._tag = tag
+        self._depth = 1
+        self._text = []
+
+    def handle_endtag(self, tag):
+        if self._field is None or tag != self._tag:
+            return
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        self.results[-1][self._field] = " ".join("".join(self._text).split())
+        if self._field == "description" and len(self.results) >= self.max_results:
+            self.done = True
+        self._field = None
+
+    def handle_data(self, data):
+        if self._field is not None:
+            self._text.append(data)
+
+    def feed_chunks(self, chunks: Iterable[str]) -> List[Dict]:
+        """Разбирает порции страницы, пока не набрано max_results результатов."""
+        for chunk in chunks:
+            self.feed(chunk)
+            if self.done:
+                break
+        return self.parsed_results()
+
+    def parsed_results(self) -> List[Dict]:
+        results = []
+        for result in self.results[:self.max_results]:
+            if not result["title"] or not result["url"]:
+                continue
+            results.append(dict(result, type=classify_result(result["url"], result["title"])))
+        return results
+
+
+def parse_results(html: str, max_results: int = DEFAULT_MAX_RESULTS) -> List[Dict]:
+    """Разбирает сохранённую страницу выдачи (например, записанную для проверки парсера)."""
+    return DuckDuckGoResultParser(max_results).feed_chunks([html])
+
+
+class SearchCache:
+    """Кэш результатов поиска на диске: один JSON-файл на запрос, срок жизни по mtime."""
+
+    def __init__(self, directory: str = DEFAULT_SEARCH_CACHE_DIR, ttl: float = DEFAULT_SEARCH_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["results"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key: str, results: List[Dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        # Запись во временный файл и замена — читатель не увидит половину файла
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "results": results}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            self.logger.warning(f"Не удалось сохранить результаты поиска в кэш: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def prune(self) -> int:
+        """Удаляет устаревшие файлы кэша; возвращает их число."""
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        now = time.time()
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Объединяет одновременные вызовы с одинаковым ключом в одно выполнение."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+
+class WebSearch:
+    """Поиск через HTML-версию DuckDuckGo с кэшем на диске и объединением одинаковых запросов.
+
+    Страница читается потоково и разбирается по мере поступления; загрузка
+    прекращается, как только набрано max_results результатов.
+    """
+
+    def __init__(self, transport: HTTPTransport, cache: Optional[SearchCache] = None,
+                 max_results: int = DEFAULT_MAX_RESULTS, read_timeout: float = 10.0):
+        self.transport = transport
+        self.cache = cache if cache is not None else SearchCache()
+        self.max_results = max_results
+        self.read_timeout = read_timeout
+        self.logger = logging.getLogger(__name__)
+        self.flights = SingleFlight()
+        self.fetches = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(query: str, max_results: int) -> str:
+        return f"duckduckgo:{max_results}:{' '.join(query.lower().split())}"
+
+    def search(self, query: str, max_results: Optional[int] = None) -> List[Dict]:
+        max_results = max_results or self.max_results
+        key = self.cache_key(query, max_results)
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self.cache_hits += 1
+            return cached
+        return self.flights.do(key, lambda: self._fetch_and_store(key, query, max_results))
+
+    def _fetch_and_store(self, key: str, query: str, max_results: int) -> List[Dict]:
+        # Пока ждали своей очереди, результат мог появиться в кэше
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self.cache_hits += 1
+            return cached
+        results = self.fetch(query, max_results)
+        if results:
+            self.cache.set(key, results)
+        return results
+
+    def fetch(self, query: str, max_results: int) -> List[Dict]:
+        """Загружает и разбирает выдачу, не дочитывая страницу после max_results результатов."""
+        with self._lock:
+            self.fetches += 1
+        url = DUCKDUCKGO_HTML_URL.format(query=quote(query))
+        response = self.transport.get(url, read_timeout=self.read_timeout, stream=True)
+        try:
+            response.raise_for_status()
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            chunks = (decoder.decode(chunk) for chunk in response.iter_content(SEARCH_READ_CHUNK))
+            return DuckDuckGoResultParser(max_results).feed_chunks(chunks)
+        finally:
+            response.close()
@@ -0,0 +1,370 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from multicoder_db import ConnectionManager
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# С какого числа паттернов текст просматривается автоматом Ахо–Корасик за один проход;
+# порог ниже встроенных наборов, str.find по каждому паттерну — только для крошечных наборов
+AHOCORASICK_MIN_PATTERNS = 8
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP = "drop"
+
+RISK_LEVELS = ("LOW", "MEDIUM", "HIGH")
+
+# Файл с пользовательскими наборами правил; наборы из файла заменяют встроенные
+DEFAULT_RULES_PATH = "security_rules.json"
+
+DEFAULT_RULE_MESSAGE = "Обнаружен опасный паттерн: {pattern}"
+
+# Встроенные наборы правил: "content" — сообщения и файлы (MultiCoderCore.security_check),
+# "code" — сгенерированный код (AIIntegration.analyze_security)
+DEFAULT_RULE_SETS = {
+    "content": [
+        {"pattern": p, "risk_level": "HIGH"} for p in (
+            "hack", "exploit", "virus", "malware", "backdoor", "keylogger",
+            "password cracker", "ddos", "sql injection", "xss"
+        )
+    ],
+    "code": [
+        {"pattern": p, "risk_level": "HIGH"} for p in (
+            "os.system", "subprocess.call", "eval(", "exec(",
+            "open(", "file(", "__import__", "globals()",
+            "locals()", "vars()", "dir()", "type("
+        )
+    ] + [
+        {"pattern": p, "risk_level": "MEDIUM", "message": "Обнаружены сетевые операции"}
+        for p in ("requests.get", "urllib")
+    ],
+}
+
+
+def max_risk(*levels: str) -> str:
+    """Возвращает наибольший из уровней риска."""
+    return max(levels, key=RISK_LEVELS.index)
+
+
+class _FlushRequest:
+    """Маркер в очереди: записать накопленный пакет и сообщить об этом."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class AuditLogWriter:
+    """Фоновая пакетная запись событий безопасности в security_log.
+
+    События кладутся в ограниченную очередь, поток-писатель сбрасывает их
+    одной транзакцией через executemany, когда набирается batch_size
+    событий или проходит flush_interval секунд с первого события пакета.
+    При переполнении очереди поведение задаётся overflow: "block" ждёт
+    свободного места, "drop" отбрасывает событие и увеличивает счётчик dropped.
+    """
+
+    def __init__(self, db: ConnectionManager, batch_size: int = 200, flush_interval: float = 0.5,
+                 max_queue: int = 10000, overflow: str = OVERFLOW_BLOCK):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP):
+            raise ValueError(f"Неизвестная политика переполнения: {overflow}")
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.logger = logging.getLogger(__name__)
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Запускает поток-писатель (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="AuditLogWriter", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, action: str, risk_level: str, details: str, project_id: Optional[int] = None) -> bool:
+        """Ставит событие в очередь. Возвращает False, если событие отброшено."""
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        event = (action, risk_level, details, timestamp, project_id)
+        if self._thread is None or not self._thread.is_alive():
+            # Писатель не запущен или уже остановлен — пишем синхронно
+            self._write([event])
+            return True
+        if self.overflow == OVERFLOW_BLOCK:
+            self._queue.put(event)
+            return True
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                self.logger.warning(f"Очередь аудита переполнена, отброшено событий: {dropped}")
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дожидается записи всех событий, поставленных до вызова."""
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Записывает остаток очереди и останавливает поток-писатель."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def _write(self, batch: List[Tuple]):
+        if not batch:
+            return
+        try:
+            with self.db.transaction() as c:
+                c.executemany('''
+                    INSERT INTO security_log (action, risk_level, details, timestamp, project_id)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', batch)
+            with self._lock:
+                self.written += len(batch)
+        except Exception as e:
+            self.logger.error(f"Ошибка записи пакета аудита ({len(batch)} событий): {e}")
+
+    def _run(self):
+        batch: List[Tuple] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is None or isinstance(item, _FlushRequest) or item is _STOP:
+                self._write(batch)
+                batch, deadline = [], None
+                if isinstance(item, _FlushRequest):
+                    item.done.set()
+                elif item is _STOP:
+                    self.db.close_thread_connection()
+                    return
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch, deadline = [], None
+
+
+class RuleMatch(NamedTuple):
+    pattern: str
+    risk_level: str
+    message: str
+    start: int
+    end: int
+
+
+class CompiledRuleSet:
+    """Набор правил, скомпилированный один раз для многократных проверок.
+
+    Наборы от AHOCORASICK_MIN_PATTERNS паттернов (в том числе встроенные) при
+    установленном pyahocorasick собираются в автомат Ахо–Корасик, и текст
+    просматривается за один проход с учётом пересекающихся совпадений: время
+    проверки не растёт с числом паттернов. Для крошечных наборов быстрее
+    str.find по каждому паттерну в одной копии текста в нижнем регистре;
+    объединённое регулярное выражение на CPython в разы медленнее обоих
+    вариантов. Смещения отсчитываются в тексте после lower().
+    """
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = []
+        for rule in rules:
+            if not isinstance(rule, dict):
+                raise ValueError(f"Правило должно быть объектом, получено: {rule!r}")
+            pattern, risk_level, message = rule["pattern"], rule.get("risk_level", "HIGH"), rule.get("message")
+            if not isinstance(pattern, str):
+                raise ValueError(f"Паттерн правила должен быть строкой, получено: {pattern!r}")
+            if not isinstance(risk_level, str):
+                raise ValueError(f"Уровень риска у правила '{pattern}' должен быть строкой, получено: {risk_level!r}")
+            if message is not None and not isinstance(message, str):
+                raise ValueError(f"Сообщение у правила '{pattern}' должно быть строкой, получено: {message!r}")
+            pattern = pattern.lower()
+            risk_level = risk_level.upper()
+            if risk_level not in RISK_LEVELS:
+                raise ValueError(f"Неизвестный уровень риска '{risk_level}' у правила '{pattern}'")
+            message = message or DEFAULT_RULE_MESSAGE.format(pattern=pattern)
+            self.rules.append((pattern, risk_level, message))
+        self.patterns = list(dict.fromkeys(r[0] for r in self.rules if r[0]))
+        self.by_pattern: Dict[str, List[int]] = {p: [] for p in self.patterns}
+        for i, (pattern, _, _) in enumerate(self.rules):
+            if pattern:
+                self.by_pattern[pattern].append(i)
+        self.automaton = None
+        if AHOCORASICK_AVAILABLE and len(self.patterns) >= AHOCORASICK_MIN_PATTERNS:
+            self.automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                self.automaton.add_word(pattern, pattern)
+            self.automaton.make_automaton()
+
+    def _iter_hits(self, text: str, first_only: bool):
+        """Порождает пары (паттерн, смещение начала) в тексте нижнего регистра."""
+        if self.automaton is not None:
+            seen = set()
+            for end, pattern in self.automaton.iter(text):
+                if first_only:
+                    if pattern in seen:
+                        continue
+                    seen.add(pattern)
+                yield pattern, end - len(pattern) + 1
+                if first_only and len(seen) == len(self.patterns):
+                    return
+            return
+        for pattern in self.patterns:
+            pos = text.find(pattern)
+            while pos != -1:
+                yield pattern, pos
+                if first_only:
+                    break
+                pos = text.find(pattern, pos + 1)
+
+    def scan(self, text: str, first_only: bool = False) -> List[RuleMatch]:
+        """Находит совпадения всех правил в тексте.
+
+        При first_only=True для каждого паттерна возвращается только первое вхождение.
+        """
+        matches: List[RuleMatch] = []
+        for pattern, start in self._iter_hits(text.lower(), first_only):
+            for i in self.by_pattern[pattern]:
+                _, risk_level, message = self.rules[i]
+                matches.append(RuleMatch(pattern, risk_level, message, start, start + len(pattern)))
+        matches.sort(key=lambda m: m.start)
+        return matches
+
+    def evaluate(self, text: str) -> Dict:
+        """Вердикт по тексту: итоговый уровень риска, сообщения и смещения совпадений."""
+        matches = self.scan(text, first_only=True)
+        hit = {(m.pattern, m.message) for m in matches}
+        issues = []
+        risk_level = "LOW"
+        # Сообщения — в порядке правил, без повторов
+        for pattern, rule_risk, message in self.rules:
+            if (pattern, message) in hit:
+                risk_level = max_risk(risk_level, rule_risk)
+                if message not in issues:
+                    issues.append(message)
+        return {
+            "risk_level": risk_level,
+            "issues": issues,
+            "matches": [(m.pattern, m.start, m.end) for m in matches],
+        }
+
+
+class SecurityRuleEngine:
+    """Общий движок правил безопасности с перезагрузкой конфигурации на лету.
+
+    Наборы правил берутся из DEFAULT_RULE_SETS и переопределяются JSON-файлом
+    вида {"content": [{"pattern": "...", "risk_level": "HIGH", "message": "..."}], ...}.
+    Изменение файла подхватывается автоматически (проверка mtime не чаще
+    раза в check_interval секунд) или явным вызовом reload().
+    version — хэш действующих наборов правил, меняется при каждой их смене.
+    """
+
+    def __init__(self, config_path: Optional[str] = DEFAULT_RULES_PATH, check_interval: float = 1.0):
+        self.config_path = config_path
+        self.check_interval = check_interval
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._rule_sets: Dict[str, CompiledRuleSet] = {}
+        self._config_mtime = None
+        self._last_check = 0.0
+        self.version = ""
+        self.reload()
+
+    def _config_stat(self):
+        if not self.config_path:
+            return None
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _rules_version(rule_sets: Dict) -> str:
+        return hashlib.sha256(
+            json.dumps(rule_sets, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def reload(self) -> bool:
+        """Перечитывает конфигурацию. При ошибке остаются прежние правила
+        (при первой загрузке — встроенные)."""
+        with self._lock:
+            mtime = self._config_stat()
+            rule_sets = dict(DEFAULT_RULE_SETS)
+            try:
+                if mtime is not None:
+                    with open(self.config_path, "r", encoding="utf-8") as f:
+                        rule_sets.update(json.load(f))
+                compiled = {name: CompiledRuleSet(rules) for name, rules in rule_sets.items()}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.logger.error(f"Ошибка загрузки правил безопасности из {self.config_path}: {e}")
+                self._config_mtime = mtime
+                if not self._rule_sets:
+                    rule_sets = dict(DEFAULT_RULE_SETS)
+                    self._rule_sets = {name: CompiledRuleSet(rules) for name, rules in rule_sets.items()}
+                    self.version = self._rules_version(rule_sets)
+                return False
+            self._rule_sets = compiled
+            self.version = self._rules_version(rule_sets)
+            self._config_mtime = mtime
+            self._last_check = time.monotonic()
+            if mtime is not None:
+                self.logger.info(f"Загружены правила безопасности из {self.config_path}")
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._config_stat() != self._config_mtime:
+            self.reload()
+
+    def rule_set(self, name: str) -> CompiledRuleSet:
+        self._maybe_reload()
+        rule_set = self._rule_sets.get(name)
+        if rule_set is None:
+            raise KeyError(f"Набор правил '{name}' не найден")
+        return rule_set
+
+    def evaluate(self, name: str, text: str) -> Dict:
+        """Проверяет текст набором правил name."""
+        return self.rule_set(name).evaluate(text)
+
+
+# Глобальный движок правил безопасности
+security_rules = SecurityRuleEngine()
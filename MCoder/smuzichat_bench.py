@@ -0,0 +1,67 @@
+import argparse
+import os
+import tempfile
+import time
+
+from meta_multicoder_builder import KEYWORDS
+from smuzichat_reader import search_in_file, search_keywords
+
+DEFAULT_ARCHIVE = "smuzichat_5(хронология реальной попытки).txt"
+DEFAULT_SIZES_MB = "1,10,100,1000"
+
+
+def build_archive(source, path, size_mb):
+    """Собирает архив нужного размера, повторяя исходный архив целиком."""
+    with open(source, "r", encoding="utf-8") as f:
+        text = f.read()
+    if not text.endswith("\n"):
+        text += "\n"
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            f.write(text)
+            written += len(text.encode("utf-8"))
+
+
+def bench_legacy(path, keywords):
+    start = time.perf_counter()
+    results = {k: search_in_file(path, k) for k in keywords}
+    return time.perf_counter() - start, results
+
+
+def bench_single_pass(path, keywords):
+    start = time.perf_counter()
+    results = search_keywords(path, keywords)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение поиска по архиву: по слову за проход и все слова за один проход.")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE, help="Исходный архив, из которого собираются тестовые файлы")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES_MB, help="Размеры тестовых архивов в МБ через запятую")
+    parser.add_argument("--legacy-max-mb", type=int, default=100,
+                        help="Для архивов больше этого размера прежний поиск не запускается")
+    parser.add_argument("--tmpdir", default=None, help="Каталог для тестовых архивов")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmp:
+        print(f"{'МБ':>6} {'по слову, с':>12} {'один проход, с':>15} {'МБ/с':>8} {'ускорение':>10}")
+        for size_mb in sizes:
+            path = os.path.join(tmp, f"archive_{size_mb}mb.txt")
+            build_archive(args.archive, path, size_mb)
+            new_time, new_results = bench_single_pass(path, KEYWORDS)
+            if size_mb <= args.legacy_max_mb:
+                old_time, old_results = bench_legacy(path, KEYWORDS)
+                if old_results != new_results:
+                    raise SystemExit(f"Результаты различаются для архива {size_mb} МБ")
+                old_column, speedup = f"{old_time:12.2f}", f"{old_time / new_time:9.1f}x"
+            else:
+                old_column, speedup = f"{'—':>12}", f"{'—':>10}"
+            print(f"{size_mb:>6} {old_column} {new_time:15.2f} {size_mb / new_time:8.1f} {speedup}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import re
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Формат индекса; при изменении схемы индекс перестраивается полностью
+INDEX_VERSION = 1
+# Сколько байт в начале и в конце проиндексированной части архива хэшируется,
+# чтобы отличить дописанный архив от переписанного
+PREFIX_CHECK_BYTES = 64 * 1024
+# Сколько строк вставляется в индекс одним executemany
+INDEX_BATCH_LINES = 5000
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def normalize_token(token: str) -> str:
+    """Приводит токен к виду индекса: casefold и «ё» -> «е»."""
+    return token.casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[str]:
+    """Токены строки (кириллица, латиница, цифры) в нормализованном виде."""
+    return [normalize_token(t) for t in TOKEN_RE.findall(text)]
+
+
+def parse_query(query: str) -> Tuple[List[List[str]], List[str], List[str]]:
+    """Разбирает запрос на фразы ("..."), префиксы (слово*) и обычные слова."""
+    phrases, prefixes, terms = [], [], []
+    for phrase, word in QUERY_RE.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) > 1:
+                phrases.append(tokens)
+            else:
+                terms.extend(tokens)
+        elif word.endswith("*"):
+            prefixes.extend(tokenize(word[:-1])[:1])
+        else:
+            terms.extend(tokenize(word))
+    return phrases, prefixes, terms
+
+
+def _contains_phrase(tokens: List[str], phrase: List[str]) -> bool:
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+
+class LineIndex:
+    """Постоянный инвертированный индекс строк архива в SQLite.
+
+    Для каждого токена хранятся номера строк (postings), для каждой строки —
+    байтовое смещение в архиве (lines), так что поиск сводится к выборке
+    по индексу и чтению найденных строк через seek. update() сравнивает
+    размер и mtime архива с сохранёнными: дописанный архив (тот же хэш
+    начала и конца проиндексированной части, размер не меньше) индексируется
+    с последней полной строки, иначе индекс строится заново.
+    """
+
+    def __init__(self, archive_path: str, index_path: Optional[str] = None):
+        self.archive_path = archive_path
+        self.index_path = index_path or archive_path + ".idx"
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS lines (line_no INTEGER PRIMARY KEY, offset INTEGER NOT NULL)")
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS postings (
+                    token TEXT NOT NULL,
+                    line_no INTEGER NOT NULL,
+                    PRIMARY KEY (token, line_no)
+                ) WITHOUT ROWID
+            ''')
+
+    def close(self):
+        self.conn.close()
+
+    def _meta(self) -> Dict:
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def _prefix_hash(self, limit: int) -> str:
+        """Хэш первых limit байт архива: начало и окно перед limit по PREFIX_CHECK_BYTES."""
+        h = hashlib.sha256()
+        with open(self.archive_path, "rb") as f:
+            h.update(f.read(min(limit, PREFIX_CHECK_BYTES)))
+            if limit > PREFIX_CHECK_BYTES:
+                f.seek(max(PREFIX_CHECK_BYTES, limit - PREFIX_CHECK_BYTES))
+                h.update(f.read(limit - f.tell()))
+        return h.hexdigest()
+
+    def update(self) -> str:
+        """Приводит индекс в соответствие с архивом: "fresh", "incremental" или "rebuilt"."""
+        stat = os.stat(self.archive_path)
+        meta = self._meta()
+        if (meta.get("version") == INDEX_VERSION and meta.get("size") == stat.st_size
+                and meta.get("mtime_ns") == stat.st_mtime_ns):
+            return "fresh"
+        indexed = meta.get("indexed_bytes")
+        appended = (
+            meta.get("version") == INDEX_VERSION
+            and indexed is not None
+            and stat.st_size >= meta.get("size", 0)
+            and meta.get("prefix_hash") == self._prefix_hash(meta.get("prefix_bytes", 0))
+        )
+        if appended:
+            self._index_from(indexed, meta["next_line"], stat)
+            return "incremental"
+        with self.conn:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM lines")
+            self.conn.execute("DELETE FROM meta")
+        self._index_from(0, 1, stat)
+        return "rebuilt"
+
+    def _iter_lines(self, start: int, first_line: int) -> Iterator[Tuple[int, int, bytes]]:
+        """(номер строки, смещение, байты строки) начиная с байтового смещения start."""
+        with open(self.archive_path, "rb") as f:
+            f.seek(start)
+            offset = start
+            line_no = first_line
+            for raw in f:
+                yield line_no, offset, raw
+                offset += len(raw)
+                line_no += 1
+
+    def _index_from(self, start: int, first_line: int, stat: os.stat_result):
+        """Индексирует строки с байтового смещения start (начало строки first_line).
+
+        Незавершённая последняя строка индексируется, но следующее обновление
+        начнёт с неё заново, когда архив будет дописан.
+        """
+        conn = self.conn
+        with conn:
+            # Хвост с прошлого раза (незавершённая строка) перестраивается
+            conn.execute("DELETE FROM postings WHERE line_no >= ?", (first_line,))
+            conn.execute("DELETE FROM lines WHERE line_no >= ?", (first_line,))
+            line_rows: List[Tuple[int, int]] = []
+            posting_rows: List[Tuple[str, int]] = []
+            resume_offset, resume_line = start, first_line
+            for line_no, offset, raw in self._iter_lines(start, first_line):
+                line_rows.append((line_no, offset))
+                text = raw.decode("utf-8", errors="replace")
+                posting_rows.extend((token, line_no) for token in set(tokenize(text)))
+                if raw.endswith(b"\n"):
+                    resume_offset, resume_line = offset + len(raw), line_no + 1
+                if len(line_rows) >= INDEX_BATCH_LINES:
+                    conn.executemany("INSERT INTO lines VALUES (?, ?)", line_rows)
+                    conn.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)", posting_rows)
+                    line_rows, posting_rows = [], []
+            conn.executemany("INSERT INTO lines VALUES (?, ?)", line_rows)
+            conn.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)", posting_rows)
+            prefix_bytes = resume_offset
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+                ("version", INDEX_VERSION),
+                ("size", stat.st_size),
+                ("mtime_ns", stat.st_mtime_ns),
+                ("indexed_bytes", resume_offset),
+                ("next_line", resume_line),
+                ("prefix_bytes", prefix_bytes),
+                ("prefix_hash", self._prefix_hash(prefix_bytes)),
+            ])
+
+    def lookup(self, token: str) -> List[int]:
+        """Номера строк, содержащих токен, по возрастанию."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT line_no FROM postings WHERE token = ? ORDER BY line_no", (normalize_token(token),))]
+
+    def lookup_prefix(self, prefix: str) -> List[int]:
+        """Номера строк с токенами, начинающимися на prefix (диапазонная выборка по индексу)."""
+        prefix = normalize_token(prefix)
+        if not prefix:
+            return []
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT line_no FROM postings WHERE token >= ? AND token < ? ORDER BY line_no",
+            (prefix, upper))]
+
+    def read_lines(self, line_nos: Iterable[int]) -> List[Tuple[int, str]]:
+        """Читает строки по номерам через seek к сохранённым смещениям."""
+        line_nos = sorted(set(line_nos))
+        results = []
+        if not line_nos:
+            return results
+        offsets = {}
+        for i in range(0, len(line_nos), 500):
+            part = line_nos[i:i + 500]
+            offsets.update(self.conn.execute(
+                f"SELECT line_no, offset FROM lines WHERE line_no IN ({','.join('?' * len(part))})", part))
+        with open(self.archive_path, "rb") as f:
+            for line_no in line_nos:
+                if line_no not in offsets:
+                    continue
+                f.seek(offsets[line_no])
+                raw = f.readline()
+                results.append((line_no, raw.decode("utf-8", errors="replace").rstrip("\r\n")))
+        return results
+
+    def search(self, query: str, update: bool = True) -> List[Tuple[int, str]]:
+        """Строки, подходящие под все части запроса: слова, слово* и "фразы"."""
+        if update:
+            self.update()
+        phrases, prefixes, terms = parse_query(query)
+        candidates = None
+        for tokens in [[t] for t in terms] + phrases:
+            for token in tokens:
+                lines = set(self.lookup(token))
+                candidates = lines if candidates is None else candidates & lines
+        for prefix in prefixes:
+            lines = set(self.lookup_prefix(prefix))
+            candidates = lines if candidates is None else candidates & lines
+        if not candidates:
+            return []
+        results = self.read_lines(candidates)
+        if phrases:
+            results = [(n, line) for n, line in results
+                       if all(_contains_phrase(tokenize(line), p) for p in phrases)]
+        return results
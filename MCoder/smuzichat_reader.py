@@ -1,5 +1,18 @@
 import argparse
+import codecs
+import io
+import json
 import os
+import re
+import sqlite3
+
+from create_db import DB_NAME, FTS_TABLE_NAME, TABLE_NAME, has_fulltext
+from import_txt_to_db import import_archive
+from smuzichat_index import LineIndex
+
+
+# Размер порции (байт) при однопроходном поиске по архиву
+SCAN_CHUNK_SIZE = 8 * 1024 * 1024
 
 
 def read_file_lines(filepath):
@@ -8,6 +21,89 @@ def read_file_lines(filepath):
         for i, line in enumerate(f, 1):
             yield i, line.rstrip('\n')
 
+def read_line_chunks(filepath, chunk_size=SCAN_CHUNK_SIZE, start=0, first_line=1, end=None):
+    """Читает файл крупными порциями по границам строк: (номер первой строки, текст).
+
+    start — байтовое смещение начала строки с номером first_line, с которого
+    начинается чтение (для обработки только дописанного хвоста). end —
+    смещение, дальше которого чтение не идёт, даже если файл тем временем
+    дописан (None — до конца файла). Незавершённая последняя строка диапазона
+    отдаётся так же, как в конце файла.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        remaining = -1 if end is None else end - start
+        line_no = first_line
+        while remaining != 0:
+            data = f.read(chunk_size if remaining < 0 else min(chunk_size, remaining))
+            if not data:
+                break
+            if remaining > 0:
+                remaining -= len(data)
+            if not data.endswith(b'\n') and remaining != 0:
+                rest = f.readline(remaining)
+                if remaining > 0:
+                    remaining -= len(rest)
+                data += rest
+            chunk = decoder.decode(data)
+            if chunk:
+                yield line_no, chunk
+                line_no += chunk.count('\n')
+        # Хвост без перевода строки: отложенный '\r' или неполный символ UTF-8 (UnicodeDecodeError)
+        chunk = decoder.decode(b'', final=True)
+        if chunk:
+            yield line_no, chunk
+
+def search_keywords(filepath, keywords, chunk_size=SCAN_CHUNK_SIZE):
+    """Ищет все ключевые слова за один проход по файлу (см. scan_keywords)."""
+    return scan_keywords(read_line_chunks(filepath, chunk_size), keywords)
+
+def scan_keywords(chunks, keywords):
+    """Ищет все ключевые слова в порциях (номер первой строки, текст) за один проход.
+
+    Результат тот же, что у search_in_file для каждого слова:
+    {ключевое слово: [(номер строки, строка), ...]} без учёта регистра.
+    Порция текста переводится в нижний регистр один раз, строки-кандидаты
+    находит общее регулярное выражение из всех слов, а точный набор слов
+    проверяется только в этих строках (так находятся и вложенные слова,
+    например "core" внутри "CoreCoordinator").
+    """
+    by_lower = {}
+    for keyword in keywords:
+        if not keyword:
+            raise ValueError("Пустое ключевое слово")
+        by_lower.setdefault(keyword.lower(), []).append(keyword)
+    results = {keyword: [] for keyword in keywords}
+    if not by_lower:
+        return results
+    # Длинные слова раньше коротких, чтобы совпадение не обрывалось на префиксе
+    pattern = re.compile('|'.join(re.escape(k) for k in sorted(by_lower, key=len, reverse=True)))
+
+    for first_line, chunk in chunks:
+        lowered = chunk.lower()
+        lines = None
+        line_index = 0
+        line_start = 0
+        last_index = -1
+        for match in pattern.finditer(lowered):
+            # lower() не добавляет и не убирает переводы строк, поэтому номер
+            # строки в lowered совпадает с номером строки в исходной порции
+            line_index += lowered.count('\n', line_start, match.start())
+            line_start = lowered.rfind('\n', 0, match.start()) + 1
+            if line_index == last_index:
+                continue
+            last_index = line_index
+            if lines is None:
+                lines = chunk.split('\n')
+            line = lines[line_index]
+            line_lower = line.lower()
+            for keyword_lower, originals in by_lower.items():
+                if keyword_lower in line_lower:
+                    for keyword in originals:
+                        results[keyword].append((first_line + line_index, line))
+    return results
+
 def search_in_file(filepath, keyword):
     """Ищет строки, содержащие ключевое слово."""
     results = []
@@ -16,6 +112,72 @@ def search_in_file(filepath, keyword):
             results.append((i, line))
     return results
 
+def fts_query(query):
+    """Превращает запрос в безопасное FTS5-выражение (все слова, по префиксу)."""
+    terms = [t.replace('"', '""') for t in query.split()]
+    return " ".join(f'"{t}"*' for t in terms)
+
+def search_db(db_path, query, limit=20, offset=0, context=0):
+    """Ищет строки архива в базе (chat_lines) через FTS5-индекс.
+
+    Результаты упорядочены по BM25 (лучшие первыми), при равенстве — по
+    номеру строки; без FTS5 — поиск подстроки через LIKE в порядке строк.
+    Для каждой найденной строки context строк до и после выбираются по
+    индексу line_number. Возвращает список словарей
+    {line_number, content, rank, context: [{line_number, content}, ...]}.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if has_fulltext(conn):
+            match = fts_query(query)
+            if not match:
+                return []
+            rows = conn.execute(f'''
+                SELECT t.line_number, t.content, bm25({FTS_TABLE_NAME}) AS rank
+                FROM {FTS_TABLE_NAME}
+                JOIN {TABLE_NAME} t ON t.id = {FTS_TABLE_NAME}.rowid
+                WHERE {FTS_TABLE_NAME} MATCH ?
+                ORDER BY rank, t.line_number
+                LIMIT ? OFFSET ?
+            ''', (match, limit, offset)).fetchall()
+        else:
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            rows = conn.execute(f'''
+                SELECT line_number, content, NULL FROM {TABLE_NAME}
+                WHERE content LIKE ? ESCAPE '\\'
+                ORDER BY line_number
+                LIMIT ? OFFSET ?
+            ''', (pattern, limit, offset)).fetchall()
+        results = []
+        for line_number, content, rank in rows:
+            around = []
+            if context > 0:
+                around = [
+                    {'line_number': n, 'content': text}
+                    for n, text in conn.execute(f'''
+                        SELECT line_number, content FROM {TABLE_NAME}
+                        WHERE line_number BETWEEN ? AND ? AND line_number != ?
+                        ORDER BY line_number
+                    ''', (line_number - context, line_number + context, line_number))
+                ]
+            results.append({'line_number': line_number, 'content': content, 'rank': rank, 'context': around})
+        return results
+    finally:
+        conn.close()
+
+def print_db_results(results):
+    """Выводит результаты search_db: найденная строка через «:», контекст через «-»."""
+    for n, result in enumerate(results):
+        if n and result['context']:
+            print('--')
+        before = [c for c in result['context'] if c['line_number'] < result['line_number']]
+        after = [c for c in result['context'] if c['line_number'] > result['line_number']]
+        for c in before:
+            print(f"{c['line_number']}- {c['content']}")
+        print(f"{result['line_number']}: {result['content']}")
+        for c in after:
+            print(f"{c['line_number']}- {c['content']}")
+
 def export_fragments(fragments, out_path):
     """Экспортирует найденные фрагменты в файл."""
     with open(out_path, 'w', encoding='utf-8') as f:
@@ -23,33 +185,86 @@ def export_fragments(fragments, out_path):
             f.write(f"{i}: {line}\n")
     print(f"Экспортировано {len(fragments)} строк в {out_path}")
 
-def tag_lines(filepath, keyword, tag):
-    """Помечает строки с ключевым словом тегом (выводит на экран)."""
+def tag_lines(filepath, keyword, tag, index=None):
+    """Помечает строки с ключевым словом тегом (выводит на экран).
+
+    С индексом (LineIndex) keyword — запрос индекса, и строки читаются
+    по смещениям без прохода по всему файлу.
+    """
+    if index is not None:
+        for i, line in index.search(keyword):
+            print(f"{i}: [{tag}] {line}")
+        return
     for i, line in read_file_lines(filepath):
         if keyword.lower() in line.lower():
             print(f"{i}: [{tag}] {line}")
 
 def main():
     parser = argparse.ArgumentParser(description='Читатель и анализатор архива обсуждений.')
-    parser.add_argument('filepath', help='Путь к архивному файлу')
+    parser.add_argument('filepath', nargs='?', help='Путь к архивному файлу (с --db — дописать его в базу перед поиском)')
     parser.add_argument('--search', help='Ключевое слово для поиска')
     parser.add_argument('--export', help='Путь для экспорта найденных фрагментов')
     parser.add_argument('--tag', help='Тег для пометки найденных строк')
+    parser.add_argument('--index', action='store_true',
+                        help='Искать по индексу слов (файл <архив>.idx): слова, "фразы" и префиксы слово*')
+    parser.add_argument('--db', nargs='?', const=DB_NAME,
+                        help=f'Искать в базе данных через FTS5 (по умолчанию {DB_NAME})')
+    parser.add_argument('--context', type=int, default=0, help='Сколько строк до и после найденной показать (--db)')
+    parser.add_argument('--limit', type=int, default=20, help='Сколько результатов вывести (--db)')
+    parser.add_argument('--offset', type=int, default=0, help='Сколько лучших результатов пропустить (--db)')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON (--db)')
     args = parser.parse_args()
 
+    if args.db:
+        if args.filepath:
+            if not os.path.exists(args.filepath):
+                print('Файл не найден!')
+                return
+            import_archive(args.filepath, args.db)
+        elif not os.path.exists(args.db):
+            print('База данных не найдена!')
+            return
+        if not args.search:
+            parser.error('с --db нужен --search')
+        results = search_db(args.db, args.search, args.limit, args.offset, args.context)
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+        else:
+            print_db_results(results)
+            print(f"Найдено {len(results)} строк.")
+        fragments = [(r['line_number'], r['content']) for r in results]
+        if args.export:
+            export_fragments(fragments, args.export)
+        if args.tag:
+            for i, line in fragments:
+                print(f"{i}: [{args.tag}] {line}")
+        return
+
+    if not args.filepath:
+        parser.error('не указан путь к архивному файлу')
     if not os.path.exists(args.filepath):
         print('Файл не найден!')
         return
 
+    index = None
+    if args.index:
+        index = LineIndex(args.filepath)
+        state = index.update()
+        if state != 'fresh':
+            print(f"Индекс {index.index_path}: {'дополнен' if state == 'incremental' else 'построен'}")
+
     if args.search:
-        results = search_in_file(args.filepath, args.search)
+        if index is not None:
+            results = index.search(args.search, update=False)
+        else:
+            results = search_in_file(args.filepath, args.search)
         for i, line in results:
             print(f"{i}: {line}")
         print(f"Найдено {len(results)} строк.")
         if args.export:
             export_fragments(results, args.export)
         if args.tag:
-            tag_lines(args.filepath, args.search, args.tag)
+            tag_lines(args.filepath, args.search, args.tag, index=index)
     else:
         # Просто выводим первые 20 строк для примера
         for i, line in read_file_lines(args.filepath):
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Модули MultiCoder лежат плоско в MCoder/ и импортируются по имени
+MCODER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "MCoder")
+sys.path.insert(0, MCODER_DIR)
+
+# multicoder_core при импорте создаёт multicoder.db и multicoder.log в текущем каталоге
+os.chdir(tempfile.mkdtemp(prefix="multicoder-tests-"))
+
+
+@pytest.fixture
+def core(tmp_path):
+    from multicoder_core import MultiCoderCore
+    core = MultiCoderCore(db_path=str(tmp_path / "multicoder.db"))
+    yield core
+    core.close()
+
+
+@pytest.fixture
+def ai(monkeypatch):
+    import multicoder_ai
+    monkeypatch.setattr(multicoder_ai, "STUB_CHUNK_DELAY", 0)
+    ai = multicoder_ai.AIIntegration()
+    yield ai
+    ai.health.stop()
+    ai.executor.shutdown(wait=True)
+    ai.transport.close()
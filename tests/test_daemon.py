@@ -0,0 +1,92 @@
+import ctypes.util
+import importlib
+import os
+import sys
+
+import multicoder_daemon
+
+
+def test_import_without_linux_libc(monkeypatch):
+    # На Windows find_library("c") возвращает None, а CDLL(None) падает с TypeError
+    monkeypatch.setattr(sys, "platform", "win32")
+    monkeypatch.setattr(ctypes.util, "find_library", lambda name: None)
+    try:
+        daemon = importlib.reload(multicoder_daemon)
+        assert daemon._libc is None
+        assert daemon.INOTIFY_AVAILABLE is False
+    finally:
+        monkeypatch.undo()
+        importlib.reload(multicoder_daemon)
+
+
+def set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def watch(tmp_path, monkeypatch):
+    """Архив, цели и функция проверки, возвращающая число запущенных сборок."""
+    archive = tmp_path / "archive.txt"
+    archive.write_bytes(b"one\n")
+    path = str(archive)
+    targets = [{"archive": path, "output": str(tmp_path / "out"), "log": str(tmp_path / "log")}]
+    builds = []
+    monkeypatch.setattr(multicoder_daemon, "run_builder", builds.append)
+    detector = multicoder_daemon.ChangeDetector()
+
+    def check():
+        del builds[:]
+        multicoder_daemon.build_changed(targets, {path}, detector)
+        return len(builds)
+
+    return archive, check
+
+
+def test_touch_after_start_does_not_build(tmp_path, monkeypatch):
+    archive, check = watch(tmp_path, monkeypatch)
+    assert check() == 1  # первая сборка при запуске
+    set_mtime(archive, 1_000_000_000_000_000_000)
+    assert check() == 0
+
+
+def test_touch_after_append_does_not_build(tmp_path, monkeypatch):
+    archive, check = watch(tmp_path, monkeypatch)
+    check()
+    with open(archive, "ab") as f:
+        f.write(b"two\n")
+    assert check() == 1
+    set_mtime(archive, 1_000_000_000_000_000_000)
+    assert check() == 0
+    assert check() == 0
+
+
+def test_same_size_rewrite_builds(tmp_path, monkeypatch):
+    archive, check = watch(tmp_path, monkeypatch)
+    check()
+    archive.write_bytes(b"ONE\n")
+    set_mtime(archive, 1_000_000_000_000_000_000)
+    assert check() == 1
+
+
+def test_read_error_does_not_stop_watching(tmp_path, monkeypatch):
+    archive = tmp_path / "archive.txt"
+    archive.write_bytes(b"one\n")
+    path = str(archive)
+    detector = multicoder_daemon.ChangeDetector()
+    detector.changed(path)
+    set_mtime(path, 1_000_000_000_000_000_000)
+
+    def unreadable(path):
+        raise PermissionError(13, "Permission denied", path)
+
+    builds = []
+    monkeypatch.setattr(multicoder_daemon, "file_digest", unreadable)
+    monkeypatch.setattr(multicoder_daemon, "run_builder", builds.append)
+    targets = [{"archive": path, "output": str(tmp_path / "out"), "log": str(tmp_path / "log")}]
+    multicoder_daemon.build_changed(targets, {path}, detector)  # не бросает OSError в цикл слежения
+    assert builds == []
+
+    monkeypatch.undo()
+    monkeypatch.setattr(multicoder_daemon, "run_builder", builds.append)
+    archive.write_bytes(b"ONE\n")
+    multicoder_daemon.build_changed(targets, {path}, detector)
+    assert builds == targets  # при следующей проверке архив снова проверяется
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from multicoder_core import EXPORT_PROGRESS_STEP
+from multicoder_jobs import JobCancelled
+
+
+def make_project(core, messages):
+    project_id = core.create_project("Отчёт", "проект для экспорта")
+    for i in range(messages):
+        core.add_message(project_id, "user", f"сообщение {i}")
+    return project_id
+
+
+def test_submit_export_reports_progress(core, tmp_path):
+    project_id = make_project(core, 3 * EXPORT_PROGRESS_STEP)
+    progress = []
+    handle = core.submit_export(project_id, str(tmp_path / "report"), formats=("txt", "jsonl"),
+                                progress_callback=lambda done, total: progress.append((done, total)))
+    paths = handle.result(timeout=30)
+    assert sorted(paths) == ["jsonl", "txt"]
+    total = progress[-1][1]
+    assert total >= 3 * EXPORT_PROGRESS_STEP  # сообщения плюс файлы и события безопасности
+    assert [done for done, _ in progress[:3]] == [EXPORT_PROGRESS_STEP * i for i in (1, 2, 3)]
+    assert progress[-1] == (total, total)
+    assert handle.state == "done" and handle.progress == 1.0
+
+
+def test_cancelled_export_removes_partial_files(core, tmp_path):
+    project_id = make_project(core, 3 * EXPORT_PROGRESS_STEP)
+    jobs = []
+    submitted = threading.Event()
+
+    def cancel_on_first_progress(done, total):
+        submitted.wait(5)
+        jobs[0].cancel()
+
+    jobs.append(core.submit_export(project_id, str(tmp_path / "report"), formats=("txt", "jsonl"),
+                                   progress_callback=cancel_on_first_progress))
+    submitted.set()
+    with pytest.raises(JobCancelled):
+        jobs[0].result(timeout=30)
+    assert jobs[0].state == "cancelled"
+    assert list(tmp_path.glob("report.*")) == []
@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class StreamLog(list):
+    """Фрагменты, выданные заглушками нейросетей, и имена закрытых потоков."""
+
+    def __init__(self):
+        super().__init__()
+        self.closed = set()
+
+    def stream(self, name, chunks=100, delay=0.02):
+        def stream(prompt):
+            try:
+                for i in range(chunks):
+                    time.sleep(delay)
+                    self.append(name)
+                    yield f"{name}{i} "
+            finally:
+                self.closed.add(name)
+        return stream
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_losers_stop_streaming_after_winner(ai):
+    log = StreamLog()
+    ai.stream_providers = {
+        "deepseek": log.stream("deepseek", chunks=2, delay=0.01),
+        "codegeex": log.stream("codegeex"),
+        "starcoder": log.stream("starcoder"),
+    }
+    result = ai.generate_code_multi("cancel me", parallel=True, use_cache=False)
+    assert list(result["results"]) == ["deepseek"]
+
+    assert wait_for(lambda: {"codegeex", "starcoder"} <= log.closed)
+    produced = len(log)
+    time.sleep(0.1)
+    # После отмены проигравшие больше не читают фрагменты
+    assert len(log) == produced
+    assert log.count("codegeex") < 10
+
+
+def test_timed_out_providers_are_interrupted(ai):
+    log = StreamLog()
+    ai.stream_providers = {service: log.stream(service) for service in ai.stream_providers}
+    for config in ai.ai_services.values():
+        config["timeout"] = 0.1
+    result = ai.generate_code_multi("too slow", parallel=True, use_cache=False, deadline=5)
+    assert not result["success"]
+    assert wait_for(lambda: len(log.closed) == 3)
+    assert len(log) < 3 * 20
+
+
+def test_cancelled_call_is_not_recorded(ai):
+    event = threading.Event()
+    event.set()
+    assert ai._call_provider("deepseek", "x", event) is None
+    assert ai.health.stats()["deepseek"]["calls"] == 0
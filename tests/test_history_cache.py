@@ -0,0 +1,85 @@
+from multicoder_cache import ProjectHistoryCache, SQLiteCacheTier
+
+
+def test_put_with_stale_generation_is_dropped():
+    cache = ProjectHistoryCache()
+    generation = cache.generation(1)
+    cache.invalidate(1)
+    assert not cache.put(1, [{"content": "old"}], complete=True, generation=generation)
+    assert cache.get(1, 10) is None
+    assert cache.put(1, [{"content": "new"}], complete=True, generation=cache.generation(1))
+    assert cache.get(1, 10) == [{"content": "new"}]
+
+
+def test_write_during_history_read_is_not_hidden_by_cache(core):
+    project_id = core.create_project("history")
+    core.add_message(project_id, "user", "first")
+
+    original_execute = core.db.execute
+    written = []
+
+    class Rows:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def fetchall(self):
+            return self.rows
+
+    def execute(sql, params=()):
+        rows = original_execute(sql, params).fetchall()
+        if "FROM messages" in sql and not written:
+            # Сообщение приходит между SELECT и сохранением результата в кэш
+            written.append(True)
+            core.add_message(project_id, "user", "second")
+        return Rows(rows)
+
+    core.db.execute = execute
+    assert [m["content"] for m in core.get_project_history(project_id)] == ["first"]
+    core.db.execute = original_execute
+
+    assert [m["content"] for m in core.get_project_history(project_id)] == ["second", "first"]
+
+
+def count_transactions(db, monkeypatch):
+    opened = []
+    transaction = db.transaction
+
+    def counted():
+        opened.append(1)
+        return transaction()
+
+    monkeypatch.setattr(db, "transaction", counted)
+    return opened
+
+
+def age(db, column, seconds):
+    with db.transaction() as c:
+        c.execute(f"UPDATE memory_cache SET {column} = datetime('now', ?)", (f"-{seconds} seconds",))
+
+
+def test_hot_reads_do_not_write(core, monkeypatch):
+    tier = SQLiteCacheTier(core.db, "history", touch_interval=60)
+    tier.set(1, "история")
+    writes = count_transactions(core.db, monkeypatch)
+    for _ in range(5):
+        assert tier.get(1) == "история"
+    assert writes == []
+
+    age(core.db, "last_accessed", 120)
+    writes.clear()
+    assert tier.get(1) == "история"
+    assert tier.get(1) == "история"
+    assert len(writes) == 1  # отметка обновлена один раз, дальше она снова свежая
+
+
+def test_persistent_history_tier_is_pruned(core):
+    tier = SQLiteCacheTier(core.db, "history", ttl=3600, max_entries=2)
+    cache = ProjectHistoryCache(persistent=tier)
+    for project_id in (1, 2, 3):
+        cache.put(project_id, [{"content": f"проект {project_id}"}], complete=True)
+    assert cache.prune() == 1
+    assert tier.evictions == 1
+
+    age(core.db, "created_at", 7200)
+    assert cache.prune() == 2
+    assert ProjectHistoryCache().prune() == 0
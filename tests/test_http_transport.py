@@ -0,0 +1,81 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from urllib3.util.retry import RequestHistory
+
+from multicoder_http import HTTPTransport, JitterRetry
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive между запросами
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.client_address, self.path))
+            flaky_calls = sum(1 for _, path in server.requests if path == "/flaky")
+        status = 503 if self.path == "/flaky" and flaky_calls == 1 else 200
+        body = f"{self.path} {status}".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1,localhost")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport():
+    transport = HTTPTransport(backoff_factor=0.01, max_retries=3)
+    yield transport
+    transport.close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_one_connection_serves_several_requests(server, transport):
+    for i in range(5):
+        response = transport.get(url(server, f"/page/{i}"))
+        assert response.status_code == 200
+    clients = {client for client, _ in server.requests}
+    assert len(server.requests) == 5
+    assert len(clients) == 1
+    pool = transport.pool_stats()[f"http://127.0.0.1:{server.server_address[1]}"]
+    assert pool["connections"] == 1
+    assert pool["requests"] == 5
+
+
+def test_503_is_retried(server, transport):
+    response = transport.get(url(server, "/flaky"))
+    assert response.status_code == 200
+    assert [path for _, path in server.requests] == ["/flaky", "/flaky"]
+    assert transport.stats()["failures"] == 0
+
+
+def test_backoff_is_jittered_and_capped():
+    history = tuple(RequestHistory("GET", "/", None, 503, None) for _ in range(3))
+    retry = JitterRetry(total=5, backoff_factor=1.0, jitter=0.3, max_backoff=10.0).new(history=history)
+    samples = {retry.get_backoff_time() for _ in range(50)}
+    # 1.0 * 2^(3-1) = 4 с с разбросом ±30%
+    assert all(2.8 <= s <= 5.2 for s in samples)
+    assert len(samples) > 1
+
+    capped = JitterRetry(total=5, backoff_factor=10.0, jitter=0.3, max_backoff=10.0).new(history=history)
+    assert all(capped.get_backoff_time() <= 10.0 for _ in range(20))
@@ -0,0 +1,42 @@
+import sqlite3
+
+from create_db import TABLE_NAME
+from import_txt_to_db import CHECKSUM_BYTES, import_archive
+
+
+def write_archive(path, count):
+    lines = [f"строка {i:06d} обсуждения мультикодера\n" for i in range(1, count + 1)]
+    path.write_text("".join(lines), encoding="utf-8")
+    return lines
+
+
+def stored_lines(db):
+    conn = sqlite3.connect(db)
+    try:
+        return [row[0] for row in conn.execute(f"SELECT content FROM {TABLE_NAME} ORDER BY line_number")]
+    finally:
+        conn.close()
+
+
+def test_append_imports_only_the_tail(tmp_path):
+    archive, db = tmp_path / "archive.txt", str(tmp_path / "chat.db")
+    write_archive(archive, 5000)
+    assert import_archive(str(archive), db)["mode"] == "rebuild"
+    with open(archive, "a", encoding="utf-8") as f:
+        f.write("новая строка\n")
+    result = import_archive(str(archive), db)
+    assert (result["mode"], result["lines"]) == ("append", 1)
+    assert stored_lines(db)[-1] == "новая строка"
+
+
+def test_edit_past_checksum_prefix_rebuilds(tmp_path):
+    archive, db = tmp_path / "archive.txt", str(tmp_path / "chat.db")
+    lines = write_archive(archive, 5000)
+    assert archive.stat().st_size > 3 * CHECKSUM_BYTES
+    import_archive(str(archive), db)
+
+    # Правка строки далеко за первыми CHECKSUM_BYTES байтами, размер файла прежний
+    lines[-10] = lines[-10].replace("обсуждения", "ОБСУЖДЕНИЯ")
+    archive.write_text("".join(lines) + "новая строка\n", encoding="utf-8")
+    assert import_archive(str(archive), db)["mode"] == "rebuild"
+    assert stored_lines(db) == [line.rstrip("\n") for line in lines] + ["новая строка"]
@@ -0,0 +1,67 @@
+import pytest
+
+import meta_multicoder_builder
+from meta_multicoder_builder import IncrementalBuilder
+from smuzichat_reader import read_line_chunks
+
+
+def fragment_lines(builder):
+    return [line_no for line_no, _ in builder.state["fragments"]["alpha"]]
+
+
+def test_append_during_scan_is_left_for_next_build(tmp_path, monkeypatch):
+    archive = tmp_path / "archive.txt"
+    archive.write_text("alpha 1\nbeta 2\nalpha 3\n", encoding="utf-8")
+    builder = IncrementalBuilder(str(archive), str(tmp_path / "out"), keywords=["alpha"])
+    builder.build()
+    assert fragment_lines(builder) == [1, 3]
+
+    with open(archive, "a", encoding="utf-8") as f:
+        f.write("alpha 4\n")
+    read_line_chunks = meta_multicoder_builder.read_line_chunks
+
+    def appending(*args, **kwargs):
+        # Архив дописывается между проверкой размера и сканированием
+        with open(archive, "a", encoding="utf-8") as f:
+            f.write("alpha 5\nbeta 6\n")
+        return read_line_chunks(*args, **kwargs)
+
+    monkeypatch.setattr(meta_multicoder_builder, "read_line_chunks", appending)
+    assert builder.build()["new_lines"] == 1
+    monkeypatch.undo()
+    assert fragment_lines(builder) == [1, 3, 4]
+    assert builder.state["next_line"] == 5
+
+    assert builder.build()["new_lines"] == 2
+    assert builder.state["fragments"]["alpha"] == [(1, "alpha 1"), (3, "alpha 3"), (4, "alpha 4"), (5, "alpha 5")]
+    assert builder.state["next_line"] == 7
+    assert builder.state["offset"] == archive.stat().st_size
+
+
+def test_edit_past_checksum_prefix_triggers_full_build(tmp_path):
+    archive = tmp_path / "archive.txt"
+    lines = [f"beta {i:06d} filler text\n" for i in range(1, 8001)]
+    archive.write_text("".join(lines), encoding="utf-8")
+    assert archive.stat().st_size > 2 * meta_multicoder_builder.STATE_CHECK_BYTES
+    builder = IncrementalBuilder(str(archive), str(tmp_path / "out"), keywords=["alpha"])
+    builder.build()
+    assert fragment_lines(builder) == []
+
+    # Правка той же длины далеко за первыми STATE_CHECK_BYTES байтами и дописанная строка
+    lines[-50] = lines[-50].replace("beta", "alpha")[:-2] + "\n"
+    archive.write_text("".join(lines) + "alpha tail\n", encoding="utf-8")
+    assert builder.build()["mode"] == "full"
+    assert fragment_lines(builder) == [7951, 8001]
+
+
+def test_bounded_range_flushes_trailing_text(tmp_path):
+    archive = tmp_path / "archive.txt"
+    archive.write_bytes("первая\rвторая\n".encode("utf-8"))
+    end = len("первая\r".encode("utf-8"))
+    chunks = list(read_line_chunks(str(archive), start=0, end=end))
+    assert chunks[0][0] == 1
+    assert "".join(text for _, text in chunks) == "первая\n"
+
+    # Диапазон обрывается посреди двухбайтного символа: ошибка, а не потерянный хвост
+    with pytest.raises(UnicodeDecodeError):
+        list(read_line_chunks(str(archive), start=0, end=3))
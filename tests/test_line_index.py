@@ -0,0 +1,38 @@
+from smuzichat_index import PREFIX_CHECK_BYTES, LineIndex
+
+
+def write_archive(path, count):
+    lines = [f"строка {i:06d} обсуждения мультикодера\n" for i in range(1, count + 1)]
+    path.write_text("".join(lines), encoding="utf-8")
+    return lines
+
+
+def test_append_is_indexed_incrementally(tmp_path):
+    archive = tmp_path / "archive.txt"
+    write_archive(archive, 5000)
+    index = LineIndex(str(archive))
+    try:
+        assert index.update() == "rebuilt"
+        with open(archive, "a", encoding="utf-8") as f:
+            f.write("новая строка про парсер\n")
+        assert index.update() == "incremental"
+        assert index.search("парсер") == [(5001, "новая строка про парсер")]
+    finally:
+        index.close()
+
+
+def test_edit_past_checksum_prefix_rebuilds(tmp_path):
+    archive = tmp_path / "archive.txt"
+    lines = write_archive(archive, 5000)
+    assert archive.stat().st_size > 3 * PREFIX_CHECK_BYTES
+    index = LineIndex(str(archive))
+    try:
+        index.update()
+        # Правка строки (той же длины в байтах) далеко за первыми PREFIX_CHECK_BYTES байтами
+        lines[-10] = lines[-10].replace("обсуждения", "парсер!!!!!!!!")
+        archive.write_text("".join(lines) + "хвост\n", encoding="utf-8")
+        assert index.update() == "rebuilt"
+        assert index.search("парсер") == [(4991, lines[-10].rstrip("\n"))]
+        assert index.search("хвост") == [(5001, "хвост")]
+    finally:
+        index.close()
@@ -0,0 +1,69 @@
+import time
+
+from multicoder_health import STATE_CLOSED, STATE_HALF_OPEN, CircuitBreaker
+
+
+def open_breaker(breaker: CircuitBreaker, cooldown: float = 0.01):
+    breaker.cooldown = breaker.base_cooldown = cooldown
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+    time.sleep(cooldown * 2)
+
+
+def test_unused_fallback_keeps_its_half_open_trial(ai):
+    breaker = ai.health.breakers["codegeex"]
+    open_breaker(breaker)
+    assert breaker.ready_for_probe()
+
+    # deepseek отвечает, до запасной codegeex очередь не доходит
+    result = ai.generate_code_multi("hello", preferred_service="deepseek", parallel=False, use_cache=False)
+    assert list(result["results"]) == ["deepseek"]
+
+    assert breaker.ready_for_probe()
+    assert breaker.allow_request()
+
+
+def test_half_open_provider_recovers_through_probe(ai):
+    breaker = ai.health.breakers["codegeex"]
+    open_breaker(breaker)
+    ai.generate_code_multi("hello", preferred_service="deepseek", parallel=False, use_cache=False)
+
+    ai.health.probe = lambda service: True
+    ai.health.run_probes()
+    assert breaker.state == STATE_CLOSED
+
+
+def test_half_open_provider_recovers_on_next_call(ai):
+    breaker = ai.health.breakers["deepseek"]
+    open_breaker(breaker)
+    result = ai.generate_code_multi("hello", preferred_service="deepseek", parallel=False, use_cache=False)
+    assert list(result["results"]) == ["deepseek"]
+    assert breaker.state == STATE_CLOSED
+
+
+def test_cancelled_trial_is_released():
+    breaker = CircuitBreaker()
+    open_breaker(breaker)
+    assert breaker.allow_request()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.ready_for_probe()
+    breaker.release_trial()
+    assert breaker.ready_for_probe()
+    assert breaker.allow_request()
+
+
+def test_stream_keeps_fallback_trial_and_releases_abandoned_one(ai):
+    fallback = ai.health.breakers["codegeex"]
+    open_breaker(fallback)
+    chunks = list(ai.generate_code_stream("hello", preferred_service="deepseek", use_cache=False))
+    assert {chunk.service for chunk in chunks} == {"deepseek"}
+    assert fallback.ready_for_probe()
+
+    preferred = ai.health.breakers["deepseek"]
+    open_breaker(preferred)
+    stream = ai.generate_code_stream("hello", preferred_service="deepseek", use_cache=False)
+    assert next(stream).service == "deepseek"
+    assert not preferred.ready_for_probe()
+    stream.close()
+    assert preferred.state == STATE_HALF_OPEN
+    assert preferred.ready_for_probe()
@@ -0,0 +1,21 @@
+import sqlite3
+
+from multicoder_core import MultiCoderCore
+from multicoder_db import find_full_scans
+
+
+def test_migrated_schema_is_current(core):
+    migrations = core._schema_migrations()
+    assert core.schema_version == migrations[-1].version
+
+
+def test_core_queries_do_not_scan_tables(core):
+    assert find_full_scans(core.db.connection(), MultiCoderCore.CORE_QUERIES) == []
+
+
+def test_find_full_scans_reports_unindexed_query():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+    offenders = find_full_scans(conn, [("SELECT b FROM t WHERE a = ?", (1,))])
+    assert len(offenders) == 1
+    assert offenders[0][1].startswith("SCAN t")
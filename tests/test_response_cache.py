@@ -0,0 +1,31 @@
+import sqlite3
+
+
+def test_generation_request_counts_one_miss_then_one_hit(ai, core):
+    ai.enable_response_cache(core.db)
+
+    first = ai.generate_code_multi("print hello", parallel=False)
+    assert first["success"] and not first.get("cached")
+    stats = ai.get_cache_stats()["generation"]
+    assert (stats["hits"], stats["misses"]) == (0, 1)
+
+    second = ai.generate_code_multi("print   hello", parallel=False)
+    assert second["cached"]
+    stats = ai.get_cache_stats()["generation"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_ratio"] == 0.5
+
+
+def failing_lookup(keys):
+    raise sqlite3.OperationalError("database is locked")
+
+
+def test_cache_read_error_falls_back_to_providers(ai, core, monkeypatch):
+    ai.enable_response_cache(core.db)
+    monkeypatch.setattr(ai.generation_cache, "get_first", failing_lookup)
+
+    result = ai.generate_code_multi("print hello", parallel=False)
+    assert result["success"] and not result.get("cached")
+
+    chunks = list(ai.generate_code_stream("print hello"))
+    assert chunks and not any(chunk.cached for chunk in chunks)
@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from multicoder_search import SearchCache, SingleFlight, WebSearch, parse_results
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "duckduckgo_results.html")
+
+
+@pytest.fixture
+def page():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_parse_results_unwraps_redirects(page):
+    urls = [r["url"] for r in parse_results(page)]
+    assert urls == [
+        "https://github.com/urllib3/urllib3",
+        "https://requests.readthedocs.io/en/latest/user/advanced/?highlight=retry&lang=ru",
+        "https://stackoverflow.com/questions/15431044/can-i-set-max-retries-for-requests-request",
+        "https://example.com/blog/retries",
+    ]
+
+
+def test_parse_results_strips_markup_and_entities(page):
+    first, second, third, _ = parse_results(page)
+    assert first["title"] == "urllib3/urllib3: Retry & connection pooling"
+    assert first["description"] == ("urllib3 is a powerful, user-friendly HTTP client "
+                                    "for Python — thread-safe connection pooling & retries.")
+    assert second["title"] == "Advanced Usage — Requests documentation"
+    assert second["description"].startswith('Transport Adapters & max_retries: "Session" objects')
+    assert third["description"] == "Mount an HTTPAdapter with a Retry object — backoff factor <= 1."
+    assert [r["type"] for r in (first, second, third)] == ["github_repo", "documentation", "general"]
+
+
+def test_parse_results_respects_max_results(page):
+    results = parse_results(page, max_results=2)
+    assert len(results) == 2
+    assert results[1]["description"]  # описание последнего результата дочитано
+    assert len(parse_results(page, max_results=50)) == 4
+
+
+def test_search_cache_persists_between_instances(tmp_path):
+    results = [{"title": "Пример", "url": "https://example.com", "description": "", "type": "general"}]
+    SearchCache(str(tmp_path), ttl=60).set("duckduckgo:10:пример", results)
+    cache = SearchCache(str(tmp_path), ttl=60)
+    assert cache.get("duckduckgo:10:пример") == results
+    assert cache.get("duckduckgo:10:другое") is None
+
+
+def test_search_cache_expires_after_ttl(tmp_path):
+    cache = SearchCache(str(tmp_path), ttl=60)
+    cache.set("old", [{"title": "a"}])
+    cache.set("new", [{"title": "b"}])
+    stale = time.time() - 120
+    os.utime(cache._path("old"), (stale, stale))
+    assert cache.get("old") is None
+    assert cache.get("new") == [{"title": "b"}]
+    assert cache.prune() == 1
+    assert not os.path.exists(cache._path("old"))
+
+
+def test_single_flight_deduplicates_concurrent_calls():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["result"]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("q", fetch)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("q", fetch))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    deadline = time.monotonic() + 5
+    while flights.shared < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert flights.shared == 4
+    assert results == [["result"]] * 5
+    # После завершения ключ освобождается, и следующий вызов выполняется заново
+    assert flights.do("q", lambda: ["again"]) == ["again"]
+
+
+def test_single_flight_releases_key_after_error():
+    flights = SingleFlight()
+    with pytest.raises(ValueError):
+        flights.do("q", lambda: (_ for _ in ()).throw(ValueError("нет сети")))
+    assert flights.do("q", lambda: 1) == 1
+
+
+def test_web_search_counts_concurrent_cache_hits(tmp_path):
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # чаще переключать потоки, чтобы гонка на счётчиках проявилась
+    try:
+        cache = SearchCache(str(tmp_path), ttl=60)
+        search = WebSearch(transport=None, cache=cache, max_results=5)
+        cache.set(search.cache_key("python", 5), [{"title": "Python", "url": "https://python.org"}])
+
+        def worker():
+            for _ in range(200):
+                assert search.search("python")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+    finally:
+        sys.setswitchinterval(interval)
+    assert search.cache_hits == 8 * 200
+    assert search.fetches == 0
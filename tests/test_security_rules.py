@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import multicoder_security
+from multicoder_security import CompiledRuleSet, SecurityRuleEngine
+
+
+def write_rules(path, rule_sets):
+    path.write_text(json.dumps(rule_sets, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.mark.parametrize("bad_rule", [
+    {"pattern": "rm -rf", "risk_level": 3},
+    {"pattern": 42, "risk_level": "HIGH"},
+    {"pattern": "rm -rf", "message": ["не строка"]},
+    "rm -rf",
+])
+def test_malformed_rule_file_keeps_previous_rules(tmp_path, bad_rule):
+    config = tmp_path / "security_rules.json"
+    write_rules(config, {"content": [{"pattern": "secret", "risk_level": "MEDIUM"}]})
+    engine = SecurityRuleEngine(str(config))
+    version = engine.version
+    assert engine.evaluate("content", "my SECRET")["risk_level"] == "MEDIUM"
+
+    write_rules(config, {"content": [bad_rule]})
+    assert engine.reload() is False
+    assert engine.version == version
+    assert engine.evaluate("content", "my SECRET")["risk_level"] == "MEDIUM"
+
+
+def test_malformed_rule_file_at_start_falls_back_to_builtin_rules(tmp_path):
+    config = tmp_path / "security_rules.json"
+    write_rules(config, {"content": [{"pattern": "secret", "risk_level": 3}]})
+    engine = SecurityRuleEngine(str(config))
+    assert engine.evaluate("content", "a keylogger")["risk_level"] == "HIGH"
+    assert engine.evaluate("code", "os.system('ls')")["risk_level"] == "HIGH"
+
+
+@pytest.mark.skipif(not multicoder_security.AHOCORASICK_AVAILABLE, reason="pyahocorasick не установлен")
+@pytest.mark.parametrize("name", sorted(multicoder_security.DEFAULT_RULE_SETS))
+def test_builtin_rule_sets_scan_in_one_pass(name, monkeypatch):
+    rules = multicoder_security.DEFAULT_RULE_SETS[name]
+    one_pass = CompiledRuleSet(rules)
+    assert one_pass.automaton is not None
+    monkeypatch.setattr(multicoder_security, "AHOCORASICK_MIN_PATTERNS", len(rules) + 1)
+    per_pattern = CompiledRuleSet(rules)
+    assert per_pattern.automaton is None
+    text = "Exploit: os.system('x'); eval(input()) via urllib and a DDoS backdoor, then open( and type("
+    assert one_pass.evaluate(text) == per_pattern.evaluate(text)
+    assert one_pass.scan(text) == per_pattern.scan(text)